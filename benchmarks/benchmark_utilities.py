@@ -0,0 +1,126 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def offscreen_application():
+    # benchmarks run headless; the platform has to be chosen before Qt
+    # creates its application. The generated ui modules import widgets
+    # relative to the frappe directory, like when the app is started there.
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    for path in (REPOSITORY, os.path.join(REPOSITORY, "frappe")):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+def summarize(seconds):
+    seconds = np.asarray(seconds, dtype=np.float64)
+    return {
+        "n": int(seconds.shape[0]),
+        "min": float(np.min(seconds)),
+        "median": float(np.median(seconds)),
+        "mean": float(np.mean(seconds)),
+        "p90": float(np.percentile(seconds, 90)),
+        "max": float(np.max(seconds))
+    }
+
+
+def time_call(function, repeat=5, warmup=1, setup=None):
+    # wall time of repeated calls; setup runs untimed before every call and
+    # its result is passed to the function
+    for _ in range(warmup):
+        function(setup() if setup is not None else None)
+    seconds = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(argument)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def close_window(window):
+    # delete the window while the application still runs, pyqtgraph fails
+    # when its views are torn down at interpreter exit
+    from PyQt5.QtCore import QCoreApplication, QEvent
+
+    window.close()
+    window.deleteLater()
+    QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+
+
+def time_each(function, arguments):
+    # wall time of one call per argument, e.g. one per plane
+    seconds = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=REPOSITORY,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_metadata():
+    import pandas
+    import pyqtgraph
+    from PyQt5.QtCore import QT_VERSION_STR
+
+    return {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "system": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "pyqtgraph": pyqtgraph.__version__,
+        "qt": QT_VERSION_STR
+    }
+
+
+class BenchmarkResults:
+
+    def __init__(self, suite) -> None:
+        self.suite = suite
+        self.results = []
+
+    def add(self, benchmark, parameters, seconds, **extra):
+        result = {"benchmark": benchmark, "parameters": parameters,
+                  "seconds": summarize(seconds), **extra}
+        self.results.append(result)
+        print(f"{benchmark:<32} {self.parameter_text(parameters):<48} "
+              f"median {1000 * result['seconds']['median']:10.3f} ms")
+        return result
+
+    @staticmethod
+    def parameter_text(parameters):
+        return " ".join(f"{key}={value}" for key, value in
+                        parameters.items())
+
+    def write(self, path, **extra):
+        with open(path, "w") as results_file:
+            json.dump({"suite": self.suite,
+                       "metadata": benchmark_metadata(),
+                       "results": self.results, **extra}, results_file,
+                      indent=1)
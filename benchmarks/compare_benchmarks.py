@@ -0,0 +1,54 @@
+import argparse
+import json
+import sys
+
+# parameters that describe the outcome rather than the setup of a run
+RESULT_PARAMETERS = ("file_bytes",)
+
+
+def result_key(result):
+    parameters = {key: value for key, value in result["parameters"].items()
+                  if key not in RESULT_PARAMETERS}
+    return result["benchmark"], json.dumps(parameters, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as results_file:
+        results = json.load(results_file)
+    return results["metadata"], {result_key(result): result
+                                 for result in results["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the median times of two benchmark runs.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="slowdown ratio that counts as a regression")
+    arguments = parser.parse_args()
+
+    baseline_metadata, baseline = load_results(arguments.baseline)
+    current_metadata, current = load_results(arguments.current)
+    print(f"baseline {baseline_metadata['commit']}, "
+          f"current {current_metadata['commit']}")
+
+    regressions = 0
+    for key in sorted(baseline.keys() & current.keys()):
+        benchmark, parameters = key
+        before = baseline[key]["seconds"]["median"]
+        after = current[key]["seconds"]["median"]
+        ratio = after / before if before > 0 else float("inf")
+        regressed = ratio > arguments.threshold
+        regressions += regressed
+        print(f"{benchmark:<32} {1000 * before:10.3f} ms "
+              f"{1000 * after:10.3f} ms {ratio:6.2f}x"
+              f"{'  REGRESSION' if regressed else ''}  {parameters}")
+
+    for key in sorted(baseline.keys() ^ current.keys()):
+        print(f"only in one run: {key[0]} {key[1]}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
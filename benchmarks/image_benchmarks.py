@@ -0,0 +1,140 @@
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from benchmarks.benchmark_utilities import (
+    BenchmarkResults, close_window, offscreen_application, time_call,
+    time_each
+    )
+from benchmarks.synthetic_images import write_synthetic_stack
+
+DEFAULT_SHAPE = (20, 2, 5, 512, 512)
+COMPRESSIONS = {"none": None, "zlib": "zlib"}
+N_RANDOM_PLANES = 50
+N_CURSOR_READOUTS = 200
+
+
+def plane_indices(shape):
+    n_t, n_c, n_z = shape[:3]
+    return [(t, c, z) for t in range(n_t) for c in range(n_c)
+            for z in range(n_z)]
+
+
+def benchmark_stack(results, path, parameters, repeat, seed):
+    import bioio
+    from PyQt5.QtCore import QPointF
+    from frappe.app import Window
+    from frappe.utilities.particle_detection import detect_particles
+
+    app = offscreen_application()
+    shape = parameters["shape"]
+
+    results.add("image.open", parameters,
+                time_call(lambda _: bioio.BioImage(path).dims,
+                          repeat=repeat))
+
+    def first_plane(image):
+        image.get_image_data("XY", T=0, C=0, Z=0)
+
+    results.add("image.first_plane", parameters,
+                time_call(first_plane, repeat=repeat,
+                          setup=lambda: bioio.BioImage(path)))
+
+    # planes and projections are read through dask from a freshly opened
+    # image; get_image_data would load the whole stack on its first call
+    # and time indexing into memory from then on
+    def read_plane(image, tcz):
+        return image.dask_data[tcz[0], tcz[1], tcz[2]].compute()
+
+    image = bioio.BioImage(path)
+    results.add("image.sequential_plane", parameters, time_each(
+        lambda tcz: read_plane(image, tcz), plane_indices(shape)))
+
+    rng = np.random.default_rng(seed)
+    planes = plane_indices(shape)
+    random_planes = [planes[i] for i in
+                     rng.integers(0, len(planes), N_RANDOM_PLANES)]
+    image = bioio.BioImage(path)
+    results.add("image.random_plane", parameters, time_each(
+        lambda tcz: read_plane(image, tcz), random_planes))
+
+    results.add("image.z_projection", parameters, time_call(
+        lambda image: image.dask_data[0, 0].max(axis=0).compute(),
+        repeat=repeat, setup=lambda: bioio.BioImage(path)))
+    results.add("image.t_projection", parameters, time_call(
+        lambda image: image.dask_data[:, 0, 0].max(axis=0).compute(),
+        repeat=repeat, setup=lambda: bioio.BioImage(path)))
+
+    # per frame, so runs on stacks of different lengths compare
+    movie = bioio.BioImage(path).get_image_data("TYX", C=0, Z=0)
+    results.add("image.detect_particles_per_frame", parameters, [
+        seconds / shape[0] for seconds in time_call(
+            lambda _: detect_particles(movie), repeat=repeat)])
+
+    # through the viewer, including painting the offscreen window
+    window = Window()
+    window.show()
+    results.add("image.open_file", parameters, time_call(
+        lambda _: (window.frappe_image.open_file(path), app.processEvents()),
+        repeat=repeat))
+
+    frappe_image = window.frappe_image
+
+    def refresh(t):
+        frappe_image._T = t
+        frappe_image.refresh_image_view()
+        app.processEvents()
+
+    results.add("image.refresh_image_view", parameters,
+                time_each(refresh, range(shape[0])))
+
+    view_rect = frappe_image.image_viewer.view.boundingRect()
+    positions = rng.uniform(0, 1, (N_CURSOR_READOUTS, 2)) * \
+        (view_rect.width(), view_rect.height())
+    results.add("image.cursor_readout", parameters, time_each(
+        lambda position: frappe_image.mouse_move_event(QPointF(*position)),
+        positions))
+    close_window(window)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark image browsing on synthetic TCZYX stacks.")
+    parser.add_argument("--shape", type=int, nargs=5, default=DEFAULT_SHAPE,
+                        metavar=("T", "C", "Z", "Y", "X"))
+    parser.add_argument("--dtype", nargs="+", default=["uint16"],
+                        choices=["uint8", "uint16", "float32"])
+    parser.add_argument("--compression", nargs="+",
+                        default=list(COMPRESSIONS),
+                        choices=list(COMPRESSIONS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="image_benchmarks.json")
+    parser.add_argument("--workdir", default=None,
+                        help="directory for the synthetic stacks, "
+                        "a temporary one by default")
+    arguments = parser.parse_args()
+
+    offscreen_application()
+    results = BenchmarkResults("image")
+    with tempfile.TemporaryDirectory(dir=arguments.workdir) as workdir:
+        for dtype in arguments.dtype:
+            for compression in arguments.compression:
+                path = os.path.join(workdir, f"stack_{dtype}_{compression}"
+                                    ".ome.tiff")
+                write_synthetic_stack(path, arguments.shape, dtype,
+                                      COMPRESSIONS[compression],
+                                      arguments.seed)
+                parameters = {"shape": list(arguments.shape),
+                              "dtype": dtype,
+                              "compression": compression,
+                              "file_bytes": os.path.getsize(path)}
+                benchmark_stack(results, path, parameters, arguments.repeat,
+                                arguments.seed)
+    results.write(arguments.output)
+
+
+if __name__ == "__main__":
+    main()
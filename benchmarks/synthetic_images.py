@@ -0,0 +1,66 @@
+import numpy as np
+
+# density of bright spots, so compressed files are neither trivially small
+# nor pure noise
+SPOTS_PER_MEGAPIXEL = 400
+SPOT_SIGMA_PIXELS = 2.0
+BACKGROUND = 100
+SPOT_AMPLITUDE = 1000
+NOISE_SIGMA = 10
+
+
+def synthetic_plane(rng, shape, spots, t, dtype):
+    # diffraction-limited spots that drift slowly with t on a noisy
+    # background
+    y, x = np.indices(shape, dtype=np.float32)
+    plane = np.full(shape, BACKGROUND, dtype=np.float32)
+    drift = 0.5 * t
+    for spot_y, spot_x in spots:
+        y0 = int(spot_y + drift) % shape[0]
+        x0 = int(spot_x + drift) % shape[1]
+        y_slice = slice(max(y0 - 8, 0), y0 + 9)
+        x_slice = slice(max(x0 - 8, 0), x0 + 9)
+        plane[y_slice, x_slice] += SPOT_AMPLITUDE * np.exp(
+            -((y[y_slice, x_slice] - y0) ** 2 +
+              (x[y_slice, x_slice] - x0) ** 2) /
+            (2 * SPOT_SIGMA_PIXELS ** 2))
+    plane += rng.normal(0, NOISE_SIGMA, shape).astype(np.float32)
+
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        # scale into the range of small integer types
+        if info.max < SPOT_AMPLITUDE + BACKGROUND:
+            plane *= info.max / (2 * (SPOT_AMPLITUDE + BACKGROUND))
+        return np.clip(np.rint(plane), info.min, info.max).astype(dtype)
+    return plane.astype(dtype)
+
+
+def synthetic_stack(shape, dtype=np.uint16, seed=0):
+    # a TCZYX stack, generated plane by plane
+    n_t, n_c, n_z, n_y, n_x = shape
+    dtype = np.dtype(dtype)
+    rng = np.random.default_rng(seed)
+    n_spots = max(int(SPOTS_PER_MEGAPIXEL * n_y * n_x / 1e6), 1)
+    stack = np.empty(shape, dtype=dtype)
+    for c in range(n_c):
+        spots = rng.uniform(0, 1, (n_spots, 2)) * (n_y, n_x)
+        for t in range(n_t):
+            for z in range(n_z):
+                stack[t, c, z] = synthetic_plane(rng, (n_y, n_x), spots, t,
+                                                 dtype)
+    return stack
+
+
+def write_synthetic_stack(path, shape, dtype=np.uint16, compression=None,
+                          seed=0):
+    # an OME-TIFF that bioio opens with its OME-TIFF reader; compression is
+    # a tifffile codec name such as "zlib", or None for uncompressed
+    from bioio.writers import OmeTiffWriter
+    from bioio_base.types import PhysicalPixelSizes
+
+    stack = synthetic_stack(shape, dtype, seed)
+    OmeTiffWriter.save(
+        stack, path, dim_order="TCZYX",
+        physical_pixel_sizes=PhysicalPixelSizes(0.5, 0.1, 0.1),
+        tifffile_kwargs={"compression": compression})
+    return path
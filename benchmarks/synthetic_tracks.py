@@ -0,0 +1,146 @@
+import numpy as np
+
+# the layout of MINFLUX exports that read_minflux_file understands, with the
+# per-iteration fields that make records as large as in real files
+N_ITERATIONS = 4
+MINFLUX_DTYPE = np.dtype([
+    ("vld", "?"),
+    ("tim", "<f8"),
+    ("tid", "<i4"),
+    ("itr", [("itr", "<i4"),
+             ("loc", "<f8", (3,)),
+             ("efo", "<f8"),
+             ("cfr", "<f8")], (N_ITERATIONS,))
+])
+MINFLUX_DT = 1.2e-4
+TRACKMATE_FRAME_INTERVAL = 0.05
+MEAN_TRACK_LENGTH = 200
+DIFFUSION_COEFFICIENT = 0.1
+LOCALIZATION_PRECISION = 5e-3
+FIELD_OF_VIEW = 20.0
+TRACKS_PER_CHUNK = 4096
+# MINFLUX misses iterations now and then, which shows as steps of a few dt
+MISSED_STEP_PROBABILITIES = (0.85, 0.1, 0.05)
+TIMESTAMP_JITTER = 0.01
+
+
+def track_lengths(rng, n_localizations, mean_length=MEAN_TRACK_LENGTH):
+    # geometric track lengths of at least two localizations, cut so they
+    # add up to n_localizations exactly
+    n_tracks = max(int(1.2 * n_localizations / mean_length), 1) + 1
+    lengths = rng.geometric(1 / max(mean_length - 1, 1), n_tracks) + 1
+    while np.sum(lengths) < n_localizations:
+        lengths = np.concatenate([
+            lengths, rng.geometric(1 / max(mean_length - 1, 1),
+                                   n_tracks) + 1])
+    ends = np.cumsum(lengths)
+    n_tracks = int(np.searchsorted(ends, n_localizations)) + 1
+    lengths = lengths[:n_tracks]
+    lengths[-1] -= ends[n_tracks - 1] - n_localizations
+    return lengths
+
+
+def random_walks(rng, lengths, step_sigma, precision):
+    # free diffusion from uniform starting points in the field of view,
+    # with Gaussian localization error, in three dimensions
+    n = int(np.sum(lengths))
+    starts = np.cumsum(lengths) - lengths
+    steps = rng.normal(0, step_sigma, (n, 3))
+    steps[starts] = rng.uniform(0, FIELD_OF_VIEW, (lengths.shape[0], 3))
+    steps[starts, 2] = 0
+    positions = np.cumsum(steps, axis=0)
+    # the cumulative sum runs across tracks, restart it at every start
+    offsets = positions[starts] - steps[starts]
+    positions -= np.repeat(offsets, lengths, axis=0)
+    return positions + rng.normal(0, precision, (n, 3))
+
+
+def _track_chunks(lengths):
+    for first in range(0, lengths.shape[0], TRACKS_PER_CHUNK):
+        yield first, lengths[first:first + TRACKS_PER_CHUNK]
+
+
+def write_minflux_file(path, n_localizations, mean_length=MEAN_TRACK_LENGTH,
+                       dt=MINFLUX_DT, seed=0):
+    # structured .npy in time order, written through a memory map in chunks
+    # of whole tracks so files of 10^8 localizations never sit in memory;
+    # positions are in metres like in MINFLUX exports
+    rng = np.random.default_rng(seed)
+    lengths = track_lengths(rng, n_localizations, mean_length)
+    records = np.lib.format.open_memmap(path, mode="w+", dtype=MINFLUX_DTYPE,
+                                        shape=(int(np.sum(lengths)),))
+    step_sigma = np.sqrt(2 * DIFFUSION_COEFFICIENT * dt)
+    time = 0.0
+    row = 0
+    for first, chunk_lengths in _track_chunks(lengths):
+        n = int(np.sum(chunk_lengths))
+        chunk = np.zeros(n, dtype=MINFLUX_DTYPE)
+        chunk["vld"] = True
+        chunk["tid"] = np.repeat(np.arange(first, first +
+                                           chunk_lengths.shape[0]),
+                                 chunk_lengths)
+
+        # timestamps advance by a whole number of jittered dt, with a gap
+        # between tracks while the next molecule is searched for
+        steps = rng.choice(np.arange(1, len(MISSED_STEP_PROBABILITIES) + 1),
+                           n, p=MISSED_STEP_PROBABILITIES) * dt
+        steps *= 1 + rng.normal(0, TIMESTAMP_JITTER, n)
+        starts = np.cumsum(chunk_lengths) - chunk_lengths
+        steps[starts] = rng.uniform(10 * dt, 1000 * dt, starts.shape[0])
+        chunk["tim"] = time + np.cumsum(steps)
+        time = chunk["tim"][-1]
+
+        positions = random_walks(rng, chunk_lengths, step_sigma,
+                                 LOCALIZATION_PRECISION) * 1e-6
+        for iteration in range(N_ITERATIONS):
+            chunk["itr"]["itr"][:, iteration] = iteration
+            # earlier iterations localize less precisely
+            chunk["itr"]["loc"][:, iteration] = positions + rng.normal(
+                0, LOCALIZATION_PRECISION * 1e-6 *
+                (N_ITERATIONS - 1 - iteration), (n, 3))
+            chunk["itr"]["efo"][:, iteration] = rng.normal(1e5, 1e4, n)
+            chunk["itr"]["cfr"][:, iteration] = rng.uniform(0, 0.8, n)
+
+        records[row:row + n] = chunk
+        row += n
+    records.flush()
+    del records
+    return path
+
+
+def write_trackmate_file(path, n_localizations,
+                         mean_length=MEAN_TRACK_LENGTH,
+                         frame_interval=TRACKMATE_FRAME_INTERVAL, seed=0):
+    # TrackMate's simple track export, streamed track by track; frames of a
+    # track skip now and then like after gap closing
+    rng = np.random.default_rng(seed)
+    lengths = track_lengths(rng, n_localizations, mean_length)
+    step_sigma = np.sqrt(2 * DIFFUSION_COEFFICIENT * frame_interval)
+    with open(path, "w") as tracks_file:
+        tracks_file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Tracks nTracks="{lengths.shape[0]}" spaceUnits="micron" '
+            f'frameInterval="{frame_interval}" timeUnits="s" '
+            'generationDateTime="synthetic" from="frappe benchmarks">\n')
+        for _, chunk_lengths in _track_chunks(lengths):
+            positions = random_walks(rng, chunk_lengths, step_sigma,
+                                     LOCALIZATION_PRECISION)
+            positions[:, 2] = 0
+            steps = rng.choice([1, 1, 1, 1, 1, 1, 1, 1, 1, 2],
+                               positions.shape[0])
+            starts = np.cumsum(chunk_lengths) - chunk_lengths
+            steps[starts] = rng.integers(0, 100, starts.shape[0])
+            frames = np.cumsum(steps)
+            frames -= np.repeat(frames[starts] - steps[starts],
+                                chunk_lengths)
+            for start, length in zip(starts, chunk_lengths):
+                tracks_file.write(f'  <particle nSpots="{length}">\n')
+                np.savetxt(
+                    tracks_file,
+                    np.column_stack([frames[start:start + length],
+                                     positions[start:start + length]]),
+                    fmt='    <detection t="%d" x="%.5f" y="%.5f" '
+                        'z="%.1f" />')
+                tracks_file.write("  </particle>\n")
+        tracks_file.write("</Tracks>\n")
+    return path
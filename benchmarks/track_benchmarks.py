@@ -0,0 +1,144 @@
+import argparse
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from benchmarks.benchmark_utilities import (
+    BenchmarkResults, close_window, offscreen_application, time_call,
+    time_each
+    )
+from benchmarks.synthetic_tracks import (
+    MEAN_TRACK_LENGTH, write_minflux_file, write_trackmate_file
+    )
+
+DEFAULT_SCALES = (10**3, 10**4, 10**5, 10**6)
+WRITERS = {"minflux": (write_minflux_file, "npy"),
+           "trackmate": (write_trackmate_file, "xml")}
+N_TICKS = 50
+# timers that never fire keep playback active while ticks are driven by hand
+NEVER = 2**30
+
+
+def remove_cache(path):
+    from frappe.utilities.track_cache import track_cache_path
+
+    shutil.rmtree(track_cache_path(path), ignore_errors=True)
+
+
+def benchmark_file(results, path, track_format, parameters, repeat):
+    from frappe.app import Window, TrackWindow
+    from frappe.utilities.reader_utilities import (
+        find_minflux_timestep, parse_tracks
+        )
+    from frappe.utilities.track_statistics import calculate_track_statistics
+
+    app = offscreen_application()
+
+    results.add("tracks.parse_tracks", parameters, time_call(
+        lambda _: parse_tracks(path, use_cache=False), repeat=repeat))
+    remove_cache(path)
+    parse_tracks(path)
+    results.add("tracks.parse_tracks_cached", parameters, time_call(
+        lambda _: parse_tracks(path), repeat=repeat))
+
+    if track_format == "minflux":
+        records = np.load(path, mmap_mode="r")
+        results.add("tracks.find_minflux_timestep", parameters, time_call(
+            lambda _: find_minflux_timestep(records), repeat=repeat))
+        del records
+
+    tracks, dt = parse_tracks(path)
+    results.add("tracks.calculate_track_statistics", parameters, time_call(
+        lambda _: calculate_track_statistics(tracks, dt), repeat=repeat))
+
+    main_window = Window()
+    window = TrackWindow(path, main_window)
+    window.show()
+    app.processEvents()
+    frappe_track = window.frappe_track
+    results.add("tracks.setup_track_table", parameters, time_call(
+        lambda _: frappe_track.setup_track_table(), repeat=repeat))
+
+    def tick(_):
+        frappe_track.play_track_visualization()
+        app.processEvents()
+
+    for mode, density in (("paths", False), ("density", True)):
+        frappe_track.set_density_rendering(density)
+        app.processEvents()
+        frappe_track.plot_timer.start(NEVER)
+        results.add(f"tracks.play_tick_{mode}", parameters,
+                    time_each(tick, range(N_TICKS)))
+        frappe_track.plot_timer.stop()
+        frappe_track.reset_current_chunks()
+    close_window(window)
+    close_window(main_window)
+    remove_cache(path)
+
+
+def scaling_exponents(results):
+    # slope of log median time over log localizations for every benchmark
+    # and format, which is what tells a linear path from a quadratic one
+    series = {}
+    for result in results.results:
+        key = (result["benchmark"], result["parameters"]["format"])
+        series.setdefault(key, []).append(
+            (result["parameters"]["localizations"],
+             result["seconds"]["median"]))
+    exponents = {}
+    for (benchmark, track_format), points in series.items():
+        if len(points) > 1:
+            sizes, seconds = np.log(np.array(points)).T
+            exponents[f"{benchmark}[{track_format}]"] = float(
+                np.polyfit(sizes, seconds, 1)[0])
+    return exponents
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark track loading and playback on synthetic "
+        "MINFLUX and TrackMate files.")
+    parser.add_argument("--localizations", type=float, nargs="+",
+                        default=DEFAULT_SCALES,
+                        help="file sizes, e.g. 1e3 1e5 1e8")
+    parser.add_argument("--format", nargs="+", default=list(WRITERS),
+                        choices=list(WRITERS))
+    parser.add_argument("--mean-length", type=int,
+                        default=MEAN_TRACK_LENGTH)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="track_benchmarks.json")
+    parser.add_argument("--workdir", default=None,
+                        help="directory for the synthetic files, "
+                        "a temporary one by default")
+    arguments = parser.parse_args()
+
+    offscreen_application()
+    results = BenchmarkResults("tracks")
+    with tempfile.TemporaryDirectory(dir=arguments.workdir) as workdir:
+        for track_format in arguments.format:
+            writer, extension = WRITERS[track_format]
+            for n_localizations in arguments.localizations:
+                n_localizations = int(n_localizations)
+                path = os.path.join(workdir, f"tracks_{n_localizations}."
+                                    f"{extension}")
+                writer(path, n_localizations, arguments.mean_length,
+                       seed=arguments.seed)
+                parameters = {"format": track_format,
+                              "localizations": n_localizations,
+                              "mean_length": arguments.mean_length,
+                              "file_bytes": os.path.getsize(path)}
+                benchmark_file(results, path, track_format, parameters,
+                               arguments.repeat)
+                os.remove(path)
+
+    exponents = scaling_exponents(results)
+    for name, exponent in exponents.items():
+        print(f"{name:<48} scales as n^{exponent:.2f}")
+    results.write(arguments.output, scaling=exponents)
+
+
+if __name__ == "__main__":
+    main()
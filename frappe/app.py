@@ -2,7 +2,7 @@ import sys
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QMessageBox, QFileDialog, QShortcut,
-    QHeaderView
+    QHeaderView, QAction, QActionGroup, QInputDialog, QLabel
     )
 from PyQt5.QtGui import QKeySequence, QDoubleValidator, QIntValidator
 from pyqtgraph import colormap, ColorMap, siFormat
@@ -13,6 +13,8 @@ from frappe.pyuic5_output import main_window, track_viewer
 from frappe.dialogs import metadata_dialog
 from frappe.utilities.cursor_label import CursorLabel
 from frappe.utilities.decorators import statusbar_message
+from frappe.utilities.instrumentation import recorder
+from frappe.widgets.latency_overlay import LatencyOverlay
 
 
 AVAILABLE_COLORMAPS = (["Gray", "Red", "Green", "Blue", "Cyan", "Magenta",
@@ -31,12 +33,31 @@ AVAILABLE_COLORMAPS = (["Gray", "Red", "Green", "Blue", "Cyan", "Magenta",
                         colormap.get("magma", source='matplotlib')])
 
 
+TEMPORAL_FILTERS = (["None", "Running average",
+                     "Median background subtraction",
+                     "Mean background subtraction",
+                     "Median background subtraction + running average",
+                     "Frame difference"],
+                    [None, "running_average", "median_background",
+                     "mean_background", "median_background_average",
+                     "frame_difference"])
+
+
+def export_latency_trace(parent):
+    filename, _ = QFileDialog.getSaveFileName(
+        parent=parent, caption="Export latency trace",
+        filter="Trace files (*.json)")
+    if filename:
+        recorder.export_json(filename)
+
+
 class Window(QMainWindow):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.ui = main_window.Ui_MainWindow()
         self.ui.setupUi(self)
         self.cursor_label = CursorLabel(self.statusBar())
+        self.latency_overlay = LatencyOverlay(self.centralWidget())
         self.setup_image_viewer()
         self.connect_actions()
         self.connect_signals_and_slots()
@@ -72,6 +93,47 @@ class Window(QMainWindow):
     def connect_actions(self):
         self.ui.actionOpen.triggered.connect(self.open_file_dialog)
         self.ui.actionShowMetadata.triggered.connect(self.open_metadata_dialog)
+        self.ui.actionOpenTrackOverlay.triggered.connect(
+            self.open_track_overlay_dialog
+        )
+        self.ui.actionShowTrackOverlay.toggled['bool'].connect(
+            self.frappe_image.set_track_overlay_visible
+        )
+        self.ui.actionFrapMaps.triggered.connect(self.frap_maps_dialog)
+
+        # temporal filters, one at a time
+        self.menu_temporal_filter = self.ui.menuAnalysis.addMenu(
+            "Temporal filter")
+        self.temporal_filter_actions = QActionGroup(self)
+        for label, name in zip(*TEMPORAL_FILTERS):
+            action = self.menu_temporal_filter.addAction(label)
+            action.setCheckable(True)
+            action.setChecked(name is None)
+            action.triggered.connect(
+                lambda _, name=name: self.frappe_image.set_temporal_filter(
+                    name))
+            self.temporal_filter_actions.addAction(action)
+        self.menu_temporal_filter.addSeparator()
+        self.action_temporal_window = self.menu_temporal_filter.addAction(
+            "Window...")
+        self.action_temporal_window.triggered.connect(
+            self.temporal_window_dialog)
+
+        # the image and the FRAP maps are shown one at a time
+        self.map_actions = QActionGroup(self)
+        for action, name in ((self.ui.actionShowImage, None),
+                             (self.ui.actionShowHalfTimeMap, "half_time"),
+                             (self.ui.actionShowMobileFractionMap,
+                              "mobile_fraction")):
+            self.map_actions.addAction(action)
+            action.triggered.connect(
+                lambda _, name=name: self.frappe_image.show_map(name))
+        self.ui.actionShowLatencyOverlay.toggled['bool'].connect(
+            self.latency_overlay.set_enabled
+        )
+        self.ui.actionExportLatencyTrace.triggered.connect(
+            lambda: export_latency_trace(self)
+        )
 
         # keyboard shortcuts for sliders
         self.action_frame_forward_slow = QShortcut(QKeySequence("Right"), self)
@@ -183,7 +245,9 @@ class Window(QMainWindow):
 
         # text line
         self.ui.bar_length.textChanged.connect(
-            lambda: self.refresh_scale_bar(self.ui.show_scale_bar.isChecked())
+            lambda: self.frappe_image.render_scheduler.request(
+                "scale_bar", lambda: self.refresh_scale_bar(
+                    self.ui.show_scale_bar.isChecked()))
         )
 
     @statusbar_message("Opening file...")
@@ -201,6 +265,7 @@ class Window(QMainWindow):
                     self.show()
                 self.frappe_image.open_file(filename)
                 self.frappe_image.populate_metadata_table(self.ui.info_table)
+                self.enable_map_actions(False)
 
                 self.hide_and_show_sliders()
                 self.refresh_scale_bar(self.ui.show_scale_bar.isChecked())
@@ -214,6 +279,47 @@ class Window(QMainWindow):
                 if self.isVisible():
                     self.hide()
 
+    @statusbar_message("Opening track overlay...")
+    def open_track_overlay_dialog(self):
+        # tracks are drawn on the image, unlike opening them in a track window
+        filename, _ = QFileDialog.getOpenFileName(
+            parent=self, caption="Overlay tracks",
+            filter="Track file (*.npy *.xml)")
+        if filename:
+            self.frappe_image.open_track_overlay(filename)
+            self.ui.actionShowTrackOverlay.setEnabled(True)
+            self.frappe_image.set_track_overlay_visible(
+                self.ui.actionShowTrackOverlay.isChecked())
+
+    @statusbar_message("Fitting FRAP recovery maps...")
+    def frap_maps_dialog(self):
+        if not self.frappe_image.has_T:
+            return
+
+        # frames are counted from one like on the frame slider
+        n_frames = self.frappe_image.current_image.dims.T
+        frame, accepted = QInputDialog.getInt(
+            self, "FRAP recovery maps", "First frame after bleaching:",
+            value=max(self.frappe_image.T + 1, 2), min=2, max=n_frames - 2)
+        if accepted:
+            self.frappe_image.calculate_frap_maps(frame - 1)
+            self.enable_map_actions(True)
+            self.ui.actionShowHalfTimeMap.setChecked(True)
+            self.frappe_image.show_map("half_time")
+
+    def temporal_window_dialog(self):
+        window, accepted = QInputDialog.getInt(
+            self, "Temporal filter", "Window (frames):",
+            value=self.frappe_image.temporal_window, min=2, max=1000)
+        if accepted:
+            self.frappe_image.set_temporal_filter(
+                self.frappe_image.temporal_filter, window)
+
+    def enable_map_actions(self, enabled):
+        for action in self.map_actions.actions():
+            action.setEnabled(enabled)
+        self.ui.actionShowImage.setChecked(True)
+
     def hide_and_show_sliders(self):
         # show relevant sliders
         if self.frappe_image.has_T:
@@ -309,7 +415,14 @@ class TrackWindow(QMainWindow):
         self.frappe_track.add_track_table(self.ui.track_table)
         self.frappe_track.add_frame_rate_label(self.ui.update_rate_label)
         self.frappe_track.add_time_label(self.ui.time_label)
+        self.pick_label = QLabel()
+        self.ui.statusbar.addPermanentWidget(self.pick_label)
+        self.frappe_track.add_pick_label(self.pick_label)
+        self.memory_label = QLabel()
+        self.ui.statusbar.addPermanentWidget(self.memory_label)
+        self.latency_overlay = LatencyOverlay(self.centralWidget())
         self.frappe_track.open_file(file)
+        self.refresh_memory_label()
         self.ui.localizations_per_second.setText(
             f"{self.frappe_track.frames_per_update:.0f}"
         )
@@ -317,6 +430,7 @@ class TrackWindow(QMainWindow):
             f"{self.frappe_track.max_localizations_per_track}"
         )
         self.called_from = called_from
+        self.connect_actions()
         self.connect_signals_and_slots()
         self.refresh_scale_bar(self.ui.show_scale_bar.isChecked())
 
@@ -325,6 +439,10 @@ class TrackWindow(QMainWindow):
             QDoubleValidator().setRange(0, 1000000)
         )
 
+        self.ui.splat_sigma.setValidator(
+            QDoubleValidator().setRange(0, 1000000)
+        )
+
         self.ui.localizations_per_second.setValidator(
             QDoubleValidator().setRange(1, 1000000)
         )
@@ -333,6 +451,57 @@ class TrackWindow(QMainWindow):
             QIntValidator().setRange(1, 10000000)
         )
 
+    def connect_actions(self):
+        # context menu of the track table
+        self.action_show_selected_tracks = QAction("Show selected tracks",
+                                                   self)
+        self.action_show_selected_tracks.triggered.connect(
+            lambda: self.frappe_track.set_selected_tracks_visible(True)
+        )
+        self.action_hide_selected_tracks = QAction("Hide selected tracks",
+                                                   self)
+        self.action_hide_selected_tracks.triggered.connect(
+            lambda: self.frappe_track.set_selected_tracks_visible(False)
+        )
+        self.action_show_all_tracks = QAction("Show all tracks", self)
+        self.action_show_all_tracks.triggered.connect(
+            lambda: self.frappe_track.set_all_tracks_visible(True)
+        )
+        self.action_hide_all_tracks = QAction("Hide all tracks", self)
+        self.action_hide_all_tracks.triggered.connect(
+            lambda: self.frappe_track.set_all_tracks_visible(False)
+        )
+        self.action_calculate_diffusion = QAction("Calculate diffusion",
+                                                  self)
+        self.action_calculate_diffusion.triggered.connect(
+            lambda: self.calculate_diffusion()
+        )
+        self.action_sample_intensities = QAction("Sample intensities...",
+                                                 self)
+        self.action_sample_intensities.triggered.connect(
+            self.sample_intensities_dialog
+        )
+
+        # latency instrumentation, the track window has no menu bar
+        self.action_show_latency_overlay = QShortcut(
+            QKeySequence("Ctrl+Shift+L"), self)
+        self.action_show_latency_overlay.activated.connect(
+            lambda: self.latency_overlay.set_enabled(
+                not self.latency_overlay.isVisible())
+        )
+        self.action_export_latency_trace = QShortcut(
+            QKeySequence("Ctrl+Shift+E"), self)
+        self.action_export_latency_trace.activated.connect(
+            lambda: export_latency_trace(self)
+        )
+
+        self.ui.track_table.addActions([self.action_show_selected_tracks,
+                                        self.action_hide_selected_tracks,
+                                        self.action_show_all_tracks,
+                                        self.action_hide_all_tracks,
+                                        self.action_calculate_diffusion,
+                                        self.action_sample_intensities])
+
     def connect_signals_and_slots(self):
         # buttons
         self.ui.play_button.clicked['bool'].connect(
@@ -357,6 +526,22 @@ class TrackWindow(QMainWindow):
                                  "show_labels", show > 0)
         )
 
+        self.ui.roi_checkbox.stateChanged['int'].connect(
+            lambda enabled: self.frappe_track.set_filter_roi(enabled > 0)
+        )
+
+        self.ui.follow_checkbox.stateChanged['int'].connect(
+            lambda enabled: self.frappe_track.set_follow(enabled > 0)
+        )
+
+        self.ui.density_checkbox.stateChanged['int'].connect(
+            lambda enabled: self.frappe_track.set_density_rendering(
+                enabled > 0)
+        )
+
+        # file following
+        self.frappe_track.tracksAppended.connect(self.refresh_memory_label)
+
         # text line
         self.ui.localizations_per_second.textChanged.connect(
             lambda fpu: setattr(self.frappe_track,
@@ -369,9 +554,54 @@ class TrackWindow(QMainWindow):
         )
 
         self.ui.bar_length.textChanged.connect(
-            lambda: self.refresh_scale_bar(self.ui.show_scale_bar.isChecked())
+            lambda: self.frappe_track.render_scheduler.request(
+                "scale_bar", lambda: self.refresh_scale_bar(
+                    self.ui.show_scale_bar.isChecked()))
         )
 
+        self.ui.filter_expression.returnPressed.connect(
+            self.apply_track_filter
+        )
+
+        self.ui.splat_sigma.textChanged.connect(self.refresh_splat_sigma)
+
+    def apply_track_filter(self):
+        try:
+            self.frappe_track.apply_track_filter(
+                self.ui.filter_expression.text())
+        except (SyntaxError, NameError, ValueError, TypeError,
+                KeyError) as error:
+            self.ui.statusbar.showMessage(f"Invalid filter: {error}", 5000)
+
+    def refresh_splat_sigma(self):
+        if len(self.ui.splat_sigma.text()) > 0:
+            self.frappe_track.set_density_splat_sigma(
+                float(self.ui.splat_sigma.text()))
+
+    @statusbar_message("Calculating mean squared displacements...")
+    def calculate_diffusion(self):
+        self.frappe_track.calculate_diffusion()
+
+    @statusbar_message("Sampling intensities...")
+    def sample_intensities_dialog(self):
+        filename, _ = QFileDialog.getOpenFileName(
+            parent=self, caption="Sample intensities from image",
+            filter="Image files (*.czi *.czmbi *.tif *.tiff *.nd2)")
+        if filename:
+            self.frappe_track.calculate_intensities(filename)
+            self.refresh_memory_label()
+
+    def refresh_memory_label(self):
+        report = self.frappe_track.memory_report()
+        if report is None:
+            self.memory_label.setText("")
+            return
+
+        self.memory_label.setText(f"Tracks: {report.sum() / 2**20:.1f} MB")
+        self.memory_label.setToolTip("\n".join(
+            f"{column}: {size / 2**20:.1f} MB" for column, size in
+            report.items()))
+
     def refresh_scale_bar(self, refresh):
         self.ui.bar_length.setEnabled(refresh)
         if (refresh and self.frappe_track.tracks is not None and
@@ -388,6 +618,11 @@ class TrackWindow(QMainWindow):
         else:
             self.frappe_track.scale_bar.hide()
 
+    def closeEvent(self, event):
+        # a closed window stops holding the latency recorder
+        self.latency_overlay.set_enabled(False)
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
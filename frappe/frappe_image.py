@@ -4,8 +4,20 @@ from PyQt5 import QtCore
 from PyQt5.QtWidgets import QTableWidgetItem
 from pyqtgraph import colormap, ScaleBar, mkBrush, mkPen
 import numpy as np
+import os
 import xml.etree.ElementTree as ET
 
+from frappe.utilities.decorators import coalesced, instrumented
+from frappe.utilities.frap_maps import frap_maps
+from frappe.utilities.temporal_filters import (
+    DEFAULT_WINDOW, temporal_pipeline
+    )
+from frappe.utilities.render_scheduler import RenderScheduler
+from frappe.widgets.track_overlay import TrackOverlay
+
+# stacks with more values than this are fitted on a process pool
+FRAP_POOL_VALUES = 2**25
+
 
 class FrappeImage(QtCore.QObject):
 
@@ -27,6 +39,16 @@ class FrappeImage(QtCore.QObject):
         self._colormap = colormap.get("gray", source='matplotlib')
         self._invert_colormap = False
         self.last_mouse_pos = QtCore.QPointF(0.0, 0.0)
+        self.render_scheduler = RenderScheduler(self)
+        self.track_overlay = None
+        self.frap_maps = None
+        self.displayed_map = None
+        self.temporal_filter = None
+        self.temporal_window = DEFAULT_WINDOW
+        self.temporal_pipeline = None
+        self._temporal_pipeline_key = None
+        self._raw_plane = None
+        self._raw_plane_key = None
 
     @property
     def T(self):
@@ -35,7 +57,7 @@ class FrappeImage(QtCore.QObject):
     @T.setter
     def T(self, t):
         self._T = t
-        self.refresh_image_view()
+        self.request_image_refresh()
 
     @property
     def C(self):
@@ -44,7 +66,7 @@ class FrappeImage(QtCore.QObject):
     @C.setter
     def C(self, c):
         self._C = c
-        self.refresh_image_view()
+        self.request_image_refresh()
 
     @property
     def Z(self):
@@ -53,7 +75,7 @@ class FrappeImage(QtCore.QObject):
     @Z.setter
     def Z(self, z):
         self._Z = z
-        self.refresh_image_view()
+        self.request_image_refresh()
 
     @property
     def has_T(self):
@@ -80,7 +102,7 @@ class FrappeImage(QtCore.QObject):
     @autoscale.setter
     def autoscale(self, auto):
         self._autoscale = auto
-        self.refresh_image_view()
+        self.request_image_refresh()
 
     @property
     def colormap(self):
@@ -106,6 +128,7 @@ class FrappeImage(QtCore.QObject):
         if self.image_viewer is not None:
             self.image_viewer.setColorMap(self._colormap)
 
+    @instrumented()
     def mouse_move_event(self, mouse_position):
         if self.image_viewer is not None:
             # mouse_position = event.scenePos()
@@ -122,8 +145,7 @@ class FrappeImage(QtCore.QObject):
                                                 bounding_rect.top() -
                                                 bounding_padding)]
             if self.current_image is not None:
-                image = self.current_image.get_image_data("XY", T=self.T,
-                                                          C=self.C, Z=self.Z)
+                image = self.get_image_data()
 
                 for i, value in enumerate(x_y_values):
                     if value >= image.shape[i]:
@@ -168,32 +190,122 @@ class FrappeImage(QtCore.QObject):
 
     def open_file(self, image_path):
         self.file_path = image_path
+        self.frap_maps = None
+        self.displayed_map = None
+        self.temporal_pipeline = None
+        self._raw_plane_key = None
         self.fetch_image(image_path)
         self.update_cursor_label_dims()
 
         self._T, self._C, self._Z = 0, 0, 0
+        self.update_track_overlay_pixel_size()
         self.refresh_image_view()
         self.scale_bar.setParentItem(self.image_viewer.getView())
 
+    def open_track_overlay(self, track_path):
+        if self.track_overlay is None:
+            self.track_overlay = TrackOverlay(self.image_viewer.getView())
+        self.update_track_overlay_pixel_size()
+        self.track_overlay.frame = self.T
+        self.track_overlay.open_file(track_path)
+
+    def update_track_overlay_pixel_size(self):
+        if self.track_overlay is not None and self.current_image is not None:
+            self.track_overlay.set_pixel_size(
+                self.current_image.physical_pixel_sizes.X,
+                self.current_image.physical_pixel_sizes.Y)
+
+    def set_track_overlay_visible(self, visible):
+        if self.track_overlay is not None:
+            self.track_overlay.set_visible(visible)
+
     def fetch_image(self, image_path):
         self.current_image = bioio.BioImage(image_path)
 
+    @instrumented()
+    def get_image_data(self):
+        # a displayed map replaces the planes of the stack
+        if self.displayed_map is not None:
+            return self.displayed_map
+        if self.temporal_filter is not None and self.has_T:
+            return self.filtered_plane()
+        # the displayed plane is kept for cursor updates
+        key = (self.T, self.C, self.Z)
+        if self._raw_plane_key != key:
+            self._raw_plane = self.read_plane(*key)
+            self._raw_plane_key = key
+        return self._raw_plane
+
+    def read_plane(self, t, c, z):
+        # only the requested plane is read from the file; get_image_data
+        # would load the whole stack on its first call
+        return self.current_image.get_image_dask_data(
+            "XY", T=t, C=c, Z=z).compute()
+
+    def filtered_plane(self):
+        # the pipeline and its caches belong to one channel and Z plane
+        key = (self.C, self.Z)
+        if self.temporal_pipeline is None or \
+                self._temporal_pipeline_key != key:
+            self.temporal_pipeline = temporal_pipeline(
+                lambda t, c=self.C, z=self.Z: self.read_plane(t, c, z),
+                self.current_image.dims.T, self.temporal_filter,
+                self.temporal_window)
+            self._temporal_pipeline_key = key
+        return self.temporal_pipeline.plane(self.T)
+
+    def set_temporal_filter(self, name, window=None):
+        # filter planes over time between the reader and the view, None
+        # shows the raw planes
+        self.temporal_filter = name
+        if window is not None:
+            self.temporal_window = window
+        self.temporal_pipeline = None
+        if self.current_image is not None:
+            self.refresh_image_view(scale_hist=True)
+
+    @coalesced
+    def request_image_refresh(self):
+        self.refresh_image_view()
+
+    @instrumented()
     def refresh_image_view(self, scale_hist=False, reset_autorange=False):
         if scale_hist or self.autoscale:
-            self.image_viewer.setImage(self.current_image.get_image_data(
-                "XY", T=self.T, C=self.C, Z=self.Z),
-                autoRange=reset_autorange,
-                autoLevels=True)
+            self.image_viewer.setImage(self.get_image_data(),
+                                       autoRange=reset_autorange,
+                                       autoLevels=True)
         else:
-            self.image_viewer.setImage(self.current_image.get_image_data(
-                "XY", T=self.T, C=self.C, Z=self.Z),
-                autoHistogramRange=False,
-                autoRange=reset_autorange,
-                autoLevels=self.autoscale)
+            self.image_viewer.setImage(self.get_image_data(),
+                                       autoHistogramRange=False,
+                                       autoRange=reset_autorange,
+                                       autoLevels=self.autoscale)
         self.image_viewer.setColorMap(self._colormap)
+        # overlaid tracks follow the frame within the same render
+        if self.track_overlay is not None:
+            self.track_overlay.set_frame(self.T)
         # update the position and value as user moves through stack
         self.mouse_move_event(self.last_mouse_pos)
 
+    def calculate_frap_maps(self, bleach_frame):
+        # recovery maps of the current channel and Z plane, in seconds when
+        # the time interval is known and in frames otherwise
+        stack = self.current_image.get_image_data("TYX", C=self.C, Z=self.Z)
+        dt = getattr(self.current_image, "time_interval", None) or 1.0
+        n_workers = 1
+        if stack.size > FRAP_POOL_VALUES:
+            n_workers = os.cpu_count() or 1
+        self.frap_maps = frap_maps(stack, bleach_frame, dt,
+                                   n_workers=n_workers)
+
+    def show_map(self, name=None):
+        # show one of the FRAP maps with the current colormap, or the stack
+        # again without a name
+        if name is None or self.frap_maps is None:
+            self.displayed_map = None
+        else:
+            self.displayed_map = self.frap_maps[name].T
+        self.refresh_image_view(scale_hist=True)
+
     def reset_autorange(self):
         self.refresh_image_view(reset_autorange=True)
 
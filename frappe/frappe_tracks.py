@@ -1,54 +1,130 @@
-
 from PyQt5 import QtCore
-from PyQt5.QtWidgets import QTableWidgetItem, QCheckBox, QSpinBox
-from PyQt5.QtCore import QTimer
-from PyQt5.QtGui import QFont
-from pyqtgraph import ScaleBar, TextItem, mkBrush, mkPen
+from PyQt5.QtCore import QTimer, Qt, QRectF
+from pyqtgraph import (
+    ScaleBar, PlotDataItem, ImageItem, RectROI, colormap, mkBrush, mkPen
+    )
 import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
+import os
 import time
-
-from frappe.utilities.reader_utilities import parse_tracks
+import threading
+
+from frappe.utilities.decorators import instrumented
+from frappe.utilities.render_scheduler import RenderScheduler
+from frappe.utilities.reader_utilities import (
+    parse_tracks, compact_tracks, memory_report, track_microns_per_unit,
+    track_times
+    )
+from frappe.utilities.track_statistics import calculate_track_statistics
+from frappe.utilities.msd_analysis import calculate_msd, fit_msd
+from frappe.utilities.intensity_traces import (
+    intensity_traces, intensity_statistics
+    )
+from frappe.utilities.track_filter import evaluate_track_filter
+from frappe.utilities.track_follower import track_follower
+from frappe.utilities.track_buffer import TrackBuffer
+from frappe.utilities.track_rendering import (
+    track_color_indices, group_track_paths
+    )
+from frappe.utilities.frame_index import (
+    FrameIndex, TrackFrameIndex, concatenate_ranges, in_ranges
+    )
+from frappe.utilities.playback_buffer import PlaybackBuffer
+from frappe.utilities.density_rendering import (
+    DensityPyramid, DensityAccumulator, bin_localizations, splat_density,
+    density_levels
+    )
+from frappe.utilities.spatial_index import SpatialIndex
+from frappe.utilities.track_simplification import TrackLevelsOfDetail
+from frappe.widgets.track_labels import TrackLabelLayer
+from frappe.widgets.track_table_model import (
+    TrackTableModel, FrameSpinBoxDelegate, TRACK_ID_COLUMN,
+    FRAME_START_COLUMN, FRAME_END_COLUMN
+    )
 
 FRAME_UPDATE_RATE = 50
+PICK_RADIUS_PIXELS = 8
+MSD_POOL_LOCALIZATIONS = 2000000
+FOLLOW_INTERVAL = 1000
+LEVEL_OF_DETAIL_PIXELS = 2
+SPATIAL_INDEX_GROWTH = 2
+INTENSITY_RADIUS = 1
 
 
 class FrappeTrack(QtCore.QObject):
+    levelsOfDetailReady = QtCore.pyqtSignal(int, object)
+    tracksAppended = QtCore.pyqtSignal()
 
     def __init__(self) -> None:
         super().__init__()
         self.track_plot = None
         self.track_table = None
+        self.track_table_model = None
         self.frame_rate_label = None
         self.time_label = None
+        self.pick_label = None
         self.tracks = None
         self.dt = 0
+        self.float32_coordinates = False
         self.current_tracks = None
+        # per-track [lo, hi) rows of current_tracks, None for the full table
+        self.current_windows = None
         self.file_path = None
         self.scale_bar = ScaleBar(size=1, width=5, suffix="µm",
                                   brush=mkBrush(255, 255, 255, 255),
                                   pen=mkPen(color=(0, 0, 0)),
                                   offset=(-25, -25))
 
-        self.visible_ids = []
+        self.track_visibility = np.zeros(0, dtype=bool)
         self.frame_range = [-np.inf, np.inf]
         self.frames_per_update = 25
         self.max_localizations_per_track = 1000
         self.average_update_rate = 1000 / FRAME_UPDATE_RATE
         self._last_update_time = time.time()
         self._play_time = 0
-        self.track_centroids = {}
-        self.track_radii_of_gyration = {}
+        self.track_statistics = None
+        self.msd = None
+        self.msd_counts = None
+        self.filter_expression = ""
+        self.filter_roi = None
         self._show_labels = True
-        self.track_labels = {}
+        self.track_label_layer = None
         self.track_plot_items = {}
-        self.current_chunks = {}
-        self.track_ranges = {}
-        self._max_frames = {}
+        self.batched_rendering = True
+        self.track_path_items = {}
+        self._track_color_indices = None
+        self.frame_index = None
+        self.track_frame_index = None
+        self.incremental_playback = True
+        self.playback_buffer = None
+        self.spatial_index = None
+        self.view_culling = True
+        self.track_bounds_item = None
+        self.levels_of_detail = None
+        self._levels_of_detail_generation = 0
+        self.level_of_detail_rendering = True
+        self.density_rendering = False
+        self.density_splat_sigma = 0.0
+        self.density_image = None
+        self.density_pyramid = None
+        self._density_rows = None
+        self.density_accumulator = None
+        self.follower = None
+        self.track_buffer = None
+        self.current_chunks = np.zeros(0)
+        self.track_ranges = np.zeros((0, 2))
+        self._max_frames = np.zeros(0)
+
+        self._refresh_recalculate = False
+        self._refresh_clear = False
+        self.render_scheduler = RenderScheduler(self)
 
         self.plot_timer = QTimer(self)
         self.plot_timer.timeout.connect(self.play_track_visualization)
+        self.levelsOfDetailReady.connect(self.levels_of_detail_ready)
+        self.follow_timer = QTimer(self)
+        self.follow_timer.timeout.connect(self.follow_file)
 
     @property
     def localizations_per_second(self):
@@ -58,6 +134,17 @@ class FrappeTrack(QtCore.QObject):
     def localizations_per_second(self, value):
         self.frames_per_update = value / self.average_update_rate
 
+    @property
+    def visible_ids(self):
+        if self.track_statistics is None:
+            return np.zeros(0)
+        return self.track_statistics.index.to_numpy()[self.track_visibility]
+
+    @visible_ids.setter
+    def visible_ids(self, ids):
+        self.track_visibility[:] = False
+        self.track_visibility[self.track_frame_index.positions(ids)] = True
+
     @property
     def show_labels(self):
         return self._show_labels
@@ -65,14 +152,14 @@ class FrappeTrack(QtCore.QObject):
     @show_labels.setter
     def show_labels(self, value):
         self._show_labels = value
-        self.refresh_plot_view(recalculate_tracks=True,
-                               synchronize_tracks=False,
-                               frame_range=[-np.inf, np.inf],
-                               reset=False,
-                               clear_existing=True)
+        self.refresh_track_labels()
 
     def add_track_plot(self, track_plot):
         self.track_plot = track_plot
+        self.track_plot.plotItem.getViewBox().sigRangeChanged.connect(
+            self.view_range_changed
+        )
+        self.track_plot.scene().sigMouseMoved.connect(self.mouse_move_event)
 
     def add_track_table(self, track_table):
         self.track_table = track_table
@@ -83,12 +170,32 @@ class FrappeTrack(QtCore.QObject):
     def add_time_label(self, label):
         self.time_label = label
 
+    def add_pick_label(self, label):
+        self.pick_label = label
+
     def open_file(self, track_path):
+        tracks, dt = parse_tracks(
+            track_path, float32_coordinates=self.float32_coordinates)
+        self.set_tracks(tracks, dt, track_path)
+
+    def set_tracks(self, tracks, dt, track_path=None):
+        # tracks with frame, x, y, z and id columns, e.g. parsed from a file
+        # or linked from detections; only tracks from a file can be followed
         self.file_path = track_path
-        self.tracks, self.dt = parse_tracks(self.file_path)
-        self.current_tracks = self.tracks.copy()
-        self.visible_ids = list(np.unique(self.tracks["id"]))
-        self.calculate_track_centroids()
+        self.tracks = compact_tracks(tracks, self.float32_coordinates)
+        self.track_buffer = None
+        self.dt = dt
+        self.setup_frame_indices()
+        # current_tracks is only ever replaced, never written to, so the
+        # full table is shared instead of copied
+        self.current_tracks = self.tracks
+        self.current_windows = None
+        self.calculate_track_statistics()
+        self.setup_spatial_index()
+        self.setup_levels_of_detail()
+        self.track_visibility = np.ones(len(self.track_statistics),
+                                        dtype=bool)
+        self.setup_track_colors()
         self.add_track_labels()
         self.reset_current_chunks()
         self.setup_max_frames()
@@ -96,30 +203,278 @@ class FrappeTrack(QtCore.QObject):
         self.refresh_plot_view(clear_existing=True)
         self.scale_bar.setParentItem(self.track_plot.plotItem.getViewBox())
 
-    def calculate_track_centroids(self):
+    def set_follow(self, enabled):
+        if enabled and self.file_path is not None:
+            if self.follower is None:
+                self.follower = track_follower(self.file_path, self.dt,
+                                               self.tracks)
+            self.follow_timer.start(FOLLOW_INTERVAL)
+        else:
+            self.follow_timer.stop()
+
+    def follow_file(self):
+        new_tracks = self.follower.read_new()
+        if new_tracks is not None:
+            self.append_tracks(new_tracks)
+
+    def append_tracks(self, new_tracks):
+        # growing tracks only gain later frames, so every new localization
+        # goes right behind the current end of its track. The table grows
+        # in place and the indexes are updated from the first track that
+        # changed on, which is one of the last ones while recording.
+        new_ids = new_tracks["id"].to_numpy()
+        positions = np.searchsorted(self.tracks["id"].to_numpy(), new_ids,
+                                    side="right")
+        if self.track_buffer is None:
+            self.track_buffer = TrackBuffer(self.tracks)
+        first_row = self.track_buffer.insert(positions, new_tracks)
+        self.tracks = self.track_buffer.tracks()
+
+        previous_statistics = self.track_statistics
+        if self.track_frame_index.update(self.tracks["id"].to_numpy(),
+                                         self.tracks["frame"].to_numpy(),
+                                         first_row):
+            self.frame_index.insert(self.tracks["frame"].to_numpy(),
+                                    positions)
+            self.update_spatial_index(positions)
+            self.update_levels_of_detail(first_row)
+        else:
+            # localizations earlier than the end of their track sort the
+            # whole table again
+            self.track_buffer = None
+            self.setup_frame_indices()
+            self.setup_spatial_index()
+            self.setup_levels_of_detail()
+        self.update_track_statistics(np.unique(new_ids))
+        self.extend_track_state(previous_statistics)
+        self.add_track_labels()
+        self.update_track_table()
+
+        # the path items are updated in place; playback restarts its buffer
+        # and recalculates the displayed localizations on its next update
+        self.playback_buffer = None
+        self.density_pyramid = None
+        self.density_accumulator = None
+        self.current_tracks = self.tracks
+        self.current_windows = None
+        if not self.plot_timer.isActive():
+            self.calculate_current_tracks()
+        if self.filter_expression or self.filter_roi is not None:
+            self.apply_track_filter()
+        elif not self.plot_timer.isActive():
+            self.refresh_plot_view()
+        self.tracksAppended.emit()
+
+    def update_track_statistics(self, track_ids):
+        # only tracks that received localizations are recalculated; metrics
+        # of other analyses are dropped for them
+        positions = self.track_frame_index.positions(track_ids)
+        rows = concatenate_ranges(self.track_frame_index.starts[positions],
+                                  self.track_frame_index.ends[positions])
+        updated = calculate_track_statistics(self.tracks.iloc[rows], self.dt)
+        self.track_statistics = pd.concat([
+            self.track_statistics.drop(updated.index, errors="ignore"),
+            updated
+        ]).sort_index()
+
+    def extend_track_state(self, previous_statistics):
+        # carry visibility, frame ranges and playback positions over to the
+        # new track order; new tracks are visible and shown in full
+        previous_index = previous_statistics.index
+        self._max_frames = self.track_statistics["frame_end"].to_numpy()
+        self.track_visibility = pd.Series(
+            self.track_visibility, index=previous_index).reindex(
+                self.track_statistics.index, fill_value=True).to_numpy(
+                    dtype=bool, copy=True)
+        self.current_chunks = pd.Series(
+            self.current_chunks, index=previous_index).reindex(
+                self.track_statistics.index, fill_value=0).to_numpy(
+                    dtype=np.float64, copy=True)
+
+        # ranges that ended at the last frame keep following the track
+        previous_ranges = self.track_ranges.copy()
+        at_end = previous_ranges[:, 1] >= \
+            previous_statistics["frame_end"].to_numpy()
+        previous_ranges[at_end, 1] = np.inf
+        track_ranges = pd.DataFrame(previous_ranges,
+                                    index=previous_index).reindex(
+                                        self.track_statistics.index)
+        track_ranges[0] = track_ranges[0].fillna(0)
+        track_ranges[1] = track_ranges[1].fillna(np.inf)
+        self.track_ranges = np.column_stack([
+            track_ranges[0].to_numpy(),
+            np.minimum(track_ranges[1].to_numpy(), self._max_frames)
+        ]).astype(np.float64)
+
+        # colours are only assigned to new tracks
+        colors = pd.Series(self._track_color_indices,
+                           index=previous_index).reindex(
+                               self.track_statistics.index)
+        new_tracks = colors.isna().to_numpy()
+        colors[new_tracks] = track_color_indices(
+            self.track_statistics.index[new_tracks],
+            len(plt.rcParams['axes.prop_cycle'].by_key()['color']))
+        self._track_color_indices = colors.to_numpy(dtype=np.intp)
+
+    def memory_report(self):
+        if self.tracks is None:
+            return None
+        return memory_report(self.tracks)
+
+    def setup_frame_indices(self):
         if self.tracks is not None:
-            for track_id in np.unique(self.tracks["id"]):
-                current_df = self.tracks[self.tracks["id"] == track_id]
-                self.track_centroids[track_id] = np.mean(
-                    current_df[["x", "y", "z"]].to_numpy(), axis=0
-                )
-                self.track_radii_of_gyration[track_id] = np.std(
-                    current_df[["x", "y", "z"]].to_numpy(), axis=0
-                )
+            # keep tracks contiguous and frame-sorted so per-track frame
+            # windows are plain index ranges
+            self.track_frame_index = TrackFrameIndex(
+                self.tracks["id"].to_numpy(), self.tracks["frame"].to_numpy())
+            # parsed tracks already come in this order, which keeps a
+            # memory-mapped table from being copied
+            order = self.track_frame_index.order
+            if np.any(order != np.arange(order.shape[0])):
+                self.tracks = self.tracks.iloc[order].reset_index(drop=True)
+                self.track_frame_index.order = np.arange(len(self.tracks))
+            self.frame_index = FrameIndex(self.tracks["frame"].to_numpy())
+
+    def setup_spatial_index(self):
+        if self.tracks is not None:
+            self.spatial_index = SpatialIndex(self.tracks["x"].to_numpy(),
+                                              self.tracks["y"].to_numpy(),
+                                              self.track_frame_index.starts,
+                                              self.track_frame_index.ends)
+
+    def update_spatial_index(self, positions):
+        # the grid is sized for the localizations it was built with, so it
+        # is built again once the table has grown well beyond them
+        if len(self.tracks) > SPATIAL_INDEX_GROWTH * \
+                self.spatial_index.indexed_points:
+            self.setup_spatial_index()
+        else:
+            self.spatial_index.insert(self.tracks["x"].to_numpy(),
+                                      self.tracks["y"].to_numpy(),
+                                      self.track_frame_index.starts,
+                                      self.track_frame_index.ends, positions)
+
+    def update_levels_of_detail(self, first_row):
+        # levels still being built start over with the grown table
+        if self.levels_of_detail is None:
+            self.setup_levels_of_detail()
+        else:
+            self.levels_of_detail.update(self.tracks["x"].to_numpy(),
+                                         self.tracks["y"].to_numpy(),
+                                         self.track_frame_index.starts,
+                                         self.track_frame_index.ends,
+                                         first_row)
+
+    def setup_levels_of_detail(self):
+        if self.tracks is not None:
+            # full resolution is drawn until the simplified levels are ready
+            self.levels_of_detail = None
+            self._levels_of_detail_generation += 1
+            threading.Thread(
+                target=self.calculate_levels_of_detail,
+                args=(self.tracks["x"].to_numpy(),
+                      self.tracks["y"].to_numpy(),
+                      self.track_frame_index.starts,
+                      self.track_frame_index.ends,
+                      self._levels_of_detail_generation),
+                daemon=True
+            ).start()
+
+    def calculate_levels_of_detail(self, x, y, track_starts, track_ends,
+                                   generation):
+        # runs in a worker thread, the signal is delivered to the GUI thread
+        self.levelsOfDetailReady.emit(
+            generation,
+            TrackLevelsOfDetail(x, y, track_starts, track_ends))
+
+    def levels_of_detail_ready(self, generation, levels_of_detail):
+        # levels of tracks that changed in the meantime are dropped; the
+        # generation only changes in the GUI thread, so the check holds
+        if generation != self._levels_of_detail_generation:
+            return
+
+        self.levels_of_detail = levels_of_detail
+        if self.level_of_detail_rendering and self.batched_rendering and \
+                not self.plot_timer.isActive():
+            self.refresh_plot_view()
+
+    def calculate_track_statistics(self):
+        if self.tracks is not None:
+            self.track_statistics = calculate_track_statistics(self.tracks,
+                                                               self.dt)
+
+    def calculate_diffusion(self):
+        if self.tracks is None:
+            return
+
+        # a process pool only pays off once the FFTs outweigh pickling
+        n_workers = 1
+        if len(self.tracks) > MSD_POOL_LOCALIZATIONS:
+            n_workers = os.cpu_count() or 1
+        self.msd, self.msd_counts = calculate_msd(self.tracks,
+                                                  n_workers=n_workers)
+        diffusion = fit_msd(self.msd, self.dt)
+        self.track_statistics[diffusion.columns] = diffusion
+
+        if self.track_table_model is not None:
+            self.track_table_model.set_metric(
+                "Diffusion coefficient",
+                self.track_statistics["diffusion_coefficient"].to_numpy())
+            self.track_table_model.set_metric(
+                "Alpha", self.track_statistics["alpha"].to_numpy())
+
+    def calculate_intensities(self, image_path, radius=INTENSITY_RADIUS):
+        # intensity under every localization in a recording of the same
+        # field of view, and its mean and spread per track
+        if self.tracks is None:
+            return
+
+        intensities = intensity_traces(
+            image_path, self.tracks,
+            microns_per_unit=track_microns_per_unit(self.file_path),
+            radius=radius)
+        self.tracks["intensity"] = intensities
+        # appends copy the table with the new column on their next call
+        self.track_buffer = None
+        statistics = intensity_statistics(self.tracks, intensities)
+        self.track_statistics[statistics.columns] = statistics
+
+        if self.track_table_model is not None:
+            self.track_table_model.set_metric(
+                "Mean intensity",
+                self.track_statistics["mean_intensity"].to_numpy())
+
+    def setup_track_colors(self):
+        if self.track_statistics is not None:
+            colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+            self._track_color_indices = track_color_indices(
+                self.track_statistics.index, len(colors))
 
     def add_track_labels(self):
         if self.tracks is not None:
-            font = QFont()
-            font.setPixelSize(9)
-            for track_id in np.unique(self.tracks["id"]):
-                self.track_labels[track_id] = TextItem(str(track_id))
-                self.track_plot.addItem(self.track_labels[track_id])
-                label_position = self.track_centroids[track_id] + \
-                    1.25 * self.track_radii_of_gyration[track_id]
-                self.track_labels[track_id].setPos(
-                    label_position[0], label_position[1]
-                )
-                self.track_labels[track_id].setFont(font)
+            label_positions_x = (
+                self.track_statistics["centroid_x"] +
+                1.25 * self.track_statistics["radius_of_gyration_x"]
+            ).to_numpy()
+            label_positions_y = (
+                self.track_statistics["centroid_y"] +
+                1.25 * self.track_statistics["radius_of_gyration_y"]
+            ).to_numpy()
+            if self.track_label_layer is None:
+                self.track_label_layer = TrackLabelLayer(self.track_plot)
+            self.track_label_layer.set_labels(
+                self.track_statistics.index, label_positions_x,
+                label_positions_y,
+                self.track_statistics["n_localizations"].to_numpy())
+
+    def refresh_track_labels(self):
+        if self.track_label_layer is None:
+            return
+
+        if self.show_labels:
+            self.track_label_layer.update(self.track_visibility)
+        else:
+            self.track_label_layer.hide()
 
     def reset(self):
         self.reset_current_chunks()
@@ -129,8 +484,7 @@ class FrappeTrack(QtCore.QObject):
     def reset_current_chunks(self):
         if self.tracks is not None:
             self._play_time = 0
-            for track_id in np.unique(self.tracks["id"]):
-                self.current_chunks[track_id] = 0
+            self.current_chunks = np.zeros(len(self.track_statistics))
 
     def refresh_labels(self):
         if self.frame_rate_label is not None:
@@ -142,11 +496,27 @@ class FrappeTrack(QtCore.QObject):
 
     def setup_max_frames(self):
         if self.tracks is not None:
-            for track_id in np.unique(self.tracks["id"]):
-                current_df = self.tracks[self.tracks["id"] == track_id]
-                self._max_frames[track_id] = np.max(current_df["frame"])
-                self.track_ranges[track_id] = [0, self._max_frames[track_id]]
-
+            self._max_frames = self.track_statistics["frame_end"].to_numpy()
+            self.track_ranges = np.column_stack([
+                np.zeros(self._max_frames.shape[0]), self._max_frames
+            ]).astype(np.float64)
+
+    def request_plot_refresh(self, recalculate_tracks=False,
+                             clear_existing=False):
+        # coalesced requests redraw once per display frame, with the flags
+        # of all of them combined
+        self._refresh_recalculate |= recalculate_tracks
+        self._refresh_clear |= clear_existing
+        self.render_scheduler.request("plot", self.flush_plot_refresh)
+
+    def flush_plot_refresh(self):
+        recalculate_tracks, clear_existing = self._refresh_recalculate, \
+            self._refresh_clear
+        self._refresh_recalculate = self._refresh_clear = False
+        self.refresh_plot_view(recalculate_tracks=recalculate_tracks,
+                               clear_existing=clear_existing)
+
+    @instrumented()
     def refresh_plot_view(self, recalculate_tracks=False,
                           synchronize_tracks=False,
                           frame_range=[-np.inf, np.inf],
@@ -156,31 +526,252 @@ class FrappeTrack(QtCore.QObject):
             assert len(frame_range) == 2
             if clear_existing:
                 self.track_plot.clear()
+                # the path items are replaced, so playback starts over
+                self.playback_buffer = None
 
             if recalculate_tracks:
                 self.calculate_current_tracks(synchronize_tracks,
                                               frame_range,
                                               reset)
+            if clear_existing or recalculate_tracks:
+                self.density_pyramid = None
 
             colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
-            for id in self.visible_ids:
-                current_df = self.current_tracks[
-                    self.current_tracks["id"] == id]
-                if clear_existing:
-                    self.track_plot_items[id] = self.track_plot.plot(
-                        current_df["x"].to_numpy(),
-                        current_df["y"].to_numpy(),
-                        pen=mkPen(color=colors[
-                            hash(id) % len(colors)])
-                    )
-                    if self.show_labels:
-                        self.track_plot.addItem(self.track_labels[id])
-                else:
-                    self.track_plot_items[id].setData(
-                        current_df["x"].to_numpy(),
-                        current_df["y"].to_numpy()
-                    )
+            if self.density_rendering:
+                self.refresh_density_image(clear_existing)
+            elif self.batched_rendering:
+                self.refresh_track_paths(colors, clear_existing)
+            else:
+                for id in self.visible_ids:
+                    current_df = self.current_tracks[
+                        self.current_tracks["id"] == id]
+                    if clear_existing:
+                        self.track_plot_items[id] = self.track_plot.plot(
+                            current_df["x"].to_numpy(),
+                            current_df["y"].to_numpy(),
+                            pen=mkPen(color=colors[
+                                hash(id) % len(colors)])
+                        )
+                    else:
+                        self.track_plot_items[id].setData(
+                            current_df["x"].to_numpy(),
+                            current_df["y"].to_numpy()
+                        )
+
+            if clear_existing and self.track_label_layer is not None:
+                self.track_label_layer.attach()
+            if clear_existing and self.filter_roi is not None:
+                self.track_plot.addItem(self.filter_roi, ignoreBounds=True)
+            self.refresh_track_labels()
+
+    def refresh_track_paths(self, colors, clear_existing=False):
+        # draw all visible tracks as one path item per pen, breaking the
+        # path between tracks with a connect array. Only the smallest set
+        # of candidate rows is tested against the displayed windows,
+        # visibility and view.
+        view_ranges = None
+        if self.view_culling:
+            (x_min, x_max), (y_min, y_max) = self.track_plot.viewRange()
+            view_ranges = self.spatial_index.row_ranges_in_rect(
+                x_min, x_max, y_min, y_max)
+        # when zoomed out, only the localizations of the simplified level
+        # matching the screen resolution are drawn
+        level_rows = self.level_of_detail_rows()
+        if level_rows is not None and level_rows.shape[0] > 0:
+            rows, ranks = level_rows, np.arange(level_rows.shape[0])
+            keep = self.in_current_windows(rows)
+            if view_ranges is not None:
+                keep &= in_ranges(rows, *view_ranges)
+        elif view_ranges is not None:
+            rows = ranks = concatenate_ranges(*view_ranges)
+            keep = self.in_current_windows(rows)
+        else:
+            rows = ranks = self.current_tracks.index.to_numpy()
+            keep = np.ones(rows.shape[0], dtype=bool)
+        row_tracks = self.track_frame_index.row_tracks[rows]
+        keep &= self.track_visibility[row_tracks]
+        rows = rows[keep]
+        paths = group_track_paths(self.tracks["id"].to_numpy()[rows],
+                                  self.tracks["x"].to_numpy()[rows],
+                                  self.tracks["y"].to_numpy()[rows],
+                                  self._track_color_indices[row_tracks[keep]],
+                                  len(colors),
+                                  rows=ranks[keep])
+
+        if clear_existing or self.track_bounds_item is None:
+            self.add_track_bounds_item()
+
+        for color_index, (x, y, connect) in enumerate(paths):
+            if clear_existing or color_index not in self.track_path_items:
+                self.track_path_items[color_index] = PlotDataItem(
+                    x, y, connect=connect,
+                    pen=mkPen(color=colors[color_index])
+                )
+                self.track_plot.addItem(self.track_path_items[color_index],
+                                        ignoreBounds=True)
+            else:
+                self.track_path_items[color_index].setData(x, y,
+                                                           connect=connect)
+
+    def in_current_windows(self, rows):
+        # mask of the rows that are part of current_tracks
+        if self.current_windows is None:
+            return np.ones(rows.shape[0], dtype=bool)
+
+        lo, hi = self.current_windows
+        row_tracks = self.track_frame_index.row_tracks[rows]
+        return (rows >= lo[row_tracks]) & (rows < hi[row_tracks])
+
+    def add_track_bounds_item(self):
+        # culled path items and the density image do not take part in
+        # auto-ranging, an invisible item spanning all localizations does
+        # instead
+        self.track_bounds_item = PlotDataItem(
+            [self.spatial_index.x_min, self.spatial_index.x_max],
+            [self.spatial_index.y_min, self.spatial_index.y_max],
+            pen=mkPen(color=(0, 0, 0, 0))
+        )
+        self.track_plot.addItem(self.track_bounds_item)
+
+    def set_density_rendering(self, enabled):
+        self.density_rendering = enabled
+        self.refresh_plot_view(clear_existing=True)
 
+    def set_density_splat_sigma(self, sigma):
+        # in microns, whatever the unit of the tracks
+        self.density_splat_sigma = sigma
+        if self.density_rendering and not self.plot_timer.isActive():
+            self.request_plot_refresh()
+
+    def density_grid(self):
+        # bins of one screen pixel, aligned to multiples of the bin size so
+        # panning does not shift the binning
+        (x_min, x_max), (y_min, y_max) = self.track_plot.viewRange()
+        pixel_width, pixel_height = \
+            self.track_plot.plotItem.getViewBox().viewPixelSize()
+        bin_size = min(pixel_width, pixel_height)
+        x0 = np.floor(x_min / bin_size) * bin_size
+        y0 = np.floor(y_min / bin_size) * bin_size
+        return x0, y0, bin_size, (int(np.ceil((x_max - x0) / bin_size)),
+                                  int(np.ceil((y_max - y0) / bin_size)))
+
+    def refresh_density_image(self, clear_existing=False):
+        # localizations of the displayed windows of visible tracks, binned
+        # at the screen resolution
+        if clear_existing or self.density_image is None:
+            self.density_image = ImageItem()
+            self.density_image.setColorMap(
+                colormap.get("inferno", source='matplotlib'))
+            self.track_plot.addItem(self.density_image, ignoreBounds=True)
+            self.add_track_bounds_item()
+
+        x = self.tracks["x"].to_numpy()
+        y = self.tracks["y"].to_numpy()
+        if self.density_pyramid is None:
+            rows = self.current_tracks.index.to_numpy()
+            self._density_rows = rows[self.track_visibility[
+                self.track_frame_index.row_tracks[rows]]]
+            self.density_pyramid = DensityPyramid(
+                x[self._density_rows], y[self._density_rows],
+                self.spatial_index.x_min, self.spatial_index.x_max,
+                self.spatial_index.y_min, self.spatial_index.y_max)
+
+        grid = self.density_grid()
+        x0, y0, bin_size, shape = grid
+        level = self.density_pyramid.level(bin_size)
+        if level is not None:
+            (x_min, x_max), (y_min, y_max) = self.track_plot.viewRange()
+            image, rect = self.density_pyramid.crop(level, x_min, x_max,
+                                                    y_min, y_max)
+            bin_size = self.density_pyramid.bin_size * 2 ** level
+        else:
+            # zoomed in beyond the base level, only localizations close to
+            # the view are binned
+            in_view = in_ranges(
+                self._density_rows, *self.spatial_index.row_ranges_in_rect(
+                    x0, x0 + shape[0] * bin_size,
+                    y0, y0 + shape[1] * bin_size))
+            rows = self._density_rows[in_view]
+            image = bin_localizations(x[rows], y[rows], *grid)
+            rect = (x0, y0, shape[0] * bin_size, shape[1] * bin_size)
+        self.show_density_image(image, rect, bin_size)
+
+    def show_density_image(self, image, rect, bin_size):
+        sigma = self.density_splat_sigma / \
+            track_microns_per_unit(self.file_path)
+        image = splat_density(image, sigma / bin_size)
+        self.density_image.setImage(image, autoLevels=False,
+                                    levels=density_levels(image))
+        self.density_image.setRect(QRectF(*rect))
+
+    @instrumented()
+    def refresh_playback_density(self, synchronize_tracks=False):
+        # the density of the moving windows is updated with the
+        # localizations entering or leaving them, and rebinned only when the
+        # view changes
+        if self.density_accumulator is None:
+            self.density_accumulator = DensityAccumulator(
+                self.tracks["x"].to_numpy(), self.tracks["y"].to_numpy(),
+                self.track_frame_index.starts, self.track_frame_index.ends)
+
+        positions, lo, hi = self.playback_windows(synchronize_tracks)
+        self.density_accumulator.update(positions, lo, hi)
+        grid = self.density_grid()
+        if self.density_accumulator.grid != grid:
+            self.density_accumulator.set_grid(*grid)
+        self.show_density_image(self.density_accumulator.counts,
+                                self.density_accumulator.rect, grid[2])
+
+    def level_of_detail_rows(self):
+        if not self.level_of_detail_rendering or \
+                self.levels_of_detail is None:
+            return None
+
+        pixel_width, pixel_height = \
+            self.track_plot.plotItem.getViewBox().viewPixelSize()
+        return self.levels_of_detail.rows(
+            self.levels_of_detail.level(LEVEL_OF_DETAIL_PIXELS *
+                                        min(pixel_width, pixel_height)))
+
+    def view_range_changed(self):
+        if self.tracks is None:
+            return
+
+        if not self.plot_timer.isActive() and (
+                self.density_rendering or
+                (self.batched_rendering and
+                 (self.view_culling or self.level_of_detail_rendering))):
+            self.request_plot_refresh()
+        else:
+            self.refresh_track_labels()
+
+    @instrumented()
+    def mouse_move_event(self, mouse_position):
+        if self.spatial_index is None or self.pick_label is None:
+            return
+
+        view_box = self.track_plot.plotItem.getViewBox()
+        if not view_box.sceneBoundingRect().contains(mouse_position):
+            self.pick_label.setText("")
+            return
+
+        view_position = view_box.mapSceneToView(mouse_position)
+        pixel_width, pixel_height = view_box.viewPixelSize()
+        row = self.spatial_index.nearest(
+            view_position.x(), view_position.y(),
+            PICK_RADIUS_PIXELS * max(pixel_width, pixel_height),
+            track_mask=self.track_visibility)
+        if row is None:
+            self.pick_label.setText("")
+        else:
+            pick_time = track_times(self.tracks.iloc[row:row + 1],
+                                    self.dt)[0]
+            self.pick_label.setText(
+                f"Track: {self.tracks['id'].iat[row]}, "
+                f"frame: {self.tracks['frame'].iat[row]}, "
+                f"time (s): {pick_time:.5g}")
+
+    @instrumented()
     def play_track_visualization(self, synchronize_tracks=False):
         self.track_plot.disableAutoRange()
 
@@ -190,22 +781,60 @@ class FrappeTrack(QtCore.QObject):
         self.refresh_labels()
 
         if synchronize_tracks:
-            if self.frame_range[1] > np.max(self.tracks["frame"]):
+            if self.frame_range[1] > self.frame_index.sorted_frames[-1]:
                 self.frame_range = [0, 0]
 
             self.frame_range[1] += self.frames_per_update
             self.frame_range[0] = max(
                 0, self.frame_range[1] - self.max_localizations_per_track)
-            self.refresh_plot_view(frame_range=self.frame_range,
-                                   recalculate_tracks=True,
-                                   synchronize_tracks=True,
-                                   clear_existing=False)
+
+        if self.density_rendering:
+            self.refresh_playback_density(synchronize_tracks)
+        elif self.batched_rendering and self.incremental_playback:
+            self.refresh_playback_buffer(synchronize_tracks)
         else:
             self.refresh_plot_view(frame_range=self.frame_range,
                                    recalculate_tracks=True,
-                                   synchronize_tracks=False,
+                                   synchronize_tracks=synchronize_tracks,
                                    clear_existing=False)
 
+    def setup_playback_buffer(self):
+        colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        self.playback_buffer = PlaybackBuffer(
+            self.tracks["x"].to_numpy(),
+            self.tracks["y"].to_numpy(),
+            self.track_frame_index.starts,
+            self.track_frame_index.ends,
+            self.track_frame_index.positions(self.visible_ids),
+            self._track_color_indices,
+            len(colors),
+            self.max_localizations_per_track + 1
+        )
+
+    @instrumented()
+    def refresh_playback_buffer(self, synchronize_tracks=False):
+        # only the localizations entering or leaving the displayed windows
+        # are written, and only pen groups that changed are sent to the plot
+        if (self.playback_buffer is None or self.playback_buffer.capacity !=
+                self.max_localizations_per_track + 1):
+            self.setup_playback_buffer()
+
+        positions, lo, hi = self.playback_windows(synchronize_tracks)
+        for color_index in self.playback_buffer.update(positions, lo, hi):
+            x, y, connect = self.playback_buffer.group_data(color_index)
+            self.track_path_items[color_index].setData(x, y,
+                                                       connect=connect)
+
+    def playback_windows(self, synchronize_tracks=False):
+        positions = self.track_frame_index.positions(self.visible_ids)
+        if synchronize_tracks:
+            lo, hi = self.track_frame_index.windows(positions,
+                                                    self.frame_range[0],
+                                                    self.frame_range[1])
+        else:
+            lo, hi = self.calculate_chunk_windows(positions)
+        return positions, lo, hi
+
     def update_frame_rate(self):
         self.average_update_rate -= self.average_update_rate / 50
         # multiply by 1000 to get msecs divide by 10 for average
@@ -226,42 +855,41 @@ class FrappeTrack(QtCore.QObject):
                                reset=False,
                                clear_existing=True)
 
+    @instrumented()
     def generate_track_chunk(self, reset=False):
         if reset:
             self.reset_current_chunks()
 
-        df_list = []
-        for track_id in self.visible_ids:
-            current_tracks = self.tracks[self.tracks["id"] == track_id]
-            if self.plot_timer.isActive():
-                frame_lower_bound = max(
-                    self.track_ranges[track_id][0],
-                    self.current_chunks[track_id] + self.frames_per_update -
-                    self.max_localizations_per_track
-                    )
-                current_tracks = current_tracks[
-                    current_tracks["frame"] >= frame_lower_bound]
-                current_tracks = current_tracks[
-                    current_tracks["frame"] <=
-                    min(self.current_chunks[track_id] + self.frames_per_update,
-                        self.track_ranges[track_id][1])]
-                df_list.append(current_tracks)
-                if (self.current_chunks[track_id] + self.frames_per_update <
-                        self.track_ranges[track_id][1]):
-                    self.current_chunks[track_id] += self.frames_per_update
-                elif (self.track_ranges[track_id][1] >
-                        self.max_localizations_per_track):
-                    self.current_chunks[track_id] = 0
+        positions = self.track_frame_index.positions(self.visible_ids)
+        lo, hi = self.calculate_chunk_windows(positions)
+        self.set_current_windows(positions, lo, hi)
+        return self.tracks.iloc[concatenate_ranges(lo, hi)]
+
+    def calculate_chunk_windows(self, positions):
+        track_ranges = self.track_ranges[positions]
+        if self.plot_timer.isActive():
+            current_chunks = self.current_chunks[positions]
+            frame_lower_bound = np.maximum(
+                track_ranges[:, 0],
+                current_chunks + self.frames_per_update -
+                self.max_localizations_per_track
+                )
+            frame_upper_bound = np.minimum(
+                current_chunks + self.frames_per_update, track_ranges[:, 1])
 
-            else:
-                current_tracks = current_tracks[
-                    current_tracks["frame"] >= self.track_ranges[track_id][0]]
-                current_tracks = current_tracks[
-                    current_tracks["frame"] <=
-                    self.track_ranges[track_id][1]]
-                df_list.append(current_tracks)
+            advancing = current_chunks + self.frames_per_update < \
+                track_ranges[:, 1]
+            current_chunks[advancing] += self.frames_per_update
+            current_chunks[~advancing & (track_ranges[:, 1] >
+                           self.max_localizations_per_track)] = 0
+            self.current_chunks[positions] = current_chunks
 
-        return pd.concat(df_list)
+        else:
+            frame_lower_bound = track_ranges[:, 0]
+            frame_upper_bound = track_ranges[:, 1]
+
+        return self.track_frame_index.windows(positions, frame_lower_bound,
+                                              frame_upper_bound)
 
     def calculate_current_tracks(self, synchronize_tracks=False,
                                  frame_range=[-np.inf, np.inf],
@@ -270,79 +898,125 @@ class FrappeTrack(QtCore.QObject):
 
         # if tracks are synchronized, apply restriction globally
         if synchronize_tracks:
-            current_tracks = self.tracks[
-                self.tracks["frame"] >= frame_range[0]]
-            self.current_tracks = current_tracks[
-                current_tracks["frame"] <= frame_range[1]]
+            self.current_tracks = self.tracks.iloc[self.frame_index.order[
+                self.frame_index.window(frame_range[0], frame_range[1])]]
+            positions = np.arange(len(self.track_frame_index.track_ids))
+            lo, hi = self.track_frame_index.windows(positions, frame_range[0],
+                                                    frame_range[1])
+            self.set_current_windows(positions, lo, hi)
         else:
             self.current_tracks = self.generate_track_chunk(reset)
 
-    def setup_track_table(self):
-        unique_ids = np.unique(self.tracks["id"])
-        self.track_table.setRowCount(unique_ids.shape[0])
-        self.track_checkboxes = {}
-        self.track_frame_start_spinboxes = {}
-        self.track_frame_end_spinboxes = {}
-        for i, id in enumerate(unique_ids):
-            self.track_table.setItem(i, 0, QTableWidgetItem(str(id)))
-
-            self.track_checkboxes[id] = QCheckBox()
-            self.track_checkboxes[id].setChecked(True)
-
-            # have to bind id parameter
-            self.track_checkboxes[id].stateChanged['int'].connect(
-                lambda state, bound_id=id: self.add_remove_track(bound_id,
-                                                                 state)
-            )
-
-            self.track_table.setCellWidget(i, 1, self.track_checkboxes[id])
-
-            self.track_frame_start_spinboxes[id] = QSpinBox()
-            self.track_frame_start_spinboxes[id].setValue(0)
-
-            self.track_frame_start_spinboxes[id].valueChanged['int'].connect(
-                lambda value, bound_id=id: self.frame_start_spinbox_changed(
-                    value, bound_id)
-            )
-
-            self.track_table.setCellWidget(i, 2,
-                                           self.track_frame_start_spinboxes[id]
-                                           )
-
-            self.track_frame_end_spinboxes[id] = QSpinBox()
-            self.track_frame_end_spinboxes[id].setMaximum(self._max_frames[id])
-            self.track_frame_end_spinboxes[id].setValue(self._max_frames[id])
+    def set_current_windows(self, positions, lo, hi):
+        # windows of tracks that are not displayed are empty
+        n_tracks = len(self.track_frame_index.track_ids)
+        self.current_windows = (np.zeros(n_tracks, dtype=np.int64),
+                                np.zeros(n_tracks, dtype=np.int64))
+        self.current_windows[0][positions] = lo
+        self.current_windows[1][positions] = hi
 
-            self.track_frame_end_spinboxes[id].valueChanged['int'].connect(
-                lambda value, bound_id=id: self.frame_end_spinbox_changed(
-                    value, bound_id)
+    def setup_track_table(self):
+        # the view does not delete the model or selection model it replaces
+        previous_model = self.track_table_model
+        previous_selection = self.track_table.selectionModel()
+        self.track_table_model = TrackTableModel(self.track_statistics,
+                                                 self.track_visibility,
+                                                 self.track_ranges,
+                                                 parent=self)
+        self.track_table_model.visibilityChanged.connect(
+            self.track_visibility_changed
+        )
+        self.track_table_model.trackRangesChanged.connect(
+            self.track_range_changed
+        )
+        self.track_table.setModel(self.track_table_model)
+        if previous_model is not None:
+            previous_model.deleteLater()
+        if previous_selection is not None:
+            previous_selection.deleteLater()
+
+        frame_delegate = FrameSpinBoxDelegate(self.track_table)
+        self.track_table.setItemDelegateForColumn(FRAME_START_COLUMN,
+                                                  frame_delegate)
+        self.track_table.setItemDelegateForColumn(FRAME_END_COLUMN,
+                                                  frame_delegate)
+        self.track_table.horizontalHeader().setSortIndicator(
+            TRACK_ID_COLUMN, Qt.AscendingOrder)
+        self.track_table.setSortingEnabled(True)
+
+    def update_track_table(self):
+        # the model follows the grown table in place, which keeps the sort
+        # order, selection and scroll position of the view
+        self.track_table_model.update_tracks(self.track_statistics,
+                                             self.track_visibility,
+                                             self.track_ranges)
+        header = self.track_table.horizontalHeader()
+        if 0 <= header.sortIndicatorSection() < \
+                self.track_table_model.columnCount():
+            self.track_table_model.sort(header.sortIndicatorSection(),
+                                        header.sortIndicatorOrder())
+
+    def set_selected_tracks_visible(self, visible):
+        rows = []
+        for selection_range in \
+                self.track_table.selectionModel().selection():
+            rows.append(np.arange(selection_range.top(),
+                                  selection_range.bottom() + 1))
+        if rows:
+            self.track_table_model.set_tracks_visible(np.concatenate(rows),
+                                                      visible)
+
+    def set_all_tracks_visible(self, visible):
+        self.track_table_model.set_tracks_visible(
+            np.arange(self.track_table_model.rowCount()), visible)
+
+    def set_filter_roi(self, enabled):
+        if enabled and self.filter_roi is None:
+            # start from the central half of the current view
+            (x_min, x_max), (y_min, y_max) = self.track_plot.viewRange()
+            width, height = x_max - x_min, y_max - y_min
+            self.filter_roi = RectROI([x_min + width / 4, y_min + height / 4],
+                                      [width / 2, height / 2],
+                                      pen=mkPen(color=(255, 255, 0)))
+            self.filter_roi.sigRegionChangeFinished.connect(
+                lambda: self.apply_track_filter()
             )
-
-            self.track_table.setCellWidget(i, 3,
-                                           self.track_frame_end_spinboxes[id]
-                                           )
-
-    def add_remove_track(self, id, state):
-        if state > 0 and id not in self.visible_ids:
-            self.visible_ids.append(id)
-        else:
-            self.visible_ids.remove(id)
-        self.refresh_plot_view(clear_existing=True)
-
-    def frame_start_spinbox_changed(self, value, id):
-        self.track_frame_end_spinboxes[id].setMinimum(value)
-        self.track_ranges[id][0] = value
-        self.refresh_plot_view(recalculate_tracks=True,
-                               synchronize_tracks=False,
-                               frame_range=[-np.inf, np.inf],
-                               reset=False,
-                               clear_existing=False)
-
-    def frame_end_spinbox_changed(self, value, id):
-        self.track_frame_start_spinboxes[id].setMaximum(value)
-        self.track_ranges[id][1] = value
-        self.refresh_plot_view(recalculate_tracks=True,
-                               synchronize_tracks=False,
-                               frame_range=[-np.inf, np.inf],
-                               reset=False,
-                               clear_existing=False)
+            self.track_plot.addItem(self.filter_roi, ignoreBounds=True)
+        elif not enabled and self.filter_roi is not None:
+            self.track_plot.removeItem(self.filter_roi)
+            self.filter_roi = None
+        self.apply_track_filter()
+
+    def roi_fractions(self):
+        if self.filter_roi is None:
+            return None
+
+        x0, y0 = self.filter_roi.pos()
+        width, height = self.filter_roi.size()
+        return self.spatial_index.track_fractions_in_rect(
+            x0, x0 + width, y0, y0 + height)
+
+    def apply_track_filter(self, expression=None):
+        # evaluate the expression (and the ROI) over all tracks at once and
+        # redraw a single time
+        if self.track_statistics is None:
+            return
+
+        if expression is None:
+            expression = self.filter_expression
+        extra_columns = {}
+        roi_fractions = self.roi_fractions()
+        if roi_fractions is not None:
+            extra_columns["roi_fraction"] = roi_fractions
+        track_mask = evaluate_track_filter(expression, self.track_statistics,
+                                           extra_columns)
+        self.filter_expression = expression
+        if roi_fractions is not None:
+            track_mask &= roi_fractions > 0
+        self.track_table_model.set_visibility(track_mask)
+
+    def track_visibility_changed(self):
+        self.request_plot_refresh(clear_existing=True)
+
+    def track_range_changed(self):
+        self.request_plot_refresh(recalculate_tracks=True)
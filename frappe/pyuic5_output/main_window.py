@@ -132,6 +132,8 @@ class Ui_MainWindow(object):
         self.menuEdit.setObjectName("menuEdit")
         self.menuView = QtWidgets.QMenu(self.menubar)
         self.menuView.setObjectName("menuView")
+        self.menuAnalysis = QtWidgets.QMenu(self.menubar)
+        self.menuAnalysis.setObjectName("menuAnalysis")
         MainWindow.setMenuBar(self.menubar)
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
         self.statusbar.setObjectName("statusbar")
@@ -140,11 +142,48 @@ class Ui_MainWindow(object):
         self.actionOpen.setObjectName("actionOpen")
         self.actionShowMetadata = QtWidgets.QAction(MainWindow)
         self.actionShowMetadata.setObjectName("actionShowMetadata")
+        self.actionOpenTrackOverlay = QtWidgets.QAction(MainWindow)
+        self.actionOpenTrackOverlay.setObjectName("actionOpenTrackOverlay")
+        self.actionShowTrackOverlay = QtWidgets.QAction(MainWindow)
+        self.actionShowTrackOverlay.setCheckable(True)
+        self.actionShowTrackOverlay.setChecked(True)
+        self.actionShowTrackOverlay.setEnabled(False)
+        self.actionShowTrackOverlay.setObjectName("actionShowTrackOverlay")
+        self.actionFrapMaps = QtWidgets.QAction(MainWindow)
+        self.actionFrapMaps.setObjectName("actionFrapMaps")
+        self.actionShowImage = QtWidgets.QAction(MainWindow)
+        self.actionShowImage.setCheckable(True)
+        self.actionShowImage.setChecked(True)
+        self.actionShowImage.setEnabled(False)
+        self.actionShowImage.setObjectName("actionShowImage")
+        self.actionShowHalfTimeMap = QtWidgets.QAction(MainWindow)
+        self.actionShowHalfTimeMap.setCheckable(True)
+        self.actionShowHalfTimeMap.setEnabled(False)
+        self.actionShowHalfTimeMap.setObjectName("actionShowHalfTimeMap")
+        self.actionShowMobileFractionMap = QtWidgets.QAction(MainWindow)
+        self.actionShowMobileFractionMap.setCheckable(True)
+        self.actionShowMobileFractionMap.setEnabled(False)
+        self.actionShowMobileFractionMap.setObjectName("actionShowMobileFractionMap")
+        self.actionShowLatencyOverlay = QtWidgets.QAction(MainWindow)
+        self.actionShowLatencyOverlay.setCheckable(True)
+        self.actionShowLatencyOverlay.setObjectName("actionShowLatencyOverlay")
+        self.actionExportLatencyTrace = QtWidgets.QAction(MainWindow)
+        self.actionExportLatencyTrace.setObjectName("actionExportLatencyTrace")
         self.menuFile.addAction(self.actionOpen)
+        self.menuFile.addAction(self.actionOpenTrackOverlay)
+        self.menuFile.addAction(self.actionExportLatencyTrace)
         self.menuView.addAction(self.actionShowMetadata)
+        self.menuView.addAction(self.actionShowTrackOverlay)
+        self.menuView.addAction(self.actionShowLatencyOverlay)
+        self.menuView.addSeparator()
+        self.menuView.addAction(self.actionShowImage)
+        self.menuView.addAction(self.actionShowHalfTimeMap)
+        self.menuView.addAction(self.actionShowMobileFractionMap)
+        self.menuAnalysis.addAction(self.actionFrapMaps)
         self.menubar.addAction(self.menuFile.menuAction())
         self.menubar.addAction(self.menuEdit.menuAction())
         self.menubar.addAction(self.menuView.menuAction())
+        self.menubar.addAction(self.menuAnalysis.menuAction())
 
         self.retranslateUi(MainWindow)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
@@ -168,10 +207,27 @@ class Ui_MainWindow(object):
         self.menuFile.setTitle(_translate("MainWindow", "File"))
         self.menuEdit.setTitle(_translate("MainWindow", "Edit"))
         self.menuView.setTitle(_translate("MainWindow", "View"))
+        self.menuAnalysis.setTitle(_translate("MainWindow", "Analysis"))
         self.actionOpen.setText(_translate("MainWindow", "Open"))
         self.actionOpen.setToolTip(_translate("MainWindow", "Open a file"))
         self.actionOpen.setShortcut(_translate("MainWindow", "Ctrl+O"))
         self.actionShowMetadata.setText(_translate("MainWindow", "Show metadata"))
         self.actionShowMetadata.setToolTip(_translate("MainWindow", "Show image metadata"))
+        self.actionOpenTrackOverlay.setText(_translate("MainWindow", "Overlay tracks..."))
+        self.actionOpenTrackOverlay.setToolTip(_translate("MainWindow", "Draw tracks from a track file on top of the image"))
+        self.actionOpenTrackOverlay.setShortcut(_translate("MainWindow", "Ctrl+Shift+O"))
+        self.actionShowTrackOverlay.setText(_translate("MainWindow", "Show track overlay"))
+        self.actionShowTrackOverlay.setToolTip(_translate("MainWindow", "Show the overlaid tracks of the current frame"))
+        self.actionShowTrackOverlay.setShortcut(_translate("MainWindow", "Ctrl+T"))
+        self.actionFrapMaps.setText(_translate("MainWindow", "FRAP recovery maps..."))
+        self.actionFrapMaps.setToolTip(_translate("MainWindow", "Fit the recovery of every bleached pixel of the current channel"))
+        self.actionShowImage.setText(_translate("MainWindow", "Show image"))
+        self.actionShowHalfTimeMap.setText(_translate("MainWindow", "Show half-time map"))
+        self.actionShowMobileFractionMap.setText(_translate("MainWindow", "Show mobile fraction map"))
+        self.actionShowLatencyOverlay.setText(_translate("MainWindow", "Show latency overlay"))
+        self.actionShowLatencyOverlay.setToolTip(_translate("MainWindow", "Record and show the latencies of image and track updates"))
+        self.actionShowLatencyOverlay.setShortcut(_translate("MainWindow", "Ctrl+Shift+L"))
+        self.actionExportLatencyTrace.setText(_translate("MainWindow", "Export latency trace..."))
+        self.actionExportLatencyTrace.setToolTip(_translate("MainWindow", "Save the recorded latencies as a JSON trace"))
 from pyqtgraph import ImageView
 from widgets.multi_slider import LabelSlider
@@ -26,19 +26,11 @@ class Ui_MainWindow(object):
         self.pause_button = QtWidgets.QPushButton(self.centralwidget)
         self.pause_button.setGeometry(QtCore.QRect(90, 10, 91, 32))
         self.pause_button.setObjectName("pause_button")
-        self.track_table = QtWidgets.QTableWidget(self.centralwidget)
+        self.track_table = QtWidgets.QTableView(self.centralwidget)
         self.track_table.setGeometry(QtCore.QRect(10, 160, 261, 261))
+        self.track_table.setContextMenuPolicy(QtCore.Qt.ActionsContextMenu)
+        self.track_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.track_table.setObjectName("track_table")
-        self.track_table.setColumnCount(4)
-        self.track_table.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.track_table.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.track_table.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.track_table.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.track_table.setHorizontalHeaderItem(3, item)
         self.localizations_per_second = QtWidgets.QLineEdit(self.centralwidget)
         self.localizations_per_second.setGeometry(QtCore.QRect(180, 40, 71, 21))
         self.localizations_per_second.setObjectName("localizations_per_second")
@@ -55,7 +47,7 @@ class Ui_MainWindow(object):
         self.update_rate_label.setGeometry(QtCore.QRect(280, 10, 241, 16))
         self.update_rate_label.setObjectName("update_rate_label")
         self.time_label = QtWidgets.QLabel(self.centralwidget)
-        self.time_label.setGeometry(QtCore.QRect(550, 10, 241, 16))
+        self.time_label.setGeometry(QtCore.QRect(550, 10, 191, 16))
         self.time_label.setObjectName("time_label")
         self.reset_button = QtWidgets.QPushButton(self.centralwidget)
         self.reset_button.setGeometry(QtCore.QRect(180, 10, 91, 32))
@@ -72,6 +64,24 @@ class Ui_MainWindow(object):
         self.show_labels_checkbox.setGeometry(QtCore.QRect(10, 130, 101, 20))
         self.show_labels_checkbox.setChecked(True)
         self.show_labels_checkbox.setObjectName("show_labels_checkbox")
+        self.follow_checkbox = QtWidgets.QCheckBox(self.centralwidget)
+        self.follow_checkbox.setGeometry(QtCore.QRect(750, 8, 101, 20))
+        self.follow_checkbox.setObjectName("follow_checkbox")
+        self.roi_checkbox = QtWidgets.QCheckBox(self.centralwidget)
+        self.roi_checkbox.setGeometry(QtCore.QRect(130, 130, 121, 20))
+        self.roi_checkbox.setObjectName("roi_checkbox")
+        self.filter_expression = QtWidgets.QLineEdit(self.centralwidget)
+        self.filter_expression.setGeometry(QtCore.QRect(10, 425, 261, 21))
+        self.filter_expression.setObjectName("filter_expression")
+        self.density_checkbox = QtWidgets.QCheckBox(self.centralwidget)
+        self.density_checkbox.setGeometry(QtCore.QRect(280, 425, 121, 20))
+        self.density_checkbox.setObjectName("density_checkbox")
+        self.splat_sigma_label = QtWidgets.QLabel(self.centralwidget)
+        self.splat_sigma_label.setGeometry(QtCore.QRect(410, 427, 101, 16))
+        self.splat_sigma_label.setObjectName("splat_sigma_label")
+        self.splat_sigma = QtWidgets.QLineEdit(self.centralwidget)
+        self.splat_sigma.setGeometry(QtCore.QRect(510, 425, 71, 21))
+        self.splat_sigma.setObjectName("splat_sigma")
         MainWindow.setCentralWidget(self.centralwidget)
         self.statusbar = QtWidgets.QStatusBar(MainWindow)
         self.statusbar.setObjectName("statusbar")
@@ -85,14 +95,6 @@ class Ui_MainWindow(object):
         MainWindow.setWindowTitle(_translate("MainWindow", "MainWindow"))
         self.play_button.setText(_translate("MainWindow", "Play"))
         self.pause_button.setText(_translate("MainWindow", "Stop"))
-        item = self.track_table.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Track ID"))
-        item = self.track_table.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Show"))
-        item = self.track_table.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Frame start"))
-        item = self.track_table.horizontalHeaderItem(3)
-        item.setText(_translate("MainWindow", "Frame end"))
         self.localizations_per_second_label.setText(_translate("MainWindow", "Localizations per update:"))
         self.localizations_to_display_label.setText(_translate("MainWindow", "Localizations to display:"))
         self.update_rate_label.setText(_translate("MainWindow", "Average update rate (1/s):"))
@@ -101,4 +103,10 @@ class Ui_MainWindow(object):
         self.show_scale_bar.setText(_translate("MainWindow", "Show scale bar"))
         self.bar_length.setText(_translate("MainWindow", "10"))
         self.show_labels_checkbox.setText(_translate("MainWindow", "Show labels"))
+        self.follow_checkbox.setText(_translate("MainWindow", "Follow file"))
+        self.roi_checkbox.setText(_translate("MainWindow", "Filter by ROI"))
+        self.filter_expression.setPlaceholderText(_translate("MainWindow", "Filter, e.g. length > 50 and D > 0.1"))
+        self.density_checkbox.setText(_translate("MainWindow", "Density map"))
+        self.splat_sigma_label.setText(_translate("MainWindow", "Splat σ (µm):"))
+        self.splat_sigma.setText(_translate("MainWindow", "0"))
 from pyqtgraph import PlotWidget
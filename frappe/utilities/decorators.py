@@ -1,5 +1,8 @@
+import functools
 import time
 
+from frappe.utilities.instrumentation import recorder
+
 
 def timed_function(refresh_time):
     def decorator(function):
@@ -15,6 +18,17 @@ def timed_function(refresh_time):
     return decorator
 
 
+def coalesced(function):
+    # the call is handed to self.render_scheduler, which drops it if it is
+    # called again before the next display frame; the latest arguments win
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        self.render_scheduler.request(
+            function.__name__, lambda: function(self, *args, **kwargs))
+
+    return wrapper
+
+
 def statusbar_message(message):
     def decorator(function):
         def wrapper(self):
@@ -23,4 +37,26 @@ def statusbar_message(message):
             self.ui.statusbar.clearMessage()
 
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def instrumented(name=None):
+    # records the latency of every call while the recorder is enabled; when
+    # it is disabled the cost is a single attribute check
+    def decorator(function):
+        record_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.record(record_name, start,
+                                time.perf_counter() - start)
+
+        return wrapper
+    return decorator
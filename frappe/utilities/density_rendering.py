@@ -0,0 +1,129 @@
+import numpy as np
+from scipy import ndimage
+
+from frappe.utilities.frame_index import (
+    concatenate_ranges, window_differences
+    )
+
+DENSITY_BASE_BINS = 2048
+DENSITY_MIN_BINS = 64
+DENSITY_LEVEL_PERCENTILE = 99.5
+
+
+def bin_localizations(x, y, x0, y0, bin_size, shape):
+    # counts of localizations in a grid of shape (n_x, n_y) bins starting at
+    # (x0, y0), indexed [x, y] like an ImageItem; localizations outside the
+    # grid (and NaNs) are dropped
+    bin_x = np.floor((np.asarray(x) - x0) / bin_size)
+    bin_y = np.floor((np.asarray(y) - y0) / bin_size)
+    inside = (bin_x >= 0) & (bin_x < shape[0]) & \
+        (bin_y >= 0) & (bin_y < shape[1])
+    flat = bin_x[inside].astype(np.intp) * shape[1] + \
+        bin_y[inside].astype(np.intp)
+    return np.bincount(flat, minlength=shape[0] * shape[1]).reshape(shape)
+
+
+def splat_density(image, sigma_bins):
+    # a Gaussian of the given width around every localization, which on a
+    # binned image is a convolution with that Gaussian
+    if sigma_bins <= 0:
+        return image
+    return ndimage.gaussian_filter(image.astype(np.float32), sigma_bins,
+                                   mode="constant")
+
+
+def density_levels(image):
+    # display levels that keep a few very dense bins from saturating the
+    # rest of the image
+    occupied = image[image > 0]
+    if occupied.shape[0] == 0:
+        return 0, 1
+    return 0, max(float(np.percentile(occupied, DENSITY_LEVEL_PERCENTILE)),
+                  float(np.min(occupied)))
+
+
+class DensityPyramid:
+
+    def __init__(self, x, y, x_min, x_max, y_min, y_max) -> None:
+        # square base histogram over the extent of all localizations, halved
+        # until it is small; a zoom only crops the level matching the screen
+        # resolution instead of rebinning every localization
+        size = max(x_max - x_min, y_max - y_min, np.finfo(np.float64).tiny)
+        self.x0, self.y0 = x_min, y_min
+        # widened a little so the largest coordinate falls into the last bin
+        self.bin_size = size * (1 + 1e-9) / DENSITY_BASE_BINS
+        self.levels = [bin_localizations(
+            x, y, self.x0, self.y0, self.bin_size,
+            (DENSITY_BASE_BINS, DENSITY_BASE_BINS)).astype(np.float32)]
+        while self.levels[-1].shape[0] > DENSITY_MIN_BINS:
+            level = self.levels[-1]
+            self.levels.append(level[0::2, 0::2] + level[1::2, 0::2] +
+                               level[0::2, 1::2] + level[1::2, 1::2])
+
+    def level(self, pixel_size):
+        # coarsest level whose bins are no larger than a screen pixel, or
+        # None when zoomed in beyond the base level
+        if pixel_size < self.bin_size:
+            return None
+        return min(int(np.log2(pixel_size / self.bin_size)),
+                   len(self.levels) - 1)
+
+    def crop(self, level, x0, x1, y0, y1):
+        # the bins of a level covering the rect, as a view, and the rect
+        # (x, y, width, height) they cover
+        bin_size = self.bin_size * 2 ** level
+        image = self.levels[level]
+        i0, i1 = np.clip([np.floor((x0 - self.x0) / bin_size),
+                          np.ceil((x1 - self.x0) / bin_size)],
+                         0, image.shape[0]).astype(np.intp)
+        j0, j1 = np.clip([np.floor((y0 - self.y0) / bin_size),
+                          np.ceil((y1 - self.y0) / bin_size)],
+                         0, image.shape[1]).astype(np.intp)
+        return image[i0:i1, j0:j1], (self.x0 + i0 * bin_size,
+                                     self.y0 + j0 * bin_size,
+                                     (i1 - i0) * bin_size,
+                                     (j1 - j0) * bin_size)
+
+
+class DensityAccumulator:
+
+    def __init__(self, x, y, track_starts, track_ends) -> None:
+        # counts of the localizations inside per-track [lo, hi) windows;
+        # moving the windows only bins the localizations entering or leaving
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.starts = np.asarray(track_starts)
+        self.lo = self.starts.copy()
+        self.hi = self.starts.copy()
+        self.grid = None
+        self.counts = None
+
+    def _bin(self, lo, hi):
+        rows = concatenate_ranges(lo, hi)
+        return bin_localizations(self.x[rows], self.y[rows], *self.grid)
+
+    def set_grid(self, x0, y0, bin_size, shape):
+        # rebins everything inside the current windows
+        self.grid = (x0, y0, bin_size, tuple(shape))
+        self.counts = self._bin(self.lo, self.hi)
+
+    def update(self, track_positions, lo, hi):
+        # tracks that are not passed in are emptied
+        new_lo = self.starts.copy()
+        new_hi = self.starts.copy()
+        new_lo[track_positions] = lo
+        new_hi[track_positions] = np.maximum(lo, hi)
+
+        changed = np.flatnonzero((new_lo != self.lo) | (new_hi != self.hi))
+        dropped_lo, dropped_hi, added_lo, added_hi = window_differences(
+            self.lo[changed], self.hi[changed], new_lo[changed],
+            new_hi[changed])
+        self.lo, self.hi = new_lo, new_hi
+        if self.grid is not None:
+            self.counts += self._bin(added_lo, added_hi)
+            self.counts -= self._bin(dropped_lo, dropped_hi)
+
+    @property
+    def rect(self):
+        x0, y0, bin_size, shape = self.grid
+        return x0, y0, shape[0] * bin_size, shape[1] * bin_size
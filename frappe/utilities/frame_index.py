@@ -0,0 +1,243 @@
+import numpy as np
+
+from frappe.utilities.track_statistics import group_by_track
+
+GROWTH_FACTOR = 1.5
+MIN_CAPACITY = 1024
+
+
+class GrowingArray:
+
+    def __init__(self, values) -> None:
+        # an array with spare room behind its end, so that replacing its
+        # tail by a longer one rarely reallocates
+        values = np.asarray(values)
+        self.size = values.shape[0]
+        self.buffer = np.empty(max(int(GROWTH_FACTOR * self.size),
+                                   MIN_CAPACITY), dtype=values.dtype)
+        self.buffer[:self.size] = values
+
+    @property
+    def values(self):
+        return self.buffer[:self.size]
+
+    def replace_tail(self, start, tail, dtype=None):
+        # values[:start] followed by tail, in the buffer's dtype unless
+        # another one is given; views of the old values see the new tail
+        tail = np.asarray(tail)
+        size = start + tail.shape[0]
+        dtype = self.buffer.dtype if dtype is None else np.dtype(dtype)
+        if size > self.buffer.shape[0] or dtype != self.buffer.dtype:
+            buffer = np.empty(max(int(GROWTH_FACTOR * size), MIN_CAPACITY),
+                              dtype=dtype)
+            buffer[:start] = self.buffer[:start]
+            self.buffer = buffer
+        self.buffer[start:size] = tail
+        self.size = size
+        return self.values
+
+
+def shifted_rows(rows, positions):
+    # new numbers of rows after inserting rows before the ones at positions
+    # (nondecreasing, as for np.insert)
+    return rows + np.searchsorted(positions, rows, side="right")
+
+
+def grow_tail(index, name, start, tail):
+    # the array attribute name of an index with its tail from start on
+    # replaced, widened if the tail needs it; the index keeps the arrays
+    # growing in its _growing dict
+    if name not in index._growing:
+        index._growing[name] = GrowingArray(getattr(index, name))
+    growing = index._growing[name]
+    return growing.replace_tail(start, tail, np.result_type(
+        growing.buffer.dtype, np.asarray(tail).dtype))
+
+
+def first_changed_track(track_starts, first_row):
+    # position and first row of the track holding the row before first_row;
+    # rows from there on may belong to other tracks after localizations
+    # were inserted
+    if track_starts.shape[0] == 0:
+        return 0, 0
+    track = max(int(np.searchsorted(track_starts, first_row - 1,
+                                    side="right")) - 1, 0)
+    return track, int(track_starts[track])
+
+
+class FrameIndex:
+
+    def __init__(self, frames) -> None:
+        frames = np.asarray(frames)
+        self.order = np.argsort(frames, kind="stable")
+        self.sorted_frames = frames[self.order]
+        self._growing = {}
+
+    def __len__(self):
+        return self.sorted_frames.shape[0]
+
+    def insert(self, frames, positions):
+        # rows were inserted before the rows at positions and frames is the
+        # new column; moved rows keep their frame and are only renumbered,
+        # inserted rows are merged in by frame
+        positions = np.asarray(positions, dtype=np.intp)
+        if positions.shape[0] == 0:
+            return
+
+        moved = self.order >= positions[0]
+        self.order[moved] = shifted_rows(self.order[moved], positions)
+        inserted = positions + np.arange(positions.shape[0])
+        new_frames = np.asarray(frames)[inserted]
+        by_frame = np.argsort(new_frames, kind="stable")
+        new_frames, inserted = new_frames[by_frame], inserted[by_frame]
+        at = np.searchsorted(self.sorted_frames, new_frames, side="right")
+        if at[0] == len(self):
+            # the usual case while recording, all frames are new ones
+            n_rows = len(self)
+            self.order = grow_tail(self, "order", n_rows, inserted)
+            self.sorted_frames = grow_tail(self, "sorted_frames", n_rows,
+                                           new_frames)
+        else:
+            self.order = np.insert(self.order, at, inserted)
+            self.sorted_frames = np.insert(
+                self.sorted_frames.astype(np.result_type(
+                    self.sorted_frames, new_frames), copy=False),
+                at, new_frames)
+            self._growing = {}
+
+    def window(self, start, end):
+        # rows with start <= frame <= end, as a slice into frame-sorted data
+        return slice(
+            int(np.searchsorted(self.sorted_frames, start, side="left")),
+            int(np.searchsorted(self.sorted_frames, end, side="right"))
+        )
+
+
+class TrackFrameIndex:
+
+    def __init__(self, ids, frames) -> None:
+        self.order, self.track_ids, self.starts = group_by_track(ids, frames)
+        self.ends = np.append(self.starts[1:], self.order.shape[0])
+        sorted_frames = np.asarray(frames)[self.order].astype(np.int64)
+
+        # tracks are contiguous and frame-sorted, so (track, frame) maps onto
+        # a single monotonic key that one searchsorted call can query for
+        # every track at once
+        if sorted_frames.shape[0] > 0:
+            self._min_frame = sorted_frames.min()
+            self._stride = sorted_frames.max() - self._min_frame + 1
+        else:
+            self._min_frame, self._stride = 0, 1
+        self.row_tracks = np.repeat(np.arange(self.track_ids.shape[0],
+                                              dtype=np.int64),
+                                    self.ends - self.starts)
+        self.keys = self.row_tracks * self._stride + \
+            (sorted_frames - self._min_frame)
+        self._growing = {}
+
+    def __len__(self):
+        return self.keys.shape[0]
+
+    def update(self, ids, frames, first_row):
+        # ids and frames of the whole table, which is contiguous and
+        # frame-sorted up to first_row; the tracks from the one holding
+        # first_row - 1 on are indexed again. Returns False, changing
+        # nothing, when the rows behind it are not sorted.
+        ids = np.asarray(ids)
+        n_rows = ids.shape[0]
+        track, row0 = first_changed_track(self.starts, first_row)
+        tail_ids = ids[row0:]
+        tail_frames = np.asarray(frames)[row0:].astype(np.int64)
+        id_steps = np.diff(tail_ids)
+        if np.any(id_steps < 0) or \
+                np.any((id_steps == 0) & (np.diff(tail_frames) < 0)):
+            return False
+
+        is_start = np.ones(tail_ids.shape[0], dtype=bool)
+        np.not_equal(tail_ids[1:], tail_ids[:-1], out=is_start[1:])
+        tail_starts = np.flatnonzero(is_start)
+        self.track_ids = np.concatenate([self.track_ids[:track],
+                                         tail_ids[tail_starts]])
+        self.starts = np.concatenate([self.starts[:track],
+                                      row0 + tail_starts])
+        self.ends = np.append(self.starts[1:], n_rows)
+
+        self.order = grow_tail(self, "order", row0, np.arange(row0, n_rows))
+        self.row_tracks = grow_tail(
+            self, "row_tracks", row0,
+            np.repeat(np.arange(track, self.starts.shape[0]),
+                      self.ends[track:] - self.starts[track:]))
+
+        if tail_frames.shape[0] > 0 and (
+                tail_frames.min() < self._min_frame or
+                tail_frames.max() >= self._min_frame + self._stride):
+            # frames outside the key range change every key; the new stride
+            # leaves room for the frames still to come
+            all_frames = np.asarray(frames).astype(np.int64)
+            self._min_frame = all_frames.min()
+            self._stride = 2 * (all_frames.max() - self._min_frame + 1)
+            self.keys = grow_tail(
+                self, "keys", 0,
+                self.row_tracks * self._stride +
+                (all_frames - self._min_frame))
+        else:
+            self.keys = grow_tail(
+                self, "keys", row0,
+                self.row_tracks[row0:] * self._stride +
+                (tail_frames - self._min_frame))
+        return True
+
+    def positions(self, track_ids):
+        return np.searchsorted(self.track_ids, track_ids)
+
+    def windows(self, track_positions, lower, upper):
+        # index ranges [lo, hi) into id-sorted data holding the frames
+        # lower <= frame <= upper of every requested track
+        track_positions = np.asarray(track_positions, dtype=np.int64)
+        lower = np.clip(np.ceil(np.asarray(lower, dtype=np.float64)) -
+                        self._min_frame, 0, self._stride)
+        upper = np.clip(np.floor(np.asarray(upper, dtype=np.float64)) -
+                        self._min_frame, -1, self._stride - 1)
+        offsets = track_positions * self._stride
+        lo = np.searchsorted(self.keys, offsets + lower.astype(np.int64),
+                             side="left")
+        hi = np.searchsorted(self.keys, offsets + upper.astype(np.int64),
+                             side="right")
+        return lo, np.maximum(lo, hi)
+
+
+def concatenate_ranges(lo, hi):
+    # flat index array covering every [lo, hi) range, in order
+    lengths = hi - lo
+    total = int(np.sum(lengths))
+    if total == 0:
+        return np.zeros(0, dtype=np.intp)
+
+    nonempty = lengths > 0
+    lo, lengths = lo[nonempty], lengths[nonempty]
+    steps = np.ones(total, dtype=np.intp)
+    steps[0] = lo[0]
+    range_starts = np.cumsum(lengths)[:-1]
+    steps[range_starts] = lo[1:] - (lo[:-1] + lengths[:-1] - 1)
+    return np.cumsum(steps)
+
+
+def in_ranges(rows, starts, ends):
+    # mask of the rows inside any of the sorted, disjoint [start, end)
+    # ranges; the rows need not be sorted
+    rows = np.asarray(rows)
+    ranges = np.searchsorted(ends, rows, side="right")
+    inside = ranges < ends.shape[0]
+    inside[inside] = starts[ranges[inside]] <= rows[inside]
+    return inside
+
+
+def window_differences(old_lo, old_hi, lo, hi):
+    # set differences of old and new [lo, hi) windows as index ranges, two
+    # per window and side; either range may be empty
+    dropped_lo = np.concatenate([old_lo, np.maximum(old_lo, hi)])
+    dropped_hi = np.concatenate([np.minimum(old_hi, lo), old_hi])
+    added_lo = np.concatenate([lo, np.maximum(lo, old_hi)])
+    added_hi = np.concatenate([np.minimum(hi, old_lo), hi])
+    return dropped_lo, np.maximum(dropped_lo, dropped_hi), \
+        added_lo, np.maximum(added_lo, added_hi)
@@ -0,0 +1,141 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+N_RATES = 64
+# recovery rates are searched from a tenth of the inverse recording time
+# to ten times the frame rate
+MIN_RATE_FACTOR = 0.1
+MAX_RATE_FACTOR = 10.0
+MIN_BLEACH_DEPTH = 0.2
+POST_BLEACH_FRAMES = 3
+PIXELS_PER_CHUNK = 16384
+FRAP_MAPS = ["half_time", "mobile_fraction", "plateau", "bleach_depth"]
+
+
+def recovery_rates(n_frames, dt, n_rates=N_RATES):
+    return np.geomspace(MIN_RATE_FACTOR / (n_frames * dt),
+                        MAX_RATE_FACTOR / dt, n_rates)
+
+
+def bleached_mask(pre_bleach, post_bleach, min_depth=MIN_BLEACH_DEPTH):
+    # pixels that lost at least min_depth of their pre-bleach intensity
+    with np.errstate(divide="ignore", invalid="ignore"):
+        depth = (pre_bleach - post_bleach) / pre_bleach
+    return np.nan_to_num(depth) >= min_depth
+
+
+def _linear_exponential_fit(curves, basis):
+    # least squares intercept and amplitude of curves = a + c * basis for
+    # every curve and every basis column, and the residual sums of squares
+    n = curves.shape[1]
+    sum_basis = basis.sum(axis=0, dtype=np.float64)
+    sum_basis2 = (basis.astype(np.float64) ** 2).sum(axis=0)
+    sum_curves = curves.sum(axis=1, dtype=np.float64)[:, None]
+    sum_curves2 = (curves.astype(np.float64) ** 2).sum(axis=1)[:, None]
+    cross = (curves @ basis).astype(np.float64)
+    determinant = n * sum_basis2 - sum_basis ** 2
+    intercept = (sum_basis2 * sum_curves - sum_basis * cross) / determinant
+    amplitude = (n * cross - sum_basis * sum_curves) / determinant
+    residual = sum_curves2 - intercept * sum_curves - amplitude * cross
+    return intercept, amplitude, residual
+
+
+def fit_recovery_curves(curves, dt=1.0, n_rates=N_RATES):
+    # I(t) = plateau - (plateau - I0) exp(-k t) fitted to every row of
+    # curves at once. For a fixed rate the model is linear, so all curves
+    # are solved in closed form for a grid of rates with one matrix product,
+    # and the best rate of every curve is refined by a parabola through the
+    # residuals around it. Returns the rate, plateau and initial intensity.
+    curves = np.asarray(curves)
+    n_curves, n_frames = curves.shape
+    # centred curves keep the single precision product accurate
+    means = curves.mean(axis=1, dtype=np.float64)
+    centred = curves - means[:, None]
+    times = dt * np.arange(n_frames)
+    rates = recovery_rates(n_frames, dt, n_rates)
+    _, _, residual = _linear_exponential_fit(
+        centred.astype(np.float32),
+        np.exp(-times[:, None] * rates[None]).astype(np.float32))
+
+    best = np.clip(np.argmin(residual, axis=1), 1, n_rates - 2)
+    rows = np.arange(n_curves)
+    left = residual[rows, best - 1]
+    centre = residual[rows, best]
+    right = residual[rows, best + 1]
+    curvature = left - 2 * centre + right
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = np.where(curvature > 0, 0.5 * (left - right) / curvature, 0)
+    log_step = np.log(rates[1] / rates[0])
+    rate = rates[best] * np.exp(np.clip(offset, -1, 1) * log_step)
+
+    # the final rate differs per curve, so the basis does as well
+    basis = np.exp(-rate[:, None] * times[None])
+    sum_basis = basis.sum(axis=1)
+    sum_basis2 = (basis ** 2).sum(axis=1)
+    sum_curves = centred.sum(axis=1)
+    cross = (centred * basis).sum(axis=1)
+    determinant = n_frames * sum_basis2 - sum_basis ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plateau = (sum_basis2 * sum_curves - sum_basis * cross) / \
+            determinant + means
+        amplitude = (n_frames * cross - sum_basis * sum_curves) / determinant
+    return rate, plateau, plateau + amplitude
+
+
+def _fit_chunk(curves, pre_bleach, dt, n_rates):
+    rate, plateau, initial = fit_recovery_curves(curves, dt, n_rates)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mobile_fraction = (plateau - initial) / (pre_bleach - initial)
+        half_time = np.log(2) / rate
+    # curves that do not recover have no half-time
+    recovering = (plateau > initial) & np.isfinite(half_time)
+    half_time[~recovering] = np.nan
+    mobile_fraction[~recovering] = np.nan
+    return half_time, mobile_fraction, plateau
+
+
+def frap_maps(stack, bleach_frame, dt=1.0, mask=None,
+              min_depth=MIN_BLEACH_DEPTH, n_rates=N_RATES,
+              pixels_per_chunk=PIXELS_PER_CHUNK, n_workers=1):
+    # maps of the recovery half-time, mobile fraction, plateau and bleach
+    # depth of every pixel of a (T, Y, X) stack whose first post-bleach
+    # frame is bleach_frame. Without a mask, pixels that were bleached by at
+    # least min_depth are fitted; other pixels are NaN. Chunks of pixels
+    # are fitted on a process pool with n_workers.
+    stack = np.asarray(stack)
+    if not 0 < bleach_frame < stack.shape[0] - 2:
+        raise ValueError("the bleach frame needs frames before and after it")
+
+    pre_bleach = stack[:bleach_frame].mean(axis=0, dtype=np.float64)
+    post_bleach = stack[bleach_frame:bleach_frame + POST_BLEACH_FRAMES].mean(
+        axis=0, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        depth = (pre_bleach - post_bleach) / pre_bleach
+    if mask is None:
+        mask = bleached_mask(pre_bleach, post_bleach, min_depth)
+
+    # (pixels, frames) curves of the masked pixels only
+    pixels = np.flatnonzero(mask)
+    recovery = stack[bleach_frame:].reshape(stack.shape[0] - bleach_frame, -1)
+    curves = recovery[:, pixels].T.astype(np.float32)
+    pre_bleach_values = pre_bleach.ravel()[pixels]
+
+    arguments = [(curves[start:start + pixels_per_chunk],
+                  pre_bleach_values[start:start + pixels_per_chunk], dt,
+                  n_rates)
+                 for start in range(0, pixels.shape[0], pixels_per_chunk)]
+    if n_workers > 1 and len(arguments) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_fit_chunk, *zip(*arguments)))
+    else:
+        results = [_fit_chunk(*chunk_arguments)
+                   for chunk_arguments in arguments]
+
+    maps = {name: np.full(mask.shape, np.nan) for name in FRAP_MAPS}
+    if results:
+        for name, values in zip(FRAP_MAPS, zip(*results)):
+            maps[name].ravel()[pixels] = np.concatenate(values)
+    maps["bleach_depth"][mask] = depth[mask]
+    return maps
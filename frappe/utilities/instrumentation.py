@@ -0,0 +1,132 @@
+import collections
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+# latency histograms have BINS_PER_DECADE logarithmic bins between
+# 10^MIN_DECADE and 10^MAX_DECADE seconds, plus an underflow and an overflow
+# bin
+MIN_DECADE = -6
+MAX_DECADE = 2
+BINS_PER_DECADE = 10
+N_LATENCY_BINS = (MAX_DECADE - MIN_DECADE) * BINS_PER_DECADE + 2
+LATENCY_EDGES = np.logspace(MIN_DECADE, MAX_DECADE,
+                            N_LATENCY_BINS - 1)
+MAX_TRACE_EVENTS = 100000
+SUMMARY_PERCENTILES = (50, 90, 99)
+INSTRUMENTATION_VARIABLE = "FRAPPE_INSTRUMENTATION"
+
+
+def latency_bin(seconds):
+    if seconds <= 0:
+        return 0
+    return min(max(int((math.log10(seconds) - MIN_DECADE) *
+                       BINS_PER_DECADE) + 1, 0), N_LATENCY_BINS - 1)
+
+
+class LatencyRecorder:
+
+    def __init__(self, enabled=False) -> None:
+        # histograms and call counts per instrumented name, and the most
+        # recent calls as trace events
+        self.enabled = enabled
+        self._holders = 0
+        self._enabled_before_hold = enabled
+        self.histograms = {}
+        self.total_times = collections.Counter()
+        self.max_times = {}
+        self.events = collections.deque(maxlen=MAX_TRACE_EVENTS)
+        self._origin = time.perf_counter()
+
+    def hold(self):
+        # recording stays on while anything showing the latencies holds it;
+        # the last release restores the state from before the first hold,
+        # e.g. recording enabled from the environment
+        if self._holders == 0:
+            self._enabled_before_hold = self.enabled
+        self._holders += 1
+        self.enabled = True
+
+    def release(self):
+        if self._holders == 0:
+            return
+        self._holders -= 1
+        if self._holders == 0:
+            self.enabled = self._enabled_before_hold
+
+    def record(self, name, start, duration):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = np.zeros(N_LATENCY_BINS,
+                                                         dtype=np.int64)
+            self.max_times[name] = 0.0
+        histogram[latency_bin(duration)] += 1
+        self.total_times[name] += duration
+        self.max_times[name] = max(self.max_times[name], duration)
+        self.events.append((name, start, duration, threading.get_ident()))
+
+    def reset(self):
+        self.histograms.clear()
+        self.total_times.clear()
+        self.max_times.clear()
+        self.events.clear()
+
+    def percentile(self, name, percentile):
+        # geometric centre of the bin holding the percentile
+        histogram = self.histograms[name]
+        cumulative = np.cumsum(histogram)
+        bin_index = int(np.searchsorted(cumulative,
+                                        cumulative[-1] * percentile / 100))
+        if bin_index == 0:
+            return LATENCY_EDGES[0]
+        if bin_index == N_LATENCY_BINS - 1:
+            return self.max_times[name]
+        return math.sqrt(LATENCY_EDGES[bin_index - 1] *
+                         LATENCY_EDGES[bin_index])
+
+    def summary(self):
+        # calls and latencies in seconds of every instrumented name, slowest
+        # in total first
+        summary = {}
+        for name, _ in self.total_times.most_common():
+            count = int(np.sum(self.histograms[name]))
+            summary[name] = {
+                "count": count,
+                "mean": self.total_times[name] / count,
+                **{f"p{percentile}": self.percentile(name, percentile)
+                   for percentile in SUMMARY_PERCENTILES},
+                "max": self.max_times[name]
+            }
+        return summary
+
+    def export_json(self, path):
+        # Chrome trace event format, which Perfetto and chrome://tracing
+        # open, with the histograms and the summary as extra keys
+        process_id = os.getpid()
+        trace = {
+            "traceEvents": [{
+                "name": name,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": duration * 1e6,
+                "pid": process_id,
+                "tid": thread_id
+            } for name, start, duration, thread_id in list(self.events)],
+            "displayTimeUnit": "ms",
+            "latencyHistograms": {
+                "edges": LATENCY_EDGES.tolist(),
+                "counts": {name: histogram.tolist() for name, histogram in
+                           self.histograms.items()}
+            },
+            "summary": self.summary()
+        }
+        with open(path, "w") as trace_file:
+            json.dump(trace, trace_file)
+
+
+recorder = LatencyRecorder(
+    enabled=bool(os.environ.get(INSTRUMENTATION_VARIABLE)))
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from frappe.utilities.frame_index import FrameIndex
+from frappe.utilities.particle_detection import image_pixel_size, read_frames
+from frappe.utilities.track_statistics import group_by_track
+
+
+DEFAULT_RADIUS = 1
+FRAMES_PER_CHUNK = 64
+INTENSITY_COLUMNS = ["mean_intensity", "intensity_std"]
+
+
+def pixel_indices(x, y, pixel_size, microns_per_unit=1.0):
+    # nearest pixel of every position, with pixel centres at whole multiples
+    # of the pixel size like in TrackMate and detect_particles
+    columns = np.rint(np.asarray(x, dtype=np.float64) * microns_per_unit /
+                      pixel_size[0])
+    rows = np.rint(np.asarray(y, dtype=np.float64) * microns_per_unit /
+                   pixel_size[1])
+    return rows, columns
+
+
+def sample_planes(planes, t, rows, columns, radius=DEFAULT_RADIUS):
+    # mean of the (2 radius + 1)^2 neighbourhood around every (t, row,
+    # column) of a (T, Y, X) chunk with one fancy index; neighbourhoods are
+    # cut at the border and positions outside the image give NaN
+    n_rows, n_columns = planes.shape[1:]
+    inside = (rows >= 0) & (rows < n_rows) & (columns >= 0) & \
+        (columns < n_columns)
+    values = np.full(t.shape[0], np.nan)
+    if not np.any(inside):
+        return values
+
+    offsets = np.arange(-radius, radius + 1)
+    neighbourhood_rows = np.clip(
+        rows[inside, None, None].astype(np.intp) + offsets[None, :, None],
+        0, n_rows - 1)
+    neighbourhood_columns = np.clip(
+        columns[inside, None, None].astype(np.intp) + offsets[None, None, :],
+        0, n_columns - 1)
+    values[inside] = planes[t[inside, None, None], neighbourhood_rows,
+                            neighbourhood_columns].mean(axis=(1, 2))
+    return values
+
+
+def intensity_traces(movie, tracks, pixel_size=None, microns_per_unit=1.0,
+                     radius=DEFAULT_RADIUS, channel=0, z=0,
+                     frames_per_chunk=FRAMES_PER_CHUNK):
+    # image intensity under every localization, in the row order of tracks.
+    # The movie, a (T, Y, X) array or the path of an image file, is streamed
+    # once in chunks of frames; chunks without localizations are not read
+    if isinstance(movie, str):
+        import bioio
+
+        image = bioio.BioImage(movie)
+        n_frames = image.dims.T
+        if pixel_size is None:
+            pixel_size = image_pixel_size(image)
+    else:
+        n_frames = movie.shape[0]
+    if pixel_size is None:
+        pixel_size = (1.0, 1.0)
+
+    frame_index = FrameIndex(tracks["frame"].to_numpy())
+    rows, columns = pixel_indices(tracks["x"].to_numpy(),
+                                  tracks["y"].to_numpy(), pixel_size,
+                                  microns_per_unit)
+    intensities = np.full(len(tracks), np.nan)
+    for start in range(0, n_frames, frames_per_chunk):
+        end = min(start + frames_per_chunk, n_frames)
+        chunk_rows = frame_index.order[frame_index.window(start, end - 1)]
+        if chunk_rows.shape[0] == 0:
+            continue
+
+        if isinstance(movie, str):
+            planes = read_frames(movie, start, end, channel, z)
+        else:
+            planes = np.asarray(movie[start:end])
+        t = frame_index.sorted_frames[frame_index.window(start, end - 1)] - \
+            start
+        intensities[chunk_rows] = sample_planes(
+            planes, t.astype(np.intp), rows[chunk_rows], columns[chunk_rows],
+            radius)
+
+    return intensities
+
+
+def intensity_statistics(tracks, intensities):
+    # mean and spread of the intensities of every track, ignoring
+    # localizations outside the image
+    order, unique_ids, starts = group_by_track(tracks["id"].to_numpy(),
+                                               tracks["frame"].to_numpy())
+    if unique_ids.shape[0] == 0:
+        return pd.DataFrame(columns=INTENSITY_COLUMNS,
+                            index=pd.Index(unique_ids, name="id"))
+
+    values = np.asarray(intensities, dtype=np.float64)[order]
+    finite = np.isfinite(values)
+    counts = np.add.reduceat(finite.astype(np.int64), starts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = np.add.reduceat(np.where(finite, values, 0), starts) / counts
+        centred = np.where(finite, values - np.repeat(
+            means, np.diff(np.append(starts, values.shape[0]))), 0)
+        spread = np.sqrt(np.add.reduceat(centred ** 2, starts) / counts)
+
+    return pd.DataFrame({"mean_intensity": means, "intensity_std": spread},
+                        index=pd.Index(unique_ids, name="id"))
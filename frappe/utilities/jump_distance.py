@@ -0,0 +1,203 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import optimize, special
+
+from frappe.utilities.frame_index import TrackFrameIndex
+from frappe.utilities.msd_analysis import MSD_COLUMNS
+
+
+JUMP_LAGS = (1, 2, 3)
+N_JUMP_BINS = 200
+N_BOOTSTRAP_GROUPS = 256
+JUMP_RANGE_FACTOR = 4
+CHUNK_LOCALIZATIONS = 2**20
+MAX_POPULATIONS = 3
+
+
+def _jumps(keys, row_tracks, positions, lag, start, end):
+    # squared displacements from every localization in [start, end) to the
+    # localization exactly lag frames later in the same track, if any
+    targets = keys[start:end] + lag
+    partners = np.minimum(np.searchsorted(keys, targets), keys.shape[0] - 1)
+    found = (keys[partners] == targets) & \
+        (row_tracks[partners] == row_tracks[start:end])
+    rows = np.arange(start, end)[found]
+    squared = np.sum((positions[partners[found]] - positions[rows]) ** 2,
+                     axis=1)
+    return rows, squared
+
+
+def jump_distance_histograms(tracks, lags=JUMP_LAGS, n_bins=N_JUMP_BINS,
+                             max_distance=None, columns=MSD_COLUMNS,
+                             n_groups=N_BOOTSTRAP_GROUPS):
+    # histograms of jump distances at every frame lag, accumulated over
+    # chunks of localizations so memory does not grow with the data; tracks
+    # are split into n_groups groups with a histogram each, which is what
+    # the bootstrap resamples. The last bin counts jumps beyond max_distance.
+    index = TrackFrameIndex(tracks["id"].to_numpy(),
+                            tracks["frame"].to_numpy())
+    positions = tracks[list(columns)].to_numpy(dtype=np.float64)[index.order]
+    keys = index.keys
+    row_tracks = index.row_tracks
+    n_localizations = keys.shape[0]
+    chunks = range(0, n_localizations, CHUNK_LOCALIZATIONS)
+
+    if max_distance is None:
+        # a multiple of the rms jump at the largest lag
+        squared_sum, n_jumps = 0.0, 0
+        for start in chunks:
+            _, squared = _jumps(keys, row_tracks, positions, max(lags), start,
+                                min(start + CHUNK_LOCALIZATIONS,
+                                    n_localizations))
+            squared_sum += np.sum(squared)
+            n_jumps += squared.shape[0]
+        max_distance = JUMP_RANGE_FACTOR * np.sqrt(squared_sum /
+                                                   max(n_jumps, 1))
+        if max_distance == 0:
+            max_distance = 1.0
+
+    edges = np.linspace(0, max_distance, n_bins + 1)
+    counts = np.zeros(n_groups * len(lags) * (n_bins + 1), dtype=np.int64)
+    for lag_index, lag in enumerate(lags):
+        for start in chunks:
+            rows, squared = _jumps(keys, row_tracks, positions, lag, start,
+                                   min(start + CHUNK_LOCALIZATIONS,
+                                       n_localizations))
+            bins = np.minimum((np.sqrt(squared) / max_distance *
+                               n_bins).astype(np.int64), n_bins)
+            groups = row_tracks[rows] % n_groups
+            counts += np.bincount(
+                (groups * len(lags) + lag_index) * (n_bins + 1) + bins,
+                minlength=counts.shape[0])
+
+    return counts.reshape(n_groups, len(lags), n_bins + 1), edges
+
+
+def _population_cdf(edges, variances, dimensions):
+    # cumulative jump distance distribution of a Gaussian displacement with
+    # the given variance per dimension
+    return special.gammainc(dimensions / 2,
+                            edges ** 2 / (2 * variances[..., None]))
+
+
+def _expected_counts(parameters, edges, tau, n_populations, dimensions,
+                     totals):
+    diffusion = np.exp(parameters[:n_populations])
+    weights = np.exp(np.append(parameters[n_populations:2 * n_populations - 1],
+                               0.0))
+    fractions = weights / np.sum(weights)
+    localization_variance = np.exp(parameters[-1])
+
+    # variance per dimension is 2 D tau plus the localization error of both
+    # ends of the jump
+    variances = 2 * diffusion[None, :] * tau[:, None] + \
+        2 * localization_variance
+    cdf = _population_cdf(edges, variances, dimensions)
+    probabilities = np.sum(fractions[None, :, None] * np.diff(cdf, axis=2),
+                           axis=1)
+    # jumps beyond the last edge
+    probabilities = np.concatenate([probabilities,
+                                    1 - np.sum(probabilities, axis=1,
+                                               keepdims=True)], axis=1)
+    return totals[:, None] * probabilities
+
+
+def fit_jump_distances(counts, edges, lags, dt, n_populations=1,
+                       dimensions=len(MSD_COLUMNS)):
+    # least-squares fit of n_populations diffusive populations with a shared
+    # localization error to the jump distance histograms of all lags at
+    # once; counts is (n_lags, n_bins + 1) or grouped (n_groups, ...)
+    counts = np.asarray(counts, dtype=np.float64)
+    if counts.ndim == 3:
+        counts = np.sum(counts, axis=0)
+    tau = dt * np.asarray(lags, dtype=np.float64)
+    totals = np.sum(counts, axis=1)
+    centres = (edges[1:] + edges[:-1]) / 2
+
+    # start from the mean squared jump of the shortest lag, spreading the
+    # populations over two decades around it
+    mean_squared = np.sum(counts[0, :-1] * centres ** 2) / \
+        max(np.sum(counts[0, :-1]), 1)
+    diffusion = max(mean_squared / (2 * dimensions * tau[0]),
+                    np.finfo(np.float64).tiny)
+    initial = np.concatenate([
+        np.log(diffusion) + np.linspace(-1, 1, n_populations) *
+        (n_populations > 1) * np.log(10),
+        np.zeros(n_populations - 1),
+        [np.log(max(0.05 * mean_squared / dimensions,
+                    np.finfo(np.float64).tiny))]
+    ])
+
+    def residuals(parameters):
+        expected = _expected_counts(parameters, edges, tau, n_populations,
+                                    dimensions, totals)
+        return ((counts - expected) / np.sqrt(np.maximum(expected, 1))).ravel()
+
+    result = optimize.least_squares(residuals, initial, method="trf")
+    parameters = result.x
+    order = np.argsort(parameters[:n_populations])
+    weights = np.exp(np.append(parameters[n_populations:2 * n_populations - 1],
+                               0.0))
+    fractions = (weights / np.sum(weights))[order]
+
+    fit = {}
+    for population, (log_diffusion, fraction) in enumerate(
+            zip(parameters[:n_populations][order], fractions)):
+        fit[f"diffusion_coefficient_{population + 1}"] = np.exp(
+            log_diffusion)
+        fit[f"fraction_{population + 1}"] = fraction
+    fit["localization_variance"] = np.exp(parameters[-1])
+    fit["chi_squared"] = 2 * result.cost
+    # Bayesian information criterion for choosing the number of populations
+    fit["bic"] = 2 * result.cost + parameters.shape[0] * \
+        np.log(np.sum(totals))
+    return pd.Series(fit)
+
+
+def fit_population_models(counts, edges, lags, dt,
+                          max_populations=MAX_POPULATIONS,
+                          dimensions=len(MSD_COLUMNS)):
+    return pd.DataFrame({
+        n_populations: fit_jump_distances(counts, edges, lags, dt,
+                                          n_populations, dimensions)
+        for n_populations in range(1, max_populations + 1)
+    }).T.rename_axis("n_populations")
+
+
+def _bootstrap_fit(counts, edges, lags, dt, n_populations, dimensions,
+                   seed):
+    # resample whole track groups, jumps of one track are not independent
+    rng = np.random.default_rng(seed)
+    groups = rng.integers(0, counts.shape[0], counts.shape[0])
+    return fit_jump_distances(np.sum(counts[groups], axis=0), edges, lags,
+                              dt, n_populations, dimensions)
+
+
+def bootstrap_jump_distances(counts, edges, lags, dt, n_populations=1,
+                             n_bootstrap=200, confidence=0.95,
+                             dimensions=len(MSD_COLUMNS), n_workers=1,
+                             seed=None):
+    # percentile confidence intervals of a population fit from grouped
+    # histograms as returned by jump_distance_histograms
+    seeds = np.random.SeedSequence(seed).generate_state(n_bootstrap)
+    arguments = [(counts, edges, lags, dt, n_populations, dimensions,
+                  int(bootstrap_seed)) for bootstrap_seed in seeds]
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            replicates = list(executor.map(_bootstrap_fit, *zip(*arguments)))
+    else:
+        replicates = [_bootstrap_fit(*bootstrap_arguments)
+                      for bootstrap_arguments in arguments]
+    replicates = pd.DataFrame(replicates).drop(columns=["chi_squared",
+                                                        "bic"])
+
+    estimate = fit_jump_distances(counts, edges, lags, dt, n_populations,
+                                  dimensions)
+    tail = (1 - confidence) / 2
+    return pd.DataFrame({
+        "estimate": estimate[replicates.columns],
+        "lower": replicates.quantile(tail),
+        "upper": replicates.quantile(1 - tail)
+    })
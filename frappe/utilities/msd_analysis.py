@@ -0,0 +1,213 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import fft
+
+from frappe.utilities.frame_index import concatenate_ranges
+from frappe.utilities.track_statistics import group_by_track
+
+
+MSD_COLUMNS = ("x", "y")
+DEFAULT_MAX_LAG = 100
+DEFAULT_FIT_LAGS = 4
+DEFAULT_ALPHA_FIT_LAGS = 10
+MAX_BATCH_ELEMENTS = 2**22
+DIFFUSION_COLUMNS = ["diffusion_coefficient",
+                     "localization_offset",
+                     "generalized_diffusion_coefficient",
+                     "alpha"]
+
+
+def _track_layout(tracks, columns):
+    order, unique_ids, starts = group_by_track(tracks["id"].to_numpy(),
+                                               tracks["frame"].to_numpy())
+    frames = tracks["frame"].to_numpy().astype(np.int64)[order]
+    positions = tracks[list(columns)].to_numpy(dtype=np.float64)[order]
+    ends = np.append(starts[1:], frames.shape[0])
+    return unique_ids, starts, ends, frames, positions
+
+
+def _batch_msd(relative_frames, positions, batch_starts, n_fft, max_lag):
+    # gap-aware time-averaged MSD of a batch of tracks on a common FFT
+    # length: with m the occupancy of every frame, all terms of
+    # sum m(t) m(t+k) |r(t+k) - r(t)|^2 are correlations
+    n_tracks = batch_starts.shape[0]
+    counts = np.diff(np.append(batch_starts, relative_frames.shape[0]))
+    rows = np.repeat(np.arange(n_tracks), counts)
+
+    # centring every track keeps the cancellation in |r|^2 - 2 r.r' small
+    means = np.add.reduceat(positions, batch_starts, axis=0) / \
+        counts[:, None]
+    positions = positions - np.repeat(means, counts, axis=0)
+
+    occupancy = np.zeros((n_tracks, n_fft))
+    occupancy[rows, relative_frames] = 1.0
+    squared = np.zeros((n_tracks, n_fft))
+    squared[rows, relative_frames] = np.sum(positions ** 2, axis=1)
+
+    occupancy_spectrum = fft.rfft(occupancy, axis=1)
+    squared_spectrum = fft.rfft(squared, axis=1)
+    n_pairs = fft.irfft(np.conj(occupancy_spectrum) * occupancy_spectrum,
+                        n=n_fft, axis=1)[:, 1:max_lag + 1]
+    squared_sum = fft.irfft(
+        np.conj(occupancy_spectrum) * squared_spectrum +
+        np.conj(squared_spectrum) * occupancy_spectrum,
+        n=n_fft, axis=1)[:, 1:max_lag + 1]
+
+    product_sum = np.zeros_like(squared_sum)
+    for dimension in range(positions.shape[1]):
+        coordinate = np.zeros((n_tracks, n_fft))
+        coordinate[rows, relative_frames] = positions[:, dimension]
+        spectrum = fft.rfft(coordinate, axis=1)
+        product_sum += fft.irfft(np.conj(spectrum) * spectrum, n=n_fft,
+                                 axis=1)[:, 1:max_lag + 1]
+
+    n_pairs = np.rint(n_pairs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        msd = np.maximum(squared_sum - 2 * product_sum, 0) / n_pairs
+    msd[n_pairs == 0] = np.nan
+    return msd, n_pairs.astype(np.int64)
+
+
+def _msd_batches(starts, ends, frames, max_lag):
+    # tracks of similar frame span share a padded FFT length; batches are
+    # capped in size so the dense arrays stay small
+    spans = frames[ends - 1] - frames[starts] + 1
+    size_classes = np.ceil(np.log2(np.maximum(spans, 1))).astype(np.int64)
+    order = np.lexsort((spans, size_classes))
+    class_bounds = np.flatnonzero(np.diff(size_classes[order])) + 1
+    for members in np.split(order, class_bounds):
+        if members.shape[0] == 0:
+            continue
+
+        n_fft = fft.next_fast_len(int(spans[members].max()) + max_lag)
+        batch_size = max(MAX_BATCH_ELEMENTS // n_fft, 1)
+        for first in range(0, members.shape[0], batch_size):
+            yield members[first:first + batch_size], n_fft
+
+
+def calculate_msd(tracks, max_lag=DEFAULT_MAX_LAG, columns=MSD_COLUMNS,
+                  n_workers=1):
+    # time-averaged MSD of every track at frame lags 1..max_lag, and the
+    # number of displacements averaged for each lag; missing frames are
+    # skipped rather than bridged
+    unique_ids, starts, ends, frames, positions = _track_layout(tracks,
+                                                                columns)
+    lags = pd.RangeIndex(1, max_lag + 1, name="lag")
+    msd = np.full((unique_ids.shape[0], max_lag), np.nan)
+    counts = np.zeros((unique_ids.shape[0], max_lag), dtype=np.int64)
+
+    batches = []
+    arguments = []
+    for members, n_fft in _msd_batches(starts, ends, frames, max_lag):
+        rows = concatenate_ranges(starts[members], ends[members])
+        lengths = ends[members] - starts[members]
+        batch_starts = np.cumsum(lengths) - lengths
+        relative_frames = frames[rows] - np.repeat(frames[starts[members]],
+                                                   lengths)
+        batches.append(members)
+        arguments.append((relative_frames, positions[rows], batch_starts,
+                          n_fft, max_lag))
+
+    if n_workers > 1 and len(arguments) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_batch_msd, *zip(*arguments)))
+    else:
+        results = [_batch_msd(*batch_arguments)
+                   for batch_arguments in arguments]
+
+    for members, (batch_msd, batch_counts) in zip(batches, results):
+        msd[members] = batch_msd
+        counts[members] = batch_counts
+
+    index = pd.Index(unique_ids, name="id")
+    return pd.DataFrame(msd, index=index, columns=lags), \
+        pd.DataFrame(counts, index=index, columns=lags)
+
+
+def time_ensemble_msd(msd, counts):
+    # time-averaged MSDs of all tracks, weighted by their displacements
+    weights = counts.to_numpy()
+    values = np.nan_to_num(msd.to_numpy())
+    total = np.sum(weights, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averaged = np.sum(values * weights, axis=0) / total
+    return pd.DataFrame({"msd": averaged, "n": total}, index=msd.columns)
+
+
+def ensemble_msd(tracks, max_lag=DEFAULT_MAX_LAG, columns=MSD_COLUMNS):
+    # displacement from the first localization of every track, averaged
+    # over tracks at each frame lag
+    _, starts, ends, frames, positions = _track_layout(tracks, columns)
+    lengths = ends - starts
+    first = np.repeat(starts, lengths)
+    lag = frames - frames[first]
+    squared = np.sum((positions - positions[first]) ** 2, axis=1)
+    in_range = (lag >= 1) & (lag <= max_lag)
+    total = np.bincount(lag[in_range], minlength=max_lag + 1)[1:]
+    summed = np.bincount(lag[in_range], weights=squared[in_range],
+                         minlength=max_lag + 1)[1:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averaged = summed / total
+    return pd.DataFrame({"msd": averaged, "n": total},
+                        index=pd.RangeIndex(1, max_lag + 1, name="lag"))
+
+
+def _fit_lines(x, y, valid):
+    # least-squares line through the valid points of every row
+    n = np.sum(valid, axis=1)
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+    sum_x, sum_y = np.sum(x, axis=1), np.sum(y, axis=1)
+    sum_xx, sum_xy = np.sum(x * x, axis=1), np.sum(x * y, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x ** 2)
+        intercept = (sum_y - slope * sum_x) / n
+    slope[n < 2] = np.nan
+    intercept[n < 2] = np.nan
+    return slope, intercept
+
+
+def fit_msd(msd, dt, fit_lags=DEFAULT_FIT_LAGS,
+            alpha_fit_lags=DEFAULT_ALPHA_FIT_LAGS, dimensions=2):
+    # MSD = 2 d D tau + offset over the first lags for the diffusion
+    # coefficient, and MSD = 2 d K tau^alpha in log-log for the anomalous
+    # exponent
+    values = msd.to_numpy()
+    tau = dt * msd.columns.to_numpy(dtype=np.float64)[None, :]
+    tau = np.broadcast_to(tau, values.shape)
+
+    linear = np.isfinite(values)
+    linear[:, fit_lags:] = False
+    slope, offset = _fit_lines(tau, values, linear)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        logarithmic = np.isfinite(values) & (values > 0)
+        logarithmic[:, alpha_fit_lags:] = False
+        alpha, log_prefactor = _fit_lines(np.log(tau), np.log(values),
+                                          logarithmic)
+
+    return pd.DataFrame({
+        "diffusion_coefficient": slope / (2 * dimensions),
+        "localization_offset": offset,
+        "generalized_diffusion_coefficient":
+            np.exp(log_prefactor) / (2 * dimensions),
+        "alpha": alpha
+    }, index=msd.index)
+
+
+def to_noctiluca(tracks, columns=MSD_COLUMNS):
+    # one noctiluca Trajectory per track, with missing frames as NaN, for
+    # the analyses noctiluca offers beyond MSDs
+    import noctiluca
+
+    unique_ids, starts, ends, frames, positions = _track_layout(tracks,
+                                                                columns)
+    dataset = noctiluca.TaggedSet()
+    for track_id, start, end in zip(unique_ids, starts, ends):
+        relative_frames = frames[start:end] - frames[start]
+        data = np.full((relative_frames[-1] + 1, len(columns)), np.nan)
+        data[relative_frames] = positions[start:end]
+        dataset.add(noctiluca.Trajectory(data, id=track_id))
+    return dataset
@@ -0,0 +1,333 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import ndimage
+
+from frappe.utilities.reader_utilities import compact_tracks
+
+
+DEFAULT_PSF_SIGMA = 1.5
+DEFAULT_THRESHOLD_SIGMAS = 5.0
+DOG_SIGMA_RATIO = 1.6
+# 1.4826 turns the median absolute deviation into a standard deviation
+MAD_TO_SIGMA = 1.4826
+THRESHOLD_SUBSAMPLE = 2
+GAUSSIAN_ITERATIONS = 20
+INITIAL_DAMPING = 1e-3
+FRAMES_PER_CHUNK = 64
+DETECTION_COLUMNS = ["frame", "x", "y", "z", "amplitude", "background",
+                     "sigma"]
+CANDIDATE_FILTERS = ("log", "dog")
+FIT_METHODS = ("gaussian", "radial_symmetry")
+
+
+def window_radius(psf_sigma):
+    return max(int(np.ceil(3 * psf_sigma)), 2)
+
+
+def candidate_response(frames, psf_sigma, candidate_filter="log"):
+    # blob response of a (T, Y, X) chunk, filtered plane by plane; both
+    # filters are tuned to the PSF width and positive on bright spots
+    frames = np.asarray(frames, dtype=np.float32)
+    if candidate_filter == "log":
+        # scale-normalized so the threshold does not depend on the PSF width;
+        # the Laplacian is summed over the plane axes only, not over time
+        sigma = (0, psf_sigma, psf_sigma)
+        return -psf_sigma ** 2 * (
+            ndimage.gaussian_filter(frames, sigma, order=(0, 2, 0)) +
+            ndimage.gaussian_filter(frames, sigma, order=(0, 0, 2)))
+    elif candidate_filter == "dog":
+        ratio = np.sqrt(DOG_SIGMA_RATIO)
+        narrow = psf_sigma / ratio
+        wide = psf_sigma * ratio
+        return ndimage.gaussian_filter(frames, (0, narrow, narrow)) - \
+            ndimage.gaussian_filter(frames, (0, wide, wide))
+    raise ValueError(f"unknown candidate filter {candidate_filter}")
+
+
+def robust_thresholds(response, threshold_sigmas):
+    # per-frame threshold a number of robust standard deviations above the
+    # median response, so it follows bleaching and background drift; a
+    # regular subsample of the pixels estimates both medians well enough
+    planes = response[:, ::THRESHOLD_SUBSAMPLE, ::THRESHOLD_SUBSAMPLE]
+    planes = planes.reshape(response.shape[0], -1)
+    median = np.median(planes, axis=1)
+    spread = MAD_TO_SIGMA * np.median(np.abs(planes - median[:, None]),
+                                      axis=1)
+    return median + threshold_sigmas * spread
+
+
+def find_candidates(frames, psf_sigma=DEFAULT_PSF_SIGMA, threshold=None,
+                    threshold_sigmas=DEFAULT_THRESHOLD_SIGMAS,
+                    candidate_filter="log"):
+    # local maxima of the blob response above the threshold, away from the
+    # border by the fit window radius; returns (frame, row, column) indices
+    # into the chunk
+    response = candidate_response(frames, psf_sigma, candidate_filter)
+    if threshold is None:
+        thresholds = robust_thresholds(response, threshold_sigmas)
+    else:
+        thresholds = np.full(response.shape[0], threshold)
+
+    size = 2 * int(np.ceil(psf_sigma)) + 1
+    is_maximum = ndimage.maximum_filter(response, size=(1, size, size)) == \
+        response
+    is_maximum &= response > thresholds[:, None, None]
+
+    radius = window_radius(psf_sigma)
+    is_maximum[:, :radius] = False
+    is_maximum[:, -radius:] = False
+    is_maximum[:, :, :radius] = False
+    is_maximum[:, :, -radius:] = False
+    return np.nonzero(is_maximum)
+
+
+def extract_windows(frames, t, rows, columns, radius):
+    # square windows around every candidate with one fancy index, (n, w, w)
+    offsets = np.arange(-radius, radius + 1)
+    return np.asarray(frames)[t[:, None, None],
+                              rows[:, None, None] + offsets[None, :, None],
+                              columns[:, None, None] + offsets[None, None, :]
+                              ].astype(np.float64)
+
+
+def _gaussian_model(parameters, xx, yy):
+    amplitude, x0, y0, sigma, background = parameters.T
+    dx = xx[None] - x0[:, None]
+    dy = yy[None] - y0[:, None]
+    r2 = dx ** 2 + dy ** 2
+    sigma2 = sigma[:, None] ** 2
+    g = np.exp(-r2 / (2 * sigma2))
+    model = amplitude[:, None] * g + background[:, None]
+    return model, g, dx, dy, r2, sigma2
+
+
+def fit_gaussians(windows, psf_sigma=DEFAULT_PSF_SIGMA,
+                  iterations=GAUSSIAN_ITERATIONS):
+    # symmetric 2D Gaussians plus a constant background fitted to all
+    # windows at once by Levenberg-Marquardt, with a damping factor per
+    # window; returns (x, y, amplitude, background, sigma) relative to the
+    # window centre and whether each fit converged to a sensible spot
+    n, width = windows.shape[:2]
+    radius = width // 2
+    coordinates = np.arange(width, dtype=np.float64) - radius
+    yy, xx = np.meshgrid(coordinates, coordinates, indexing="ij")
+    xx = xx.ravel()
+    yy = yy.ravel()
+    data = windows.reshape(n, -1)
+
+    background = data.min(axis=1)
+    parameters = np.column_stack([data.max(axis=1) - background,
+                                  np.zeros(n), np.zeros(n),
+                                  np.full(n, float(psf_sigma)), background])
+    damping = np.full(n, INITIAL_DAMPING)
+    model = _gaussian_model(parameters, xx, yy)[0]
+    cost = np.sum((data - model) ** 2, axis=1)
+    identity = np.eye(5)
+
+    for _ in range(iterations):
+        model, g, dx, dy, r2, sigma2 = _gaussian_model(parameters, xx, yy)
+        amplitude_g = parameters[:, 0, None] * g
+        sigma = parameters[:, 3, None]
+        jacobian = np.stack([g,
+                             amplitude_g * dx / sigma2,
+                             amplitude_g * dy / sigma2,
+                             amplitude_g * r2 / (sigma2 * sigma),
+                             np.ones_like(g)], axis=2)
+        jacobian_t = jacobian.transpose(0, 2, 1)
+        jtj = jacobian_t @ jacobian
+        jtr = (jacobian_t @ (data - model)[:, :, None])[:, :, 0]
+        damped = jtj + damping[:, None, None] * \
+            (jtj * identity + identity * 1e-12)
+        try:
+            steps = np.linalg.solve(damped, jtr[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            steps = np.stack([np.linalg.lstsq(a, b, rcond=None)[0]
+                              for a, b in zip(damped, jtr)])
+
+        trial = parameters + steps
+        trial_cost = np.sum((data - _gaussian_model(trial, xx, yy)[0]) ** 2,
+                            axis=1)
+        accepted = np.isfinite(trial_cost) & (trial_cost < cost)
+        parameters[accepted] = trial[accepted]
+        cost[accepted] = trial_cost[accepted]
+        damping = np.where(accepted, damping / 10, damping * 10)
+
+    amplitude, x0, y0, sigma, background = parameters.T
+    sigma = np.abs(sigma)
+    valid = np.all(np.isfinite(parameters), axis=1) & (amplitude > 0) & \
+        (np.abs(x0) < radius) & (np.abs(y0) < radius) & \
+        (sigma > 0.25 * psf_sigma) & (sigma < radius)
+    return x0, y0, amplitude, background, sigma, valid
+
+
+def fit_radial_symmetry(windows):
+    # Parthasarathy's radial symmetry centres (Nat. Methods 9, 724, 2012),
+    # vectorized over windows: every intensity gradient defines a line and
+    # the centre is the point closest to all lines in the weighted least
+    # squares sense. Returns positions relative to the window centre.
+    n, width = windows.shape[:2]
+    half = (width - 1) / 2
+    midpoints = np.arange(-half + 0.5, half, 1.0)
+    ym, xm = np.meshgrid(midpoints, midpoints, indexing="ij")
+
+    # gradients along the diagonals at the corners between pixels
+    du = windows[:, :-1, 1:] - windows[:, 1:, :-1]
+    dv = windows[:, :-1, :-1] - windows[:, 1:, 1:]
+    du = ndimage.uniform_filter(du, size=(1, 3, 3), mode="constant")
+    dv = ndimage.uniform_filter(dv, size=(1, 3, 3), mode="constant")
+    magnitude2 = du ** 2 + dv ** 2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = -(dv + du) / (du - dv)
+    slopes[np.isnan(slopes)] = 0
+    infinite = np.isinf(slopes)
+    if np.any(infinite):
+        # vertical gradient lines get a steep but finite slope
+        finite_max = np.max(np.where(infinite, 0, np.abs(slopes)),
+                            axis=(1, 2))
+        steep = np.broadcast_to(10 * np.maximum(finite_max, 1)[:, None, None],
+                                slopes.shape)
+        slopes[infinite] = steep[infinite]
+    intercepts = ym - slopes * xm
+
+    total = np.sum(magnitude2, axis=(1, 2))
+    safe_total = np.where(total > 0, total, 1)
+    x_centroid = np.sum(magnitude2 * xm, axis=(1, 2)) / safe_total
+    y_centroid = np.sum(magnitude2 * ym, axis=(1, 2)) / safe_total
+    # weight lines by gradient strength and closeness to the rough centre
+    distance = np.sqrt((xm - x_centroid[:, None, None]) ** 2 +
+                       (ym - y_centroid[:, None, None]) ** 2)
+    weights = magnitude2 / np.maximum(distance, 1e-6) / (slopes ** 2 + 1)
+
+    sw = np.sum(weights, axis=(1, 2))
+    smmw = np.sum(slopes ** 2 * weights, axis=(1, 2))
+    smw = np.sum(slopes * weights, axis=(1, 2))
+    smbw = np.sum(slopes * intercepts * weights, axis=(1, 2))
+    sbw = np.sum(intercepts * weights, axis=(1, 2))
+    determinant = smw ** 2 - smmw * sw
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x0 = (smbw * sw - smw * sbw) / determinant
+        y0 = (smbw * smw - smmw * sbw) / determinant
+
+    background = windows.min(axis=(1, 2))
+    amplitude = windows.max(axis=(1, 2)) - background
+    valid = (total > 0) & np.isfinite(x0) & np.isfinite(y0) & \
+        (np.abs(x0) < half) & (np.abs(y0) < half)
+    return x0, y0, amplitude, background, np.full(n, np.nan), valid
+
+
+def detect_frames(frames, first_frame=0, pixel_size=(1.0, 1.0),
+                  psf_sigma=DEFAULT_PSF_SIGMA, threshold=None,
+                  threshold_sigmas=DEFAULT_THRESHOLD_SIGMAS,
+                  candidate_filter="log", fit_method="gaussian"):
+    # localizations in a (T, Y, X) chunk whose first plane is first_frame;
+    # positions are in the units of pixel_size (x, y) with pixel centres at
+    # whole multiples of it, like in TrackMate
+    frames = np.asarray(frames)
+    t, rows, columns = find_candidates(frames, psf_sigma, threshold,
+                                       threshold_sigmas, candidate_filter)
+    if t.shape[0] == 0:
+        return _detection_table(*[np.zeros(0)] * 7)
+
+    windows = extract_windows(frames, t, rows, columns,
+                              window_radius(psf_sigma))
+    if fit_method == "gaussian":
+        fit = fit_gaussians(windows, psf_sigma)
+    elif fit_method == "radial_symmetry":
+        fit = fit_radial_symmetry(windows)
+    else:
+        raise ValueError(f"unknown fit method {fit_method}")
+    x0, y0, amplitude, background, sigma, valid = fit
+
+    return _detection_table(
+        t[valid] + first_frame,
+        (columns[valid] + x0[valid]) * pixel_size[0],
+        (rows[valid] + y0[valid]) * pixel_size[1],
+        np.zeros(np.count_nonzero(valid)),
+        amplitude[valid], background[valid],
+        sigma[valid] * pixel_size[0])
+
+
+def _detection_table(frames, x, y, z, amplitude, background, sigma):
+    return pd.DataFrame({"frame": np.asarray(frames, dtype=np.int64),
+                         "x": x, "y": y, "z": z,
+                         "amplitude": amplitude,
+                         "background": background,
+                         "sigma": sigma}, columns=DETECTION_COLUMNS)
+
+
+def read_frames(image_path, start, end, channel=0, z=0):
+    # planes start..end - 1 of an image file as (T, Y, X), read lazily so a
+    # worker only loads its own chunk
+    import bioio
+
+    image = bioio.BioImage(image_path)
+    return image.get_image_dask_data("TYX", T=slice(start, end), C=channel,
+                                     Z=z).compute()
+
+
+def _detect_chunk(source, start, end, channel, z, parameters):
+    if isinstance(source, str):
+        frames = read_frames(source, start, end, channel, z)
+    else:
+        frames = source
+    return detect_frames(frames, first_frame=start, **parameters)
+
+
+def image_pixel_size(image):
+    # physical (x, y) pixel size of a bioio image, one where it is unknown
+    sizes = image.physical_pixel_sizes
+    return (sizes.X if sizes.X else 1.0, sizes.Y if sizes.Y else 1.0)
+
+
+def detect_particles(movie, channel=0, z=0, pixel_size=None,
+                     psf_sigma=DEFAULT_PSF_SIGMA, threshold=None,
+                     threshold_sigmas=DEFAULT_THRESHOLD_SIGMAS,
+                     candidate_filter="log", fit_method="gaussian",
+                     frames_per_chunk=FRAMES_PER_CHUNK, n_workers=1):
+    # localizations of every frame of a movie, either a (T, Y, X) array or
+    # the path of an image file that workers read chunk by chunk; the table
+    # has the frame, x, y, z columns of parse_tracks, without ids until the
+    # localizations are linked
+    if candidate_filter not in CANDIDATE_FILTERS:
+        raise ValueError(f"unknown candidate filter {candidate_filter}")
+    if fit_method not in FIT_METHODS:
+        raise ValueError(f"unknown fit method {fit_method}")
+
+    if isinstance(movie, str):
+        import bioio
+
+        image = bioio.BioImage(movie)
+        n_frames = image.dims.T
+        if pixel_size is None:
+            pixel_size = image_pixel_size(image)
+        chunks = [(movie, start, min(start + frames_per_chunk, n_frames))
+                  for start in range(0, n_frames, frames_per_chunk)]
+    else:
+        n_frames = movie.shape[0]
+        chunks = [(movie[start:start + frames_per_chunk], start,
+                   min(start + frames_per_chunk, n_frames))
+                  for start in range(0, n_frames, frames_per_chunk)]
+    if pixel_size is None:
+        pixel_size = (1.0, 1.0)
+
+    parameters = {"pixel_size": tuple(pixel_size), "psf_sigma": psf_sigma,
+                  "threshold": threshold,
+                  "threshold_sigmas": threshold_sigmas,
+                  "candidate_filter": candidate_filter,
+                  "fit_method": fit_method}
+    arguments = [(source, start, end, channel, z, parameters)
+                 for source, start, end in chunks]
+
+    if n_workers > 1 and len(arguments) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_detect_chunk, *zip(*arguments)))
+    else:
+        results = [_detect_chunk(*chunk_arguments)
+                   for chunk_arguments in arguments]
+
+    if not results:
+        return _detection_table(*[np.zeros(0)] * 7)
+    return compact_tracks(pd.concat(results, ignore_index=True))
@@ -0,0 +1,191 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from scipy.spatial import cKDTree
+
+from frappe.utilities.frame_index import FrameIndex
+from frappe.utilities.reader_utilities import normalize_tracks
+
+
+LINKING_COLUMNS = ("x", "y")
+# below this many track-localization pairs the distances are computed
+# directly, building trees costs more than it saves
+MIN_TREE_PAIRS = 256
+# ending a track or starting one costs this much more than the dearest link
+ALTERNATIVE_COST_FACTOR = 1.05
+EPSILON_COST = 1e-12
+
+
+def candidate_pairs(track_positions, positions, radius):
+    # (track, localization, distance) of all pairs closer than radius
+    if track_positions.shape[0] * positions.shape[0] < MIN_TREE_PAIRS:
+        distances = np.linalg.norm(track_positions[:, None] -
+                                   positions[None], axis=2)
+        tracks, localizations = np.nonzero(distances <= radius)
+        return tracks, localizations, distances[tracks, localizations]
+
+    pairs = cKDTree(track_positions).sparse_distance_matrix(
+        cKDTree(positions), radius, output_type="ndarray")
+    return pairs["i"].astype(np.intp), pairs["j"].astype(np.intp), \
+        pairs["v"]
+
+
+def assign_pairs(tracks, localizations, costs):
+    # minimum cost one-to-one assignment of the candidate pairs. Pairs that
+    # compete with no other are taken as they are. The rest is solved at once
+    # as a sparse linear assignment problem in which every track may also
+    # end and every localization may also start a track, at a cost above
+    # that of any link (the cost matrix of Jaqaman et al., Nat. Methods 5,
+    # 695, 2008), so it stays sparse and grows with the number of pairs
+    if tracks.shape[0] == 0:
+        return tracks, localizations
+
+    unique = (np.bincount(tracks)[tracks] == 1) & \
+        (np.bincount(localizations)[localizations] == 1)
+    if np.all(unique):
+        return tracks, localizations
+
+    competing = ~unique
+    group_tracks, track_rows = np.unique(tracks[competing],
+                                         return_inverse=True)
+    group_localizations, localization_rows = np.unique(
+        localizations[competing], return_inverse=True)
+    n_tracks = group_tracks.shape[0]
+    n_localizations = group_localizations.shape[0]
+    costs = costs[competing]
+    # no cost may be zero, zeros would not be stored as edges
+    link_costs = costs + EPSILON_COST
+    alternative_cost = ALTERNATIVE_COST_FACTOR * np.max(link_costs)
+
+    # [links, track ends; localization starts, auxiliary links]
+    track_diagonal = np.arange(n_tracks)
+    localization_diagonal = np.arange(n_localizations)
+    rows = np.concatenate([track_rows, track_diagonal,
+                           n_tracks + localization_diagonal,
+                           n_tracks + localization_rows])
+    columns = np.concatenate([localization_rows,
+                              n_localizations + track_diagonal,
+                              localization_diagonal,
+                              n_localizations + track_rows])
+    weights = np.concatenate([link_costs,
+                              np.full(n_tracks, alternative_cost),
+                              np.full(n_localizations, alternative_cost),
+                              np.full(costs.shape[0], EPSILON_COST)])
+    size = n_tracks + n_localizations
+    matrix = csr_matrix((weights, (rows, columns)), shape=(size, size))
+    _, matched = min_weight_full_bipartite_matching(matrix)
+    matched = matched[:n_tracks]
+    linked = matched < n_localizations
+
+    return np.concatenate([tracks[unique], group_tracks[linked]]), \
+        np.concatenate([localizations[unique],
+                        group_localizations[matched[linked]]])
+
+
+class ParticleLinker:
+
+    def __init__(self, max_displacement, max_gap=0, gap_displacement=None,
+                 first_id=0) -> None:
+        # localizations are fed frame by frame in increasing frame order;
+        # only tracks that can still be continued are kept, so memory is
+        # bounded by the number of particles in max_gap + 1 frames
+        self.max_displacement = max_displacement
+        self.max_gap = max_gap
+        self.gap_displacement = max_displacement if gap_displacement is None \
+            else gap_displacement
+        self.next_id = first_id
+        self.track_positions = None
+        self.track_frames = np.zeros(0, dtype=np.int64)
+        self.track_ids = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return self.track_ids.shape[0]
+
+    def link_frame(self, frame, positions):
+        # ids of the localizations of one frame, continuing the tracks they
+        # are assigned to and starting new tracks for the others
+        positions = np.asarray(positions, dtype=np.float64)
+        if self.track_positions is None:
+            self.track_positions = np.zeros((0, positions.shape[1]))
+
+        # tracks that have been missing for longer than max_gap are finished
+        alive = self.track_frames >= frame - 1 - self.max_gap
+        if not np.all(alive):
+            self.track_positions = self.track_positions[alive]
+            self.track_frames = self.track_frames[alive]
+            self.track_ids = self.track_ids[alive]
+
+        ids = np.full(positions.shape[0], -1, dtype=np.int64)
+        if len(self) > 0 and positions.shape[0] > 0:
+            radius = max(self.max_displacement, self.gap_displacement) \
+                if self.max_gap > 0 else self.max_displacement
+            tracks, localizations, distances = candidate_pairs(
+                self.track_positions, positions, radius)
+            gaps = frame - 1 - self.track_frames[tracks]
+            allowed = np.where(gaps == 0,
+                               distances <= self.max_displacement,
+                               distances <= self.gap_displacement)
+            tracks, localizations = assign_pairs(
+                tracks[allowed], localizations[allowed],
+                distances[allowed] ** 2)
+
+            ids[localizations] = self.track_ids[tracks]
+            self.track_positions[tracks] = positions[localizations]
+            self.track_frames[tracks] = frame
+
+        started = np.flatnonzero(ids < 0)
+        if started.shape[0] == 0:
+            return ids
+        new_ids = np.arange(self.next_id, self.next_id + started.shape[0])
+        ids[started] = new_ids
+        self.next_id += started.shape[0]
+        self.track_positions = np.concatenate([self.track_positions,
+                                               positions[started]])
+        self.track_frames = np.concatenate([
+            self.track_frames, np.full(started.shape[0], frame,
+                                       dtype=np.int64)])
+        self.track_ids = np.concatenate([self.track_ids, new_ids])
+        return ids
+
+
+def link_ids(frames, positions, max_displacement, max_gap=0,
+             gap_displacement=None):
+    # track ids of localizations given by frame and position, in the order
+    # they are given
+    frame_index = FrameIndex(frames)
+    sorted_frames = frame_index.sorted_frames
+    boundaries = np.flatnonzero(np.diff(sorted_frames)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.append(boundaries, sorted_frames.shape[0])
+
+    linker = ParticleLinker(max_displacement, max_gap, gap_displacement)
+    sorted_ids = np.empty(sorted_frames.shape[0], dtype=np.int64)
+    if sorted_frames.shape[0] == 0:
+        return sorted_ids
+    for start, end in zip(starts, ends):
+        rows = frame_index.order[start:end]
+        sorted_ids[start:end] = linker.link_frame(int(sorted_frames[start]),
+                                                  positions[rows])
+
+    ids = np.empty_like(sorted_ids)
+    ids[frame_index.order] = sorted_ids
+    return ids
+
+
+def link_localizations(localizations, max_displacement, max_gap=0,
+                       gap_displacement=None, min_length=1,
+                       columns=LINKING_COLUMNS):
+    # link a table of localizations with frame and position columns, such as
+    # detect_particles returns, into tracks; the result has the id column
+    # and (id, frame) order of parse_tracks and can be shown by FrappeTrack.
+    # Tracks shorter than min_length are dropped and ids renumbered.
+    ids = link_ids(localizations["frame"].to_numpy(),
+                   localizations[list(columns)].to_numpy(dtype=np.float64),
+                   max_displacement, max_gap, gap_displacement)
+    if min_length > 1:
+        lengths = np.bincount(ids)
+        kept = lengths[ids] >= min_length
+        localizations = localizations[kept]
+        _, ids = np.unique(ids[kept], return_inverse=True)
+
+    return normalize_tracks(localizations.assign(id=ids))
@@ -0,0 +1,120 @@
+import numpy as np
+
+from frappe.utilities.frame_index import (
+    concatenate_ranges, window_differences
+    )
+
+
+class PlaybackBuffer:
+
+    def __init__(self, x, y, track_starts, track_ends, track_positions,
+                 track_groups, n_groups, capacity) -> None:
+        # every track gets a ring of min(capacity, length) localizations in
+        # one shared preallocated buffer; slots are ordered by pen group so
+        # every group is a contiguous view that can go straight to the plot
+        self.x_source = np.asarray(x, dtype=np.float64)
+        self.y_source = np.asarray(y, dtype=np.float64)
+        self.capacity = capacity
+        self.n_groups = n_groups
+
+        track_positions = np.asarray(track_positions, dtype=np.intp)
+        track_groups = np.asarray(track_groups)[track_positions]
+        slot_order = np.argsort(track_groups, kind="stable")
+        self.track_positions = track_positions[slot_order]
+        self.slot_groups = track_groups[slot_order]
+        self._position_order = np.argsort(self.track_positions)
+
+        self.starts = np.asarray(track_starts)[self.track_positions]
+        lengths = np.asarray(track_ends)[self.track_positions] - self.starts
+        self.slot_sizes = np.maximum(np.minimum(lengths, capacity), 1)
+
+        # one extra element per slot mirrors the first ring element so the
+        # segment across the wrap-around is still drawn
+        slot_bounds = np.zeros(self.slot_sizes.shape[0] + 1, dtype=np.intp)
+        np.cumsum(self.slot_sizes + 1, out=slot_bounds[1:])
+        self.slot_offsets = slot_bounds[:-1]
+        self.bridges = self.slot_offsets + self.slot_sizes
+        self.group_bounds = slot_bounds[
+            np.searchsorted(self.slot_groups, np.arange(n_groups + 1))]
+
+        self.x = np.full(slot_bounds[-1], np.nan)
+        self.y = np.full(slot_bounds[-1], np.nan)
+        self.connect = np.ones(slot_bounds[-1], dtype=bool)
+        self.connect[self.bridges] = False
+
+        self.lo = self.starts.copy()
+        self.hi = self.starts.copy()
+        self._all_dirty = True
+
+    def __len__(self):
+        return self.x.shape[0]
+
+    def slots(self, track_positions):
+        sorted_positions = self.track_positions[self._position_order]
+        return self._position_order[
+            np.searchsorted(sorted_positions, track_positions)]
+
+    def buffer_positions(self, slots, source_indices):
+        return self.slot_offsets[slots] + \
+            (source_indices - self.starts[slots]) % self.slot_sizes[slots]
+
+    def _gather(self, slots, lo, hi):
+        source_indices = concatenate_ranges(lo, hi)
+        slots = np.repeat(slots, hi - lo)
+        return source_indices, self.buffer_positions(slots, source_indices)
+
+    def update(self, track_positions, lo, hi):
+        # tracks that are not passed in are emptied
+        new_lo = self.starts.copy()
+        new_hi = self.starts.copy()
+        slots = self.slots(track_positions)
+        new_lo[slots] = lo
+        new_hi[slots] = np.maximum(lo, hi)
+        # a window larger than its ring keeps its newest localizations
+        new_lo = np.maximum(new_lo, new_hi - self.slot_sizes)
+
+        changed = np.flatnonzero((new_lo != self.lo) | (new_hi != self.hi))
+        if changed.shape[0] == 0 and not self._all_dirty:
+            return []
+
+        old_lo, old_hi = self.lo[changed], self.hi[changed]
+        lo, hi = new_lo[changed], new_hi[changed]
+
+        dropped_lo, dropped_hi, added_lo, added_hi = window_differences(
+            old_lo, old_hi, lo, hi)
+        range_slots = np.concatenate([changed, changed])
+
+        _, positions = self._gather(range_slots, dropped_lo, dropped_hi)
+        self.x[positions] = np.nan
+        self.y[positions] = np.nan
+
+        source_indices, positions = self._gather(range_slots, added_lo,
+                                                 added_hi)
+        self.x[positions] = self.x_source[source_indices]
+        self.y[positions] = self.y_source[source_indices]
+
+        # keep the mirrored first element of every touched ring in sync
+        touched = self.slot_offsets[changed]
+        self.x[self.bridges[changed]] = self.x[touched]
+        self.y[self.bridges[changed]] = self.y[touched]
+
+        # the newest localization must not connect to the oldest one
+        was_filled = old_hi > old_lo
+        self.connect[self.buffer_positions(changed[was_filled],
+                                           old_hi[was_filled] - 1)] = True
+        is_filled = hi > lo
+        self.connect[self.buffer_positions(changed[is_filled],
+                                           hi[is_filled] - 1)] = False
+
+        self.lo[changed] = lo
+        self.hi[changed] = hi
+
+        if self._all_dirty:
+            self._all_dirty = False
+            return list(range(self.n_groups))
+
+        return list(np.unique(self.slot_groups[changed]))
+
+    def group_data(self, group):
+        start, end = self.group_bounds[group], self.group_bounds[group + 1]
+        return self.x[start:end], self.y[start:end], self.connect[start:end]
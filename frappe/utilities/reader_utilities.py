@@ -3,23 +3,105 @@ import pandas as pd
 from scipy import optimize
 import xml.etree.cElementTree as et
 
+from frappe.utilities.decorators import instrumented
+from frappe.utilities.track_cache import read_track_cache, write_track_cache
+
+# bump whenever the parsed track table changes, so stale caches are rebuilt
+PARSER_VERSION = 2
+# parse_tracks keeps the units of the file: MINFLUX exports are in metres,
+# TrackMate exports in microns like the physical pixel sizes of images
+MICRONS_PER_UNIT = {"npy": 1e6, "xml": 1.0}
+
+
+@instrumented()
+def parse_tracks(tracks_path, use_cache=True, float32_coordinates=False):
+    if use_cache:
+        cached_tracks = read_track_cache(tracks_path, PARSER_VERSION)
+        if cached_tracks is not None:
+            data, dt = cached_tracks
+            return compact_tracks(data, float32_coordinates), dt
 
-def parse_tracks(tracks_path):
     # get the file extension
     file_extension = tracks_path.split(".")[-1]
 
     if file_extension == "npy":
-        return read_minflux_file(tracks_path)
+        data, dt = read_minflux_file(tracks_path)
 
     elif file_extension == "xml":
-        return read_trackmate_file(tracks_path)
+        data, dt = read_trackmate_file(tracks_path)
+
+    else:
+        return None
+
+    data = normalize_tracks(data)
+    if use_cache:
+        write_track_cache(tracks_path, PARSER_VERSION, data, dt)
+
+    return compact_tracks(data, float32_coordinates), dt
+
+
+def narrowest_integer_dtype(values):
+    if values.shape[0] == 0:
+        return np.int32
+
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def compact_tracks(data, float32_coordinates=False):
+    # narrow ids and frames to the smallest integer type holding them and
+    # optionally store coordinates in single precision; columns that are
+    # already compact are passed through without a copy
+    columns = {}
+    for column in data.columns:
+        values = data[column].to_numpy()
+        if column in ("id", "frame") and \
+                np.issubdtype(values.dtype, np.integer):
+            values = values.astype(narrowest_integer_dtype(values),
+                                   copy=False)
+        elif column in ("x", "y", "z") and float32_coordinates:
+            values = values.astype(np.float32, copy=False)
+        columns[column] = values
+
+    return pd.DataFrame(columns, copy=False)
+
+
+def track_times(tracks, dt):
+    # times are not stored, they follow from the frames
+    return dt * tracks["frame"].to_numpy(dtype=np.float64)
+
+
+def track_microns_per_unit(tracks_path):
+    # tracks without a file, e.g. from detect_particles, are in microns
+    if tracks_path is None:
+        return 1.0
+    return MICRONS_PER_UNIT.get(tracks_path.split(".")[-1], 1.0)
+
+
+def normalize_tracks(data):
+    # tracks that are contiguous and frame-sorted, in compact columns
+    return compact_tracks(data.sort_values(["id", "frame"], kind="stable")
+                          .reset_index(drop=True))
+
+
+def memory_report(tracks):
+    # bytes per column
+    return tracks.memory_usage(index=False, deep=True)
 
 
 def read_trackmate_file(trackmate_tracks_path):
     root = et.fromstring(open(trackmate_tracks_path).read())
     parameter_dict = root.attrib
-    track_id = 0
+    data = trackmate_particles(root)
+
+    return data, float(parameter_dict["frameInterval"])
+
 
+def trackmate_particles(root, track_id=0):
+    # one track per particle element, numbered from track_id
     frames = []
     x_vals = []
     y_vals = []
@@ -35,44 +117,34 @@ def read_trackmate_file(trackmate_tracks_path):
             ids.append(track_id)
         track_id += 1
 
-    data = pd.DataFrame({
-        "frame": frames,
-        "t": float(parameter_dict["frameInterval"]) * np.array(frames),
-        "x": x_vals,
-        "y": y_vals,
-        "z": z_vals,
-        "id": ids
+    return pd.DataFrame({
+        "frame": np.array(frames, dtype=np.int64),
+        "x": np.array(x_vals, dtype=np.float64),
+        "y": np.array(y_vals, dtype=np.float64),
+        "z": np.array(z_vals, dtype=np.float64),
+        "id": np.array(ids, dtype=np.int64)
     })
 
-    return data, float(parameter_dict["frameInterval"])
-
 
 def read_minflux_file(minflux_tracks_path):
 
     minflux_npy = np.load(minflux_tracks_path)
     dt = find_minflux_timestep(minflux_npy)
 
+    return minflux_localizations(minflux_npy, dt), dt
+
+
+def minflux_localizations(minflux_npy, dt, previous_ids=None,
+                          previous_tims=None, previous_frames=None):
     tim = minflux_npy['tim']
     tid = minflux_npy['tid']
     loc_x = minflux_npy['itr'][:, -1]['loc'][:, 0]
     loc_y = minflux_npy['itr'][:, -1]['loc'][:, 1]
     loc_z = minflux_npy['itr'][:, -1]['loc'][:, 2]
 
-    unique_tids = np.unique(tid)
-    new_tims = np.zeros(tim.shape)
-
-    for current_tid in unique_tids:
-        current_index = tid == current_tid
-        current_tim = tim[current_index]
-        new_tims[current_index] = \
-            np.insert(
-                      np.cumsum(np.round(np.diff(current_tim)/dt).astype(int)),
-                      0,
-                      0)
-
-    data = pd.DataFrame({
-        "frame": new_tims.astype(int),
-        "t": dt * new_tims,
+    return pd.DataFrame({
+        "frame": reconstruct_minflux_frames(tim, tid, dt, previous_ids,
+                                            previous_tims, previous_frames),
         "x": loc_x,
         "y": loc_y,
         "z": loc_z,
@@ -80,7 +152,41 @@ def read_minflux_file(minflux_tracks_path):
         "original_tim": tim
     })
 
-    return data, dt
+
+def reconstruct_minflux_frames(tim, tid, dt, previous_ids=None,
+                               previous_tims=None, previous_frames=None):
+    # count frames in steps of dt within every tid, rounding each step
+    # between consecutive localizations; tids in previous_ids (sorted)
+    # continue from their last time and frame of an earlier read
+    frames = np.zeros(tim.shape[0], dtype=np.int64)
+    if tim.shape[0] == 0:
+        return frames
+
+    order = np.argsort(tid, kind="stable")
+    sorted_tid = tid[order]
+    sorted_tim = tim[order]
+    steps = np.zeros(tim.shape[0], dtype=np.int64)
+    steps[1:] = np.round(np.diff(sorted_tim) / dt)
+    is_start = np.ones(tim.shape[0], dtype=bool)
+    np.not_equal(sorted_tid[1:], sorted_tid[:-1], out=is_start[1:])
+    starts = np.flatnonzero(is_start)
+    steps[starts] = 0
+
+    if previous_ids is not None and previous_ids.shape[0] > 0:
+        previous = np.minimum(np.searchsorted(previous_ids,
+                                              sorted_tid[starts]),
+                              previous_ids.shape[0] - 1)
+        continued = previous_ids[previous] == sorted_tid[starts]
+        previous = previous[continued]
+        steps[starts[continued]] = previous_frames[previous] + np.round(
+            (sorted_tim[starts[continued]] - previous_tims[previous]) / dt)
+
+    # a running sum that restarts at the first localization of every tid
+    running = np.cumsum(steps)
+    lengths = np.diff(np.append(starts, tim.shape[0]))
+    frames[order] = running - np.repeat(running[starts] - steps[starts],
+                                        lengths)
+    return frames
 
 
 def find_minflux_timestep(minflux_npy):
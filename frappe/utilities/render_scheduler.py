@@ -0,0 +1,37 @@
+import time
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import QTimer
+
+RENDER_INTERVAL = 16
+
+
+class RenderScheduler(QtCore.QObject):
+
+    def __init__(self, parent=None, interval=RENDER_INTERVAL) -> None:
+        # render requests are keyed; only the latest request per key is kept
+        # and all pending requests run together at most once per interval,
+        # so a burst of slider or text events costs a single render
+        super().__init__(parent)
+        self.interval = interval
+        self._pending = {}
+        self._last_render_time = 0.0
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    def request(self, key, callback):
+        self._pending[key] = callback
+        if not self.timer.isActive():
+            # the first request after a pause renders on the next pass of
+            # the event loop
+            elapsed = 1000 * (time.perf_counter() - self._last_render_time)
+            self.timer.start(max(int(self.interval - elapsed), 0))
+
+    def flush(self):
+        self.timer.stop()
+        self._last_render_time = time.perf_counter()
+        # requests made while rendering wait for the next interval
+        pending, self._pending = self._pending, {}
+        for callback in pending.values():
+            callback()
@@ -0,0 +1,311 @@
+import numpy as np
+
+from frappe.utilities.frame_index import (
+    concatenate_ranges, first_changed_track, grow_tail, shifted_rows
+    )
+
+POINTS_PER_CELL = 16
+MAX_CELLS_PER_AXIS = 2048
+LOCALIZATIONS_PER_SEGMENT = 64
+MAX_CELLS_PER_SEGMENT = 256
+# inserted points are searched one by one until this many have gathered
+MAX_PENDING_POINTS = 65536
+
+
+def _cell_lists(cell_ids, n_cells):
+    # CSR layout: members of cell c are order[offsets[c]:offsets[c + 1]]
+    order = np.argsort(cell_ids, kind="stable")
+    offsets = np.searchsorted(cell_ids[order], np.arange(n_cells + 1))
+    return order, offsets
+
+
+def _insert_cell_members(order, offsets, members, member_cells):
+    # add members to the end of the lists of their cells in one pass
+    by_cell = np.argsort(member_cells, kind="stable")
+    member_cells = member_cells[by_cell]
+    order = np.insert(order, offsets[member_cells + 1], members[by_cell])
+    counts = np.bincount(member_cells, minlength=offsets.shape[0] - 1)
+    return order, offsets + np.concatenate([[0], np.cumsum(counts)])
+
+
+def _remove_cell_members(order, offsets, removed):
+    # drop the members flagged in removed, a mask over order
+    cells = np.repeat(np.arange(offsets.shape[0] - 1), np.diff(offsets))
+    counts = np.bincount(cells[removed], minlength=offsets.shape[0] - 1)
+    return order[~removed], offsets - np.concatenate([[0], np.cumsum(counts)])
+
+
+class SpatialIndex:
+
+    def __init__(self, x, y, track_starts, track_ends) -> None:
+        # a uniform grid over localizations (for picking) and over the
+        # bounding boxes of short runs of consecutive localizations of a
+        # track (for culling), built once per file
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        track_starts = np.asarray(track_starts)
+        track_ends = np.asarray(track_ends)
+        self.track_lengths = track_ends - track_starts
+        self.point_tracks = np.repeat(np.arange(track_starts.shape[0]),
+                                      self.track_lengths)
+        finite = np.isfinite(self.x) & np.isfinite(self.y)
+        if np.any(finite):
+            self.x_min, self.x_max = np.min(self.x[finite]), \
+                np.max(self.x[finite])
+            self.y_min, self.y_max = np.min(self.y[finite]), \
+                np.max(self.y[finite])
+        else:
+            self.x_min = self.x_max = self.y_min = self.y_max = 0.0
+        # the grid keeps its origin when inserted points widen the bounds;
+        # points outside it fall into the border cells
+        self.grid_x0, self.grid_y0 = self.x_min, self.y_min
+        self.indexed_points = self.x.shape[0]
+        self.pending_points = np.zeros(0, dtype=np.intp)
+        self._growing = {}
+
+        width = max(self.x_max - self.x_min, np.finfo(np.float64).tiny)
+        height = max(self.y_max - self.y_min, np.finfo(np.float64).tiny)
+        self.cell_size = max(np.sqrt(width * height * POINTS_PER_CELL /
+                                     max(self.x.shape[0], 1)),
+                             width / MAX_CELLS_PER_AXIS,
+                             height / MAX_CELLS_PER_AXIS)
+        self.n_x = int(width // self.cell_size) + 1
+        self.n_y = int(height // self.cell_size) + 1
+
+        cell_x, cell_y = self.cells(self.x, self.y)
+        self.point_order, self.point_offsets = _cell_lists(
+            cell_y * self.n_x + cell_x, self.n_x * self.n_y)
+
+        self.setup_segments(track_starts, track_ends)
+
+    def cells(self, x, y):
+        cell_x = np.clip((np.asarray(x) - self.grid_x0) // self.cell_size,
+                         0, self.n_x - 1)
+        cell_y = np.clip((np.asarray(y) - self.grid_y0) // self.cell_size,
+                         0, self.n_y - 1)
+        return np.nan_to_num(cell_x).astype(np.intp), \
+            np.nan_to_num(cell_y).astype(np.intp)
+
+    def setup_segments(self, track_starts, track_ends):
+        self.segment_tracks, self.segment_starts, self.segment_ends, \
+            self.segment_bounds = self.track_segments(track_starts,
+                                                      track_ends, 0)
+        segment_ids, member_cells, self.large_segments = \
+            self.segment_cells(self.segment_bounds, 0)
+        order, self.segment_offsets = _cell_lists(member_cells,
+                                                  self.n_x * self.n_y)
+        self.segment_order = segment_ids[order]
+
+    def track_segments(self, track_starts, track_ends, first_track):
+        # split every track from first_track on into runs that share their
+        # last localization with the next run, so culled geometry keeps all
+        # its segments; returns their tracks, row ranges and bounding boxes
+        track_starts = track_starts[first_track:]
+        track_ends = track_ends[first_track:]
+        n_segments = np.maximum(
+            np.ceil((track_ends - track_starts - 1) /
+                    LOCALIZATIONS_PER_SEGMENT), 1).astype(np.intp)
+        segment_tracks = np.repeat(np.arange(track_starts.shape[0]),
+                                   n_segments)
+        first_segments = np.cumsum(n_segments) - n_segments
+        local_index = np.arange(segment_tracks.shape[0]) - \
+            np.repeat(first_segments, n_segments)
+        segment_starts = track_starts[segment_tracks] + \
+            local_index * LOCALIZATIONS_PER_SEGMENT
+        segment_ends = np.minimum(
+            segment_starts + LOCALIZATIONS_PER_SEGMENT + 1,
+            track_ends[segment_tracks])
+        if segment_starts.shape[0] == 0:
+            return segment_tracks, segment_starts, segment_ends, \
+                np.zeros((0, 4))
+
+        # only the rows of these tracks are reduced
+        row0 = segment_starts[0]
+        x = np.nan_to_num(self.x[row0:], nan=self.x_min)
+        y = np.nan_to_num(self.y[row0:], nan=self.y_min)
+        starts = segment_starts - row0
+        segment_bounds = np.column_stack([
+            np.minimum.reduceat(x, starts),
+            np.maximum.reduceat(x, starts),
+            np.minimum.reduceat(y, starts),
+            np.maximum.reduceat(y, starts)
+        ])
+        # reduceat stops at the next start, the shared last localization
+        # still has to be included
+        last = segment_ends - 1 - row0
+        segment_bounds[:, 0] = np.minimum(segment_bounds[:, 0], x[last])
+        segment_bounds[:, 1] = np.maximum(segment_bounds[:, 1], x[last])
+        segment_bounds[:, 2] = np.minimum(segment_bounds[:, 2], y[last])
+        segment_bounds[:, 3] = np.maximum(segment_bounds[:, 3], y[last])
+        return segment_tracks + first_track, segment_starts, segment_ends, \
+            segment_bounds
+
+    def segment_cells(self, segment_bounds, first_segment):
+        # every run against all cells its bounding box overlaps, as segment
+        # and cell pairs; runs spanning a large part of the grid are kept
+        # aside and always tested
+        cell_x0, cell_y0 = self.cells(segment_bounds[:, 0],
+                                      segment_bounds[:, 2])
+        cell_x1, cell_y1 = self.cells(segment_bounds[:, 1],
+                                      segment_bounds[:, 3])
+        span_x = cell_x1 - cell_x0 + 1
+        span_y = cell_y1 - cell_y0 + 1
+        n_cells = span_x * span_y
+        is_large = n_cells > MAX_CELLS_PER_SEGMENT
+        n_cells[is_large] = 0
+        segment_ids = np.repeat(np.arange(n_cells.shape[0]), n_cells)
+        local_cell = np.arange(segment_ids.shape[0]) - \
+            np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        member_x = cell_x0[segment_ids] + local_cell % span_x[segment_ids]
+        member_y = cell_y0[segment_ids] + local_cell // span_x[segment_ids]
+        return first_segment + segment_ids, member_y * self.n_x + member_x, \
+            first_segment + np.flatnonzero(is_large)
+
+    def insert(self, x, y, track_starts, track_ends, positions):
+        # localizations were inserted before the rows at positions, x, y and
+        # the track ranges describe the whole table. Moved points keep their
+        # cells and are only renumbered, inserted points are searched one by
+        # one until enough have gathered to be added to the grid, and the
+        # runs of the tracks from the first changed one on are rebuilt.
+        positions = np.asarray(positions, dtype=np.intp)
+        if positions.shape[0] == 0:
+            return
+
+        first_row = int(positions[0])
+        x, y = np.asarray(x), np.asarray(y)
+        if x.dtype == np.float64 and y.dtype == np.float64:
+            self.x, self.y = x, y
+        else:
+            # single precision columns are converted from the first moved
+            # row on only
+            self.x = grow_tail(self, "x", first_row, x[first_row:])
+            self.y = grow_tail(self, "y", first_row, y[first_row:])
+
+        inserted = positions + np.arange(positions.shape[0])
+        finite = np.isfinite(self.x[inserted]) & np.isfinite(self.y[inserted])
+        if np.any(finite):
+            new_x, new_y = self.x[inserted[finite]], self.y[inserted[finite]]
+            self.x_min = min(self.x_min, np.min(new_x))
+            self.x_max = max(self.x_max, np.max(new_x))
+            self.y_min = min(self.y_min, np.min(new_y))
+            self.y_max = max(self.y_max, np.max(new_y))
+
+        moved = self.point_order >= first_row
+        self.point_order[moved] = shifted_rows(self.point_order[moved],
+                                               positions)
+        self.pending_points = np.concatenate([
+            shifted_rows(self.pending_points, positions), inserted])
+        if self.pending_points.shape[0] > MAX_PENDING_POINTS:
+            cell_x, cell_y = self.cells(self.x[self.pending_points],
+                                        self.y[self.pending_points])
+            self.point_order, self.point_offsets = _insert_cell_members(
+                self.point_order, self.point_offsets, self.pending_points,
+                cell_y * self.n_x + cell_x)
+            self.pending_points = np.zeros(0, dtype=np.intp)
+
+        track_starts = np.asarray(track_starts)
+        track_ends = np.asarray(track_ends)
+        track, row0 = first_changed_track(track_starts, first_row)
+        self.track_lengths = track_ends - track_starts
+        self.point_tracks = grow_tail(
+            self, "point_tracks", row0,
+            np.repeat(np.arange(track, track_starts.shape[0]),
+                      self.track_lengths[track:]))
+
+        first_segment = int(np.searchsorted(self.segment_tracks, track))
+        segment_tracks, segment_starts, segment_ends, segment_bounds = \
+            self.track_segments(track_starts, track_ends, track)
+        self.segment_tracks = np.concatenate([
+            self.segment_tracks[:first_segment], segment_tracks])
+        self.segment_starts = np.concatenate([
+            self.segment_starts[:first_segment], segment_starts])
+        self.segment_ends = np.concatenate([
+            self.segment_ends[:first_segment], segment_ends])
+        self.segment_bounds = np.concatenate([
+            self.segment_bounds[:first_segment], segment_bounds])
+        segment_ids, member_cells, large_segments = self.segment_cells(
+            segment_bounds, first_segment)
+        self.segment_order, self.segment_offsets = _remove_cell_members(
+            self.segment_order, self.segment_offsets,
+            self.segment_order >= first_segment)
+        self.segment_order, self.segment_offsets = _insert_cell_members(
+            self.segment_order, self.segment_offsets, segment_ids,
+            member_cells)
+        self.large_segments = np.concatenate([
+            self.large_segments[self.large_segments < first_segment],
+            large_segments])
+
+    def _cells_in_rect(self, x0, x1, y0, y1):
+        (cell_x0, cell_x1), (cell_y0, cell_y1) = self.cells([x0, x1],
+                                                            [y0, y1])
+        rows = np.arange(cell_y0, cell_y1 + 1) * self.n_x
+        return (rows[:, None] + np.arange(cell_x0, cell_x1 + 1)).ravel()
+
+    def _members(self, cells, order, offsets):
+        return order[concatenate_ranges(offsets[cells], offsets[cells + 1])]
+
+    def segments_in_rect(self, x0, x1, y0, y1):
+        if x1 < self.x_min or x0 > self.x_max or \
+                y1 < self.y_min or y0 > self.y_max:
+            return np.zeros(0, dtype=np.intp)
+        if x0 <= self.x_min and x1 >= self.x_max and \
+                y0 <= self.y_min and y1 >= self.y_max:
+            return np.arange(self.segment_starts.shape[0])
+
+        # runs are listed in every cell they overlap, a mask over the runs
+        # drops the duplicates without sorting them
+        found = np.zeros(self.segment_starts.shape[0], dtype=bool)
+        found[self._members(self._cells_in_rect(x0, x1, y0, y1),
+                            self.segment_order, self.segment_offsets)] = True
+        found[self.large_segments] = True
+        segments = np.flatnonzero(found)
+        bounds = self.segment_bounds[segments]
+        overlaps = (bounds[:, 0] <= x1) & (bounds[:, 1] >= x0) & \
+            (bounds[:, 2] <= y1) & (bounds[:, 3] >= y0)
+        return segments[overlaps]
+
+    def row_ranges_in_rect(self, x0, x1, y0, y1):
+        # sorted, disjoint [start, end) row ranges covering the localizations
+        # of all runs overlapping the rect; runs of a track share a row and
+        # tracks are contiguous, so neighbouring runs merge into one range
+        segments = self.segments_in_rect(x0, x1, y0, y1)
+        starts = self.segment_starts[segments]
+        ends = self.segment_ends[segments]
+        if segments.shape[0] == 0:
+            return starts, ends
+
+        separate = starts[1:] > ends[:-1]
+        return starts[np.concatenate([[True], separate])], \
+            ends[np.concatenate([separate, [True]])]
+
+    def rows_in_rect(self, x0, x1, y0, y1):
+        # sorted rows of the localizations of all runs overlapping the rect
+        return concatenate_ranges(*self.row_ranges_in_rect(x0, x1, y0, y1))
+
+    def nearest(self, x, y, max_distance, track_mask=None):
+        # index of the closest localization within max_distance, or None
+        candidates = self._members(
+            self._cells_in_rect(x - max_distance, x + max_distance,
+                                y - max_distance, y + max_distance),
+            self.point_order, self.point_offsets)
+        candidates = np.concatenate([candidates, self.pending_points])
+        if track_mask is not None:
+            candidates = candidates[track_mask[self.point_tracks[candidates]]]
+        if candidates.shape[0] == 0:
+            return None
+
+        distances = np.hypot(self.x[candidates] - x, self.y[candidates] - y)
+        distances[~np.isfinite(distances)] = np.inf
+        closest = np.argmin(distances)
+        if distances[closest] > max_distance:
+            return None
+        return candidates[closest]
+
+    def track_fractions_in_rect(self, x0, x1, y0, y1):
+        # fraction of the localizations of every track inside the rect
+        rows = self.rows_in_rect(x0, x1, y0, y1)
+        inside = rows[(self.x[rows] >= x0) & (self.x[rows] <= x1) &
+                      (self.y[rows] >= y0) & (self.y[rows] <= y1)]
+        return np.bincount(self.point_tracks[inside],
+                           minlength=self.track_lengths.shape[0]) / \
+            np.maximum(self.track_lengths, 1)
@@ -0,0 +1,154 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+DEFAULT_WINDOW = 10
+RAW_CACHE_PLANES = 64
+OUTPUT_CACHE_PLANES = 16
+
+
+class PlaneCache:
+
+    def __init__(self, read_plane, n_frames,
+                 capacity=RAW_CACHE_PLANES) -> None:
+        # raw planes by frame, least recently used ones are dropped first
+        self.read_plane = read_plane
+        self.n_frames = n_frames
+        self.capacity = capacity
+        self.planes = OrderedDict()
+        self.reads = 0
+
+    def plane(self, t):
+        if t in self.planes:
+            self.planes.move_to_end(t)
+            return self.planes[t]
+
+        plane = self.read_plane(t)
+        self.reads += 1
+        self.planes[t] = plane
+        if len(self.planes) > self.capacity:
+            self.planes.popitem(last=False)
+        return plane
+
+
+class TemporalStage:
+    # a filter whose output at frame t depends on the input frames
+    # t - before..t + after. The input planes of the current window are
+    # kept in a ring, so stepping by one frame pulls one new plane from the
+    # source; stages that average keep a running sum of the ring as well.
+    running_sum = False
+
+    def __init__(self, source, before, after,
+                 capacity=OUTPUT_CACHE_PLANES) -> None:
+        self.source = source
+        self.n_frames = source.n_frames
+        self.before = before
+        self.after = after
+        self.capacity = capacity
+        self.ring = {}
+        self.total = None
+        self.outputs = OrderedDict()
+
+    def window(self, t):
+        return max(t - self.before, 0), min(t + self.after, self.n_frames - 1)
+
+    def update_ring(self, t):
+        start, end = self.window(t)
+        for frame in [frame for frame in self.ring
+                      if frame < start or frame > end]:
+            plane = self.ring.pop(frame)
+            if self.running_sum:
+                self.total -= plane
+        for frame in range(start, end + 1):
+            if frame not in self.ring:
+                plane = np.asarray(self.source.plane(frame), dtype=np.float32)
+                self.ring[frame] = plane
+                if self.running_sum:
+                    if self.total is None:
+                        self.total = plane.astype(np.float64)
+                    else:
+                        self.total += plane
+
+    def mean(self):
+        return (self.total / len(self.ring)).astype(np.float32)
+
+    def plane(self, t):
+        if t in self.outputs:
+            self.outputs.move_to_end(t)
+            return self.outputs[t]
+
+        self.update_ring(t)
+        plane = self.apply(t)
+        self.outputs[t] = plane
+        if len(self.outputs) > self.capacity:
+            self.outputs.popitem(last=False)
+        return plane
+
+    def apply(self, t):
+        raise NotImplementedError
+
+
+class RunningAverage(TemporalStage):
+    running_sum = True
+
+    def __init__(self, source, window=DEFAULT_WINDOW) -> None:
+        # mean of window frames centred on t
+        super().__init__(source, (window - 1) // 2, window // 2)
+
+    def apply(self, t):
+        return self.mean()
+
+
+class BackgroundSubtraction(TemporalStage):
+
+    def __init__(self, source, window=DEFAULT_WINDOW,
+                 statistic="median") -> None:
+        # the plane minus the median or mean of window frames centred on t,
+        # which removes the static background and keeps moving particles
+        super().__init__(source, (window - 1) // 2, window // 2)
+        if statistic not in ("median", "mean"):
+            raise ValueError(f"unknown background statistic {statistic}")
+        self.statistic = statistic
+        self.running_sum = statistic == "mean"
+
+    def apply(self, t):
+        if self.statistic == "mean":
+            background = self.mean()
+        else:
+            background = np.median(np.stack(list(self.ring.values())),
+                                   axis=0)
+        return self.ring[t] - background
+
+
+class FrameDifference(TemporalStage):
+
+    def __init__(self, source, lag=1) -> None:
+        super().__init__(source, lag, 0)
+        self.lag = lag
+
+    def apply(self, t):
+        if t - self.lag not in self.ring:
+            return np.zeros_like(self.ring[t])
+        return self.ring[t] - self.ring[t - self.lag]
+
+
+TEMPORAL_FILTERS = {
+    "running_average": lambda source, window: RunningAverage(source,
+                                                             window),
+    "median_background": lambda source, window: BackgroundSubtraction(
+        source, window, "median"),
+    "mean_background": lambda source, window: BackgroundSubtraction(
+        source, window, "mean"),
+    "median_background_average": lambda source, window: RunningAverage(
+        BackgroundSubtraction(source, window, "median"), max(window // 4, 1)),
+    "frame_difference": lambda source, window: FrameDifference(source)
+}
+
+
+def temporal_pipeline(read_plane, n_frames, name, window=DEFAULT_WINDOW):
+    # the stages of a named filter on top of a cache of raw planes; planes
+    # are computed lazily when they are asked for
+    source = PlaneCache(read_plane, n_frames,
+                        capacity=max(RAW_CACHE_PLANES, 2 * window))
+    return TEMPORAL_FILTERS[name](source, window)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from frappe.utilities.frame_index import GrowingArray, shifted_rows
+from frappe.utilities.reader_utilities import narrowest_integer_dtype
+
+
+def _column_dtype(values, new_values):
+    # floating columns keep their precision, e.g. single precision
+    # coordinates, and integer columns only widen as far as the new values
+    # need, so the table stays as compact as parse_tracks made it
+    if np.issubdtype(values.dtype, np.floating) and \
+            np.issubdtype(new_values.dtype, np.number):
+        return values.dtype
+    if np.issubdtype(values.dtype, np.integer) and \
+            np.issubdtype(new_values.dtype, np.integer):
+        return np.promote_types(values.dtype,
+                                narrowest_integer_dtype(new_values))
+    return np.result_type(values.dtype, new_values.dtype)
+
+
+class TrackBuffer:
+
+    def __init__(self, tracks) -> None:
+        # the columns of a contiguous, frame-sorted track table with spare
+        # room behind its end, so that localizations appended to the last
+        # tracks move few rows and rarely reallocate
+        self.columns = {column: GrowingArray(tracks[column].to_numpy())
+                        for column in tracks.columns}
+        self.n_rows = len(tracks)
+
+    def tracks(self):
+        # the table as views of the buffers; rows from the first changed row
+        # of the next insert on change underneath it
+        return pd.DataFrame({column: values.values
+                             for column, values in self.columns.items()},
+                            copy=False)
+
+    def insert(self, positions, new_tracks):
+        # insert the rows of new_tracks before the rows at positions, which
+        # are nondecreasing as for np.insert; columns the new rows lack are
+        # unknown for them. Rows before the first position keep their place,
+        # the first row that changed is returned.
+        positions = np.asarray(positions, dtype=np.intp)
+        n_new = positions.shape[0]
+        if n_new == 0:
+            return self.n_rows
+
+        first = int(positions[0])
+        moved_to = shifted_rows(np.arange(first, self.n_rows),
+                                positions) - first
+        inserted_to = positions + np.arange(n_new) - first
+        for column, values in self.columns.items():
+            new_values = new_tracks[column].to_numpy() \
+                if column in new_tracks.columns else np.full(n_new, np.nan)
+            dtype = _column_dtype(values.buffer, new_values)
+            tail = np.empty(self.n_rows - first + n_new, dtype=dtype)
+            tail[moved_to] = values.values[first:]
+            tail[inserted_to] = new_values
+            values.replace_tail(first, tail, dtype)
+        self.n_rows += n_new
+        return first
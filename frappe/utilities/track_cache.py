@@ -0,0 +1,74 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_SUFFIX = ".frappe-cache"
+CACHE_META_FILE = "meta.json"
+
+
+def track_cache_path(tracks_path):
+    # the cache is a directory next to the track file holding one .npy file
+    # per column and a json file describing the source it was built from
+    return tracks_path + CACHE_SUFFIX
+
+
+def _source_signature(tracks_path, parser_version):
+    stat = os.stat(tracks_path)
+    return {"source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "parser_version": parser_version}
+
+
+def read_track_cache(tracks_path, parser_version):
+    # memory-map the cached columns, or return None if there is no cache or
+    # it was built from a different source file or parser
+    cache_path = track_cache_path(tracks_path)
+    try:
+        with open(os.path.join(cache_path, CACHE_META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        signature = _source_signature(tracks_path, parser_version)
+        if any(meta.get(key) != value for key, value in signature.items()):
+            return None
+
+        columns = {column: np.load(os.path.join(cache_path, f"{column}.npy"),
+                                   mmap_mode="r")
+                   for column in meta["columns"]}
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return pd.DataFrame(columns, copy=False), meta["dt"]
+
+
+def write_track_cache(tracks_path, parser_version, data, dt):
+    cache_path = track_cache_path(tracks_path)
+    meta_path = os.path.join(cache_path, CACHE_META_FILE)
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        # the meta file goes last, so an interrupted write is never read back
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        # columns are written under a temporary name and moved into place,
+        # so readers that memory-mapped the old columns keep the old files
+        for column in data.columns:
+            column_path = os.path.join(cache_path, f"{column}.npy")
+            with open(column_path + ".tmp", "wb") as column_file:
+                np.save(column_file,
+                        np.ascontiguousarray(data[column].to_numpy()),
+                        allow_pickle=False)
+            os.replace(column_path + ".tmp", column_path)
+
+        meta = _source_signature(tracks_path, parser_version)
+        meta["columns"] = [str(column) for column in data.columns]
+        meta["dt"] = float(dt)
+        with open(meta_path + ".tmp", "w") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(meta_path + ".tmp", meta_path)
+    except (OSError, ValueError):
+        # a read-only location or an unsupported column only costs the
+        # speed-up on the next open
+        return False
+
+    return True
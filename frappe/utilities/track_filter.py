@@ -0,0 +1,31 @@
+import numpy as np
+
+
+# short names that can be used in filter expressions next to the columns of
+# the track statistics
+FILTER_ALIASES = {"length": "n_localizations",
+                  "start": "frame_start",
+                  "end": "frame_end",
+                  "span": "frame_span",
+                  "rg": "radius_of_gyration",
+                  "displacement": "net_displacement",
+                  "D": "diffusion_coefficient"}
+
+
+def evaluate_track_filter(expression, track_statistics, extra_columns=None):
+    # boolean mask over the rows of track_statistics for an expression such
+    # as "length > 50 and D > 0.1", evaluated column-wise by pandas
+    if not expression.strip():
+        return np.ones(len(track_statistics), dtype=bool)
+
+    resolvers = {alias: track_statistics[column] for alias, column in
+                 FILTER_ALIASES.items() if column in track_statistics}
+    if extra_columns is not None:
+        resolvers.update(extra_columns)
+
+    mask = np.array(track_statistics.eval(expression,
+                                          resolvers=(resolvers,)))
+    if mask.dtype != bool or mask.shape != (len(track_statistics),):
+        raise ValueError("filter expression does not give one boolean per "
+                         "track")
+    return mask
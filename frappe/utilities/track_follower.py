@@ -0,0 +1,114 @@
+import os
+import xml.etree.cElementTree as et
+
+import numpy as np
+
+from frappe.utilities.reader_utilities import (
+    minflux_localizations, normalize_tracks, trackmate_particles
+    )
+
+
+PARTICLE_END_TAG = b"</particle>"
+
+
+class MinfluxFollower:
+
+    def __init__(self, tracks_path, dt, tracks) -> None:
+        # continues after the records already parsed into tracks; records
+        # are counted from the file size, as a growing file may not update
+        # the shape in its header
+        self.tracks_path = tracks_path
+        self.dt = dt
+        with open(tracks_path, "rb") as tracks_file:
+            version = np.lib.format.read_magic(tracks_file)
+            if version == (1, 0):
+                _, _, self.dtype = np.lib.format.read_array_header_1_0(
+                    tracks_file)
+            else:
+                _, _, self.dtype = np.lib.format.read_array_header_2_0(
+                    tracks_file)
+            self.data_offset = tracks_file.tell()
+        self.records_read = len(tracks)
+
+        # last time and frame of every tid, so growing tids keep counting
+        # frames across reads
+        self.last_ids = np.zeros(0, dtype=np.int64)
+        self.last_tims = np.zeros(0)
+        self.last_frames = np.zeros(0, dtype=np.int64)
+        self.update_last_localizations(tracks)
+
+    def update_last_localizations(self, data):
+        ids = np.concatenate([self.last_ids, data["id"].to_numpy()])
+        frames = np.concatenate([self.last_frames, data["frame"].to_numpy()])
+        tims = np.concatenate([self.last_tims,
+                               data["original_tim"].to_numpy()])
+        order = np.lexsort((frames, ids))
+        is_last = np.ones(order.shape[0], dtype=bool)
+        np.not_equal(ids[order][1:], ids[order][:-1], out=is_last[:-1])
+        last = order[is_last]
+        self.last_ids = ids[last].astype(np.int64)
+        self.last_tims = tims[last]
+        self.last_frames = frames[last].astype(np.int64)
+
+    def read_new(self):
+        n_records = (os.path.getsize(self.tracks_path) - self.data_offset) \
+            // self.dtype.itemsize
+        if n_records <= self.records_read:
+            return None
+
+        records = np.fromfile(self.tracks_path, dtype=self.dtype,
+                              count=n_records - self.records_read,
+                              offset=self.data_offset +
+                              self.records_read * self.dtype.itemsize)
+        self.records_read = n_records
+        data = minflux_localizations(records, self.dt, self.last_ids,
+                                     self.last_tims, self.last_frames)
+        self.update_last_localizations(data)
+        return normalize_tracks(data)
+
+
+class TrackmateFollower:
+
+    def __init__(self, tracks_path, dt, tracks) -> None:
+        # continues after the last complete particle element; particles are
+        # numbered in file order like in read_trackmate_file
+        self.tracks_path = tracks_path
+        self.dt = dt
+        self.next_id = int(tracks["id"].max()) + 1 if len(tracks) > 0 else 0
+        with open(tracks_path, "rb") as tracks_file:
+            content = tracks_file.read()
+        last_end = content.rfind(PARTICLE_END_TAG)
+        self.offset = 0 if last_end < 0 else last_end + len(PARTICLE_END_TAG)
+
+    def read_new(self):
+        with open(self.tracks_path, "rb") as tracks_file:
+            tracks_file.seek(self.offset)
+            content = tracks_file.read()
+        last_end = content.rfind(PARTICLE_END_TAG)
+        if last_end < 0:
+            return None
+
+        complete = content[:last_end + len(PARTICLE_END_TAG)]
+        # anything before the first particle (such as the opening root tag
+        # of a new file) is skipped
+        first_start = complete.find(b"<particle")
+        self.offset += len(complete)
+        if first_start < 0:
+            return None
+
+        root = et.fromstring(b"<Tracks>" + complete[first_start:] +
+                             b"</Tracks>")
+        data = trackmate_particles(root, self.next_id)
+        self.next_id += len(root.findall("particle"))
+        if len(data) == 0:
+            return None
+        return normalize_tracks(data)
+
+
+def track_follower(tracks_path, dt, tracks):
+    file_extension = tracks_path.split(".")[-1]
+    if file_extension == "npy":
+        return MinfluxFollower(tracks_path, dt, tracks)
+    elif file_extension == "xml":
+        return TrackmateFollower(tracks_path, dt, tracks)
+    return None
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def track_color_indices(track_ids, n_colors):
+    # same colour assignment as the per-track plot items
+    return np.array([hash(track_id) % n_colors for track_id in track_ids],
+                    dtype=np.intp)
+
+
+def connect_within_tracks(ids, rows=None):
+    # connect[i] is True when localization i is joined to localization i + 1;
+    # with rows given, localizations are only joined if they are adjacent in
+    # the source table (or in a simplified level of it), so culled runs of a
+    # track are not bridged
+    connect = np.zeros(ids.shape[0], dtype=bool)
+    if ids.shape[0] > 1:
+        np.equal(ids[1:], ids[:-1], out=connect[:-1])
+        if rows is not None:
+            connect[:-1] &= np.diff(rows) == 1
+    return connect
+
+
+def group_track_paths(ids, x, y, groups, n_groups, rows=None):
+    # lexsort is stable, so the original order of localizations inside every
+    # track is preserved while tracks are collected per pen group
+    ids = np.asarray(ids)
+    groups = np.asarray(groups)
+    order = np.lexsort((ids, groups))
+    sorted_ids = ids[order]
+    sorted_x = np.asarray(x)[order]
+    sorted_y = np.asarray(y)[order]
+    sorted_rows = None if rows is None else np.asarray(rows)[order]
+    boundaries = np.searchsorted(groups[order], np.arange(n_groups + 1))
+
+    paths = []
+    for group in range(n_groups):
+        start, end = boundaries[group], boundaries[group + 1]
+        paths.append((sorted_x[start:end],
+                      sorted_y[start:end],
+                      connect_within_tracks(
+                          sorted_ids[start:end],
+                          None if sorted_rows is None else
+                          sorted_rows[start:end])))
+
+    return paths
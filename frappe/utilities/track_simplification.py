@@ -0,0 +1,96 @@
+import numpy as np
+
+from frappe.utilities.frame_index import GrowingArray, first_changed_track
+
+N_LEVELS_OF_DETAIL = 8
+FINEST_LEVEL_CELLS = 8192
+
+
+def decimate_tracks(x, y, track_starts, track_ends, tolerance):
+    # snap localizations to a grid of the given tolerance and drop every
+    # localization that stays in the cell of its predecessor; the first and
+    # last localization of each track are always kept, so the simplified
+    # geometry deviates from the original by at most one cell diagonal
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = np.zeros(x.shape[0], dtype=bool)
+    if x.shape[0] == 0:
+        return np.flatnonzero(keep)
+
+    cell_x = np.floor(np.nan_to_num(x) / tolerance)
+    cell_y = np.floor(np.nan_to_num(y) / tolerance)
+    keep[1:] = (cell_x[1:] != cell_x[:-1]) | (cell_y[1:] != cell_y[:-1])
+    keep[np.asarray(track_starts)] = True
+    keep[np.asarray(track_ends) - 1] = True
+    return np.flatnonzero(keep)
+
+
+class TrackLevelsOfDetail:
+
+    def __init__(self, x, y, track_starts, track_ends,
+                 n_levels=N_LEVELS_OF_DETAIL) -> None:
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        finite = np.isfinite(x) & np.isfinite(y)
+        extent = 0.0
+        if np.any(finite):
+            extent = max(np.ptp(x[finite]), np.ptp(y[finite]))
+        if extent == 0.0:
+            extent = 1.0
+
+        self.n_localizations = x.shape[0]
+        self.tolerances = extent / FINEST_LEVEL_CELLS * 2.0 ** np.arange(
+            n_levels)
+        # every level decimates the previous one, so the work shrinks with
+        # the level
+        self.level_rows = []
+        rows = np.arange(x.shape[0])
+        starts = np.asarray(track_starts)
+        ends = np.asarray(track_ends)
+        for tolerance in self.tolerances:
+            kept = decimate_tracks(x[rows], y[rows],
+                                   np.searchsorted(rows, starts),
+                                   np.searchsorted(rows, ends - 1) + 1,
+                                   tolerance)
+            rows = rows[kept]
+            self.level_rows.append(rows)
+        self._growing = None
+
+    def update(self, x, y, track_starts, track_ends, first_row):
+        # the table is unchanged up to first_row; every level keeps its rows
+        # before the track holding first_row - 1 and decimates the tracks
+        # from there on again. The tolerances stay those of the first build.
+        track_starts = np.asarray(track_starts)
+        track_ends = np.asarray(track_ends)
+        track, row0 = first_changed_track(track_starts, first_row)
+        x = np.asarray(x[row0:], dtype=np.float64)
+        y = np.asarray(y[row0:], dtype=np.float64)
+        if self._growing is None:
+            self._growing = [GrowingArray(rows) for rows in self.level_rows]
+
+        self.n_localizations = row0 + x.shape[0]
+        rows = np.arange(x.shape[0])
+        starts = track_starts[track:] - row0
+        ends = track_ends[track:] - row0
+        for level, tolerance in enumerate(self.tolerances):
+            kept = decimate_tracks(x[rows], y[rows],
+                                   np.searchsorted(rows, starts),
+                                   np.searchsorted(rows, ends - 1) + 1,
+                                   tolerance)
+            rows = rows[kept]
+            self.level_rows[level] = self._growing[level].replace_tail(
+                int(np.searchsorted(self.level_rows[level], row0)),
+                row0 + rows)
+
+    def level(self, tolerance):
+        # coarsest level whose tolerance stays below the given size, or None
+        # when the full resolution geometry is needed
+        fitting = np.flatnonzero(self.tolerances <= tolerance)
+        if fitting.shape[0] == 0:
+            return None
+        return int(fitting[-1])
+
+    def rows(self, level):
+        if level is None:
+            return None
+        return self.level_rows[level]
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+
+TRACK_STATISTICS_COLUMNS = ["n_localizations",
+                            "frame_start",
+                            "frame_end",
+                            "frame_span",
+                            "duration",
+                            "centroid_x",
+                            "centroid_y",
+                            "centroid_z",
+                            "radius_of_gyration_x",
+                            "radius_of_gyration_y",
+                            "radius_of_gyration_z",
+                            "radius_of_gyration",
+                            "net_displacement"]
+
+
+def group_by_track(ids, frames):
+    # sort localizations by id, then by frame within each id, and return the
+    # permutation together with the start offset of every track
+    ids = np.asarray(ids)
+    order = np.lexsort((np.asarray(frames), ids))
+    sorted_ids = ids[order]
+    if sorted_ids.shape[0] == 0:
+        return order, sorted_ids, np.zeros(0, dtype=np.intp)
+
+    is_start = np.empty(sorted_ids.shape[0], dtype=bool)
+    is_start[0] = True
+    np.not_equal(sorted_ids[1:], sorted_ids[:-1], out=is_start[1:])
+    starts = np.flatnonzero(is_start)
+    return order, sorted_ids[starts], starts
+
+
+def calculate_track_statistics(tracks, dt=1.0):
+    order, unique_ids, starts = group_by_track(tracks["id"].to_numpy(),
+                                               tracks["frame"].to_numpy())
+    if unique_ids.shape[0] == 0:
+        return pd.DataFrame(columns=TRACK_STATISTICS_COLUMNS,
+                            index=pd.Index(unique_ids, name="id"))
+
+    frames = tracks["frame"].to_numpy()[order]
+    positions = tracks[["x", "y", "z"]].to_numpy(dtype=np.float64)[order]
+    counts = np.diff(np.append(starts, frames.shape[0]))
+    ends = starts + counts - 1
+
+    # one grouped pass for the first moment, a second one on the centred
+    # coordinates for the spread to stay numerically stable
+    centroids = np.add.reduceat(positions, starts, axis=0) / counts[:, None]
+    centred = positions - np.repeat(centroids, counts, axis=0)
+    variances = np.add.reduceat(centred ** 2, starts, axis=0) / \
+        counts[:, None]
+    radii_of_gyration = np.sqrt(variances)
+
+    frame_start = frames[starts]
+    frame_end = frames[ends]
+    frame_span = frame_end - frame_start
+    net_displacement = np.linalg.norm(positions[ends] - positions[starts],
+                                      axis=1)
+
+    return pd.DataFrame({
+        "n_localizations": counts,
+        "frame_start": frame_start,
+        "frame_end": frame_end,
+        "frame_span": frame_span,
+        "duration": dt * frame_span,
+        "centroid_x": centroids[:, 0],
+        "centroid_y": centroids[:, 1],
+        "centroid_z": centroids[:, 2],
+        "radius_of_gyration_x": radii_of_gyration[:, 0],
+        "radius_of_gyration_y": radii_of_gyration[:, 1],
+        "radius_of_gyration_z": radii_of_gyration[:, 2],
+        "radius_of_gyration": np.sqrt(np.sum(variances, axis=1)),
+        "net_displacement": net_displacement
+    }, index=pd.Index(unique_ids, name="id"))
@@ -0,0 +1,52 @@
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QLabel
+
+from frappe.utilities.instrumentation import recorder
+
+OVERLAY_INTERVAL = 500
+
+
+class LatencyOverlay(QLabel):
+
+    def __init__(self, parent) -> None:
+        # a translucent table of the recorded latencies in the top left
+        # corner of its parent, refreshed on a timer while shown
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setTextFormat(Qt.PlainText)
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 170);"
+                           "color: white; font-family: monospace;"
+                           "padding: 4px;")
+        self.move(10, 10)
+        self.hide()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.holds_recorder = False
+
+    def set_enabled(self, enabled):
+        # latencies are recorded while any overlay is shown
+        if enabled != self.holds_recorder:
+            if enabled:
+                recorder.hold()
+            else:
+                recorder.release()
+            self.holds_recorder = enabled
+        if enabled:
+            self.refresh()
+            self.show()
+            self.timer.start(OVERLAY_INTERVAL)
+        else:
+            self.timer.stop()
+            self.hide()
+
+    def refresh(self):
+        lines = [f"{'':<34}{'calls':>7}{'p50':>9}{'p99':>9}{'max':>9}"]
+        for name, latencies in recorder.summary().items():
+            lines.append(f"{name[-34:]:<34}{latencies['count']:>7}" +
+                         "".join(f"{1000 * latencies[key]:>7.1f}ms"
+                                 for key in ("p50", "p99", "max")))
+        if len(lines) == 1:
+            lines.append("no calls recorded yet")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        self.raise_()
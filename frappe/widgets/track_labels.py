@@ -0,0 +1,82 @@
+from PyQt5.QtGui import QFont
+from pyqtgraph import TextItem
+import numpy as np
+
+
+LABEL_CELL_PIXELS = 48
+MAX_LABELS = 250
+
+
+class TrackLabelLayer:
+
+    def __init__(self, plot) -> None:
+        # a pool of text items that is reused for whichever tracks are in
+        # view; at most one label is placed per screen cell
+        self.plot = plot
+        self.font = QFont()
+        self.font.setPixelSize(9)
+        self.items = []
+        self.label_texts = np.zeros(0, dtype=object)
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.priority_order = np.zeros(0, dtype=np.intp)
+        self.shown = np.zeros(0, dtype=np.intp)
+
+    def set_labels(self, labels, x, y, priority):
+        # labels with a higher priority win when cells are crowded
+        self.label_texts = np.array([str(label) for label in labels],
+                                    dtype=object)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.priority_order = np.argsort(-np.asarray(priority),
+                                         kind="stable")
+        self.shown = np.zeros(0, dtype=np.intp)
+        for item in self.items:
+            item.setVisible(False)
+
+    def attach(self):
+        # clearing the plot removes the pooled items from the scene
+        for item in self.items:
+            if item.scene() is None:
+                self.plot.addItem(item, ignoreBounds=True)
+
+    def hide(self):
+        for item in self.items[:self.shown.shape[0]]:
+            item.setVisible(False)
+        self.shown = np.zeros(0, dtype=np.intp)
+
+    def update(self, label_mask):
+        view_box = self.plot.plotItem.getViewBox()
+        (x_min, x_max), (y_min, y_max) = view_box.viewRange()
+        pixel_width, pixel_height = view_box.viewPixelSize()
+
+        order = self.priority_order
+        x, y = self.x[order], self.y[order]
+        candidates = label_mask[order] & (x >= x_min) & (x <= x_max) & \
+            (y >= y_min) & (y <= y_max)
+        order, x, y = order[candidates], x[candidates], y[candidates]
+
+        # the first (highest priority) label of every occupied cell is kept
+        cell_x = ((x - x_min) / (LABEL_CELL_PIXELS * pixel_width)).astype(
+            np.int64)
+        cell_y = ((y - y_min) / (LABEL_CELL_PIXELS * pixel_height)).astype(
+            np.int64)
+        _, first = np.unique(cell_y * (cell_x.max(initial=0) + 1) + cell_x,
+                             return_index=True)
+        shown = order[np.sort(first)[:MAX_LABELS]]
+
+        while len(self.items) < shown.shape[0]:
+            item = TextItem()
+            item.setFont(self.font)
+            self.plot.addItem(item, ignoreBounds=True)
+            self.items.append(item)
+
+        for item, label in zip(self.items, shown):
+            if item.textItem.toPlainText() != self.label_texts[label]:
+                item.setText(self.label_texts[label])
+            # positions change with set_labels even when the text does not
+            item.setPos(self.x[label], self.y[label])
+            item.setVisible(True)
+        for item in self.items[shown.shape[0]:self.shown.shape[0]]:
+            item.setVisible(False)
+        self.shown = shown
@@ -0,0 +1,121 @@
+from matplotlib import pyplot as plt
+from pyqtgraph import PlotDataItem, mkPen
+import numpy as np
+
+from frappe.utilities.decorators import instrumented
+from frappe.utilities.frame_index import FrameIndex
+from frappe.utilities.reader_utilities import (
+    parse_tracks, track_microns_per_unit
+    )
+from frappe.utilities.track_rendering import (
+    track_color_indices, group_track_paths
+    )
+
+
+TAIL_FRAMES = 10
+MARKER_SIZE = 8
+
+
+class TrackOverlay:
+
+    def __init__(self, view) -> None:
+        # tracks drawn on an image view box: the tails of the last
+        # TAIL_FRAMES frames and a marker on every localization of the
+        # current frame, one item of each per track colour
+        self.view = view
+        self.colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        self.tail_frames = TAIL_FRAMES
+        self.visible = True
+        self.frame = 0
+        self.frame_index = None
+        self.path_items = []
+        self.marker_items = []
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.color_indices = np.zeros(0, dtype=np.intp)
+        self.microns_per_unit = 1.0
+        self.pixel_size_x = 1.0
+        self.pixel_size_y = 1.0
+
+    def open_file(self, track_path):
+        tracks, _ = parse_tracks(track_path)
+        self.set_tracks(tracks, track_microns_per_unit(track_path))
+
+    def set_tracks(self, tracks, microns_per_unit=1.0):
+        # tracks in the (id, frame) order of parse_tracks, so the rows of a
+        # frame window sorted by row number come out grouped by track
+        self.frame_index = FrameIndex(tracks["frame"].to_numpy())
+        self.ids = tracks["id"].to_numpy()
+        self.x = tracks["x"].to_numpy(dtype=np.float64)
+        self.y = tracks["y"].to_numpy(dtype=np.float64)
+        unique_ids, inverse = np.unique(self.ids, return_inverse=True)
+        self.color_indices = track_color_indices(
+            unique_ids, len(self.colors))[inverse]
+        self.microns_per_unit = microns_per_unit
+        self.refresh()
+
+    def set_pixel_size(self, pixel_size_x, pixel_size_y):
+        # physical pixel sizes in microns, unknown sizes count as one
+        self.pixel_size_x = pixel_size_x if pixel_size_x else 1.0
+        self.pixel_size_y = pixel_size_y if pixel_size_y else 1.0
+        self.refresh()
+
+    def set_frame(self, frame):
+        self.frame = frame
+        self.refresh()
+
+    def set_visible(self, visible):
+        self.visible = visible
+        self.refresh()
+
+    def to_pixels(self, rows):
+        # image items span [i, i + 1) per pixel, localizations sit on pixel
+        # centres
+        return (self.x[rows] * self.microns_per_unit / self.pixel_size_x +
+                0.5,
+                self.y[rows] * self.microns_per_unit / self.pixel_size_y +
+                0.5)
+
+    def add_items(self):
+        for color in self.colors:
+            path_item = PlotDataItem(pen=mkPen(color=color))
+            marker_item = PlotDataItem(pen=None, symbol="o",
+                                       symbolSize=MARKER_SIZE,
+                                       symbolPen=mkPen(color=color),
+                                       symbolBrush=None)
+            self.view.addItem(path_item, ignoreBounds=True)
+            self.view.addItem(marker_item, ignoreBounds=True)
+            self.path_items.append(path_item)
+            self.marker_items.append(marker_item)
+
+    @instrumented()
+    def refresh(self):
+        if self.frame_index is None or not self.visible:
+            for item in self.path_items + self.marker_items:
+                item.setVisible(False)
+            return
+
+        if not self.path_items:
+            self.add_items()
+
+        # two binary searches in the frame-sorted index select the tails,
+        # the work per frame only depends on the localizations shown
+        order = self.frame_index.order
+        rows = np.sort(order[self.frame_index.window(
+            self.frame - self.tail_frames, self.frame)])
+        x, y = self.to_pixels(rows)
+        paths = group_track_paths(self.ids[rows], x, y,
+                                  self.color_indices[rows], len(self.colors),
+                                  rows=rows)
+        for item, (path_x, path_y, connect) in zip(self.path_items, paths):
+            item.setData(path_x, path_y, connect=connect)
+            item.setVisible(True)
+
+        rows = order[self.frame_index.window(self.frame, self.frame)]
+        x, y = self.to_pixels(rows)
+        groups = self.color_indices[rows]
+        for color_index, item in enumerate(self.marker_items):
+            in_group = groups == color_index
+            item.setData(x[in_group], y[in_group])
+            item.setVisible(True)
@@ -0,0 +1,265 @@
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QStyledItemDelegate, QSpinBox
+import numpy as np
+
+
+TRACK_ID_COLUMN = 0
+SHOW_COLUMN = 1
+FRAME_START_COLUMN = 2
+FRAME_END_COLUMN = 3
+FIRST_METRIC_COLUMN = 4
+
+TRACK_METRIC_COLUMNS = (["Localizations", "Duration (s)",
+                         "Radius of gyration", "Net displacement"],
+                        ["n_localizations", "duration",
+                         "radius_of_gyration", "net_displacement"])
+# metrics of analyses, shown once they have been calculated
+ANALYSIS_METRIC_COLUMNS = (["Diffusion coefficient", "Alpha",
+                            "Mean intensity"],
+                           ["diffusion_coefficient", "alpha",
+                            "mean_intensity"])
+METRIC_STATISTICS = dict(zip(
+    TRACK_METRIC_COLUMNS[0] + ANALYSIS_METRIC_COLUMNS[0],
+    TRACK_METRIC_COLUMNS[1] + ANALYSIS_METRIC_COLUMNS[1]))
+
+
+class TrackTableModel(QtCore.QAbstractTableModel):
+    visibilityChanged = QtCore.pyqtSignal()
+    trackRangesChanged = QtCore.pyqtSignal()
+
+    def __init__(self, track_statistics, track_visibility, track_ranges,
+                 parent=None) -> None:
+        super().__init__(parent)
+        # visibility and ranges are shared with FrappeTrack and updated in
+        # place; the model only keeps a row -> track permutation for sorting
+        self.track_ids = track_statistics.index.to_numpy()
+        self.max_frames = track_statistics["frame_end"].to_numpy()
+        self.metrics = [track_statistics[column].to_numpy() for column in
+                        TRACK_METRIC_COLUMNS[1]]
+        self.track_visibility = track_visibility
+        self.track_ranges = track_ranges
+        self._headers = ["Track ID", "Show", "Frame start", "Frame end"] + \
+            TRACK_METRIC_COLUMNS[0]
+        # analysis metrics keep the order in which they were calculated
+        analysis_headers = dict(zip(ANALYSIS_METRIC_COLUMNS[1],
+                                    ANALYSIS_METRIC_COLUMNS[0]))
+        for column in track_statistics.columns:
+            if column in analysis_headers:
+                self._headers.append(analysis_headers[column])
+                self.metrics.append(track_statistics[column].to_numpy())
+        self._row_order = np.arange(self.track_ids.shape[0])
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._row_order.shape[0]
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return self._headers[section]
+            return str(section + 1)
+        return None
+
+    def add_metric(self, header, values):
+        # append a read-only metric column, e.g. from an analysis run
+        column = len(self._headers)
+        self.beginInsertColumns(QtCore.QModelIndex(), column, column)
+        self._headers.append(header)
+        self.metrics.append(np.asarray(values))
+        self.endInsertColumns()
+
+    def set_metric(self, header, values):
+        # replace the values of a metric column, or add the column
+        if header not in self._headers:
+            self.add_metric(header, values)
+            return
+
+        column = self._headers.index(header)
+        self.metrics[column - FIRST_METRIC_COLUMN] = np.asarray(values)
+        self.dataChanged.emit(self.index(0, column),
+                              self.index(self.rowCount() - 1, column),
+                              [Qt.DisplayRole])
+
+    def update_tracks(self, track_statistics, track_visibility,
+                      track_ranges):
+        # statistics of a grown table whose tracks include all current ones;
+        # rows keep their tracks and new tracks are appended as rows, so
+        # selections survive, and the caller sorts again afterwards
+        track_ids = track_statistics.index.to_numpy()
+        positions = np.searchsorted(track_ids, self.track_ids)
+        is_new = np.ones(track_ids.shape[0], dtype=bool)
+        is_new[positions] = False
+        new_positions = np.flatnonzero(is_new)
+        n_rows = self.rowCount()
+        if new_positions.shape[0] > 0:
+            self.beginInsertRows(QtCore.QModelIndex(), n_rows,
+                                 n_rows + new_positions.shape[0] - 1)
+
+        self._row_order = np.concatenate([positions[self._row_order],
+                                          new_positions])
+        self.track_ids = track_ids
+        self.max_frames = track_statistics["frame_end"].to_numpy()
+        self.track_visibility = track_visibility
+        self.track_ranges = track_ranges
+        for metric, header in enumerate(self._headers[FIRST_METRIC_COLUMN:]):
+            column = METRIC_STATISTICS.get(header)
+            if column in track_statistics.columns:
+                self.metrics[metric] = track_statistics[column].to_numpy()
+            else:
+                # added metrics are unknown for new tracks
+                values = np.full(track_ids.shape[0], np.nan)
+                values[positions] = self.metrics[metric]
+                self.metrics[metric] = values
+
+        if new_positions.shape[0] > 0:
+            self.endInsertRows()
+        if n_rows > 0:
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(n_rows - 1,
+                                             self.columnCount() - 1))
+
+    def track_position(self, row):
+        return self._row_order[row]
+
+    def track_positions(self, rows):
+        return self._row_order[np.asarray(rows, dtype=np.intp)]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        position = self._row_order[index.row()]
+        column = index.column()
+        if column == SHOW_COLUMN:
+            if role == Qt.CheckStateRole:
+                return (Qt.Checked if self.track_visibility[position]
+                        else Qt.Unchecked)
+            return None
+
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+
+        if column == TRACK_ID_COLUMN:
+            return str(self.track_ids[position])
+        elif column == FRAME_START_COLUMN:
+            return int(self.track_ranges[position, 0])
+        elif column == FRAME_END_COLUMN:
+            return int(self.track_ranges[position, 1])
+
+        value = self.metrics[column - FIRST_METRIC_COLUMN][position]
+        if role == Qt.EditRole:
+            return float(value)
+        return f"{value:.4g}"
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+
+        position = self._row_order[index.row()]
+        column = index.column()
+        if column == SHOW_COLUMN and role == Qt.CheckStateRole:
+            self.track_visibility[position] = value == Qt.Checked
+            self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+            self.visibilityChanged.emit()
+            return True
+
+        if column in (FRAME_START_COLUMN, FRAME_END_COLUMN) and \
+                role == Qt.EditRole:
+            start, end = self.track_ranges[position]
+            if column == FRAME_START_COLUMN:
+                self.track_ranges[position, 0] = min(max(0, int(value)), end)
+            else:
+                self.track_ranges[position, 1] = min(
+                    max(start, int(value)), self.max_frames[position])
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
+            self.trackRangesChanged.emit()
+            return True
+
+        return False
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == SHOW_COLUMN:
+            flags |= Qt.ItemIsUserCheckable
+        elif index.column() in (FRAME_START_COLUMN, FRAME_END_COLUMN):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column == TRACK_ID_COLUMN:
+            keys = self.track_ids
+        elif column == SHOW_COLUMN:
+            keys = self.track_visibility
+        elif column == FRAME_START_COLUMN:
+            keys = self.track_ranges[:, 0]
+        elif column == FRAME_END_COLUMN:
+            keys = self.track_ranges[:, 1]
+        else:
+            keys = self.metrics[column - FIRST_METRIC_COLUMN]
+
+        self.layoutAboutToBeChanged.emit()
+        old_row_order = self._row_order
+        self._row_order = np.argsort(keys, kind="stable")
+        if order == Qt.DescendingOrder:
+            self._row_order = self._row_order[::-1]
+
+        # keep selections and the current index on the same tracks
+        new_rows = np.empty_like(self._row_order)
+        new_rows[self._row_order] = np.arange(self._row_order.shape[0])
+        old_indices = self.persistentIndexList()
+        self.changePersistentIndexList(
+            old_indices,
+            [self.index(int(new_rows[old_row_order[index.row()]]),
+                        index.column()) for index in old_indices]
+        )
+        self.layoutChanged.emit()
+
+    def set_visibility(self, track_mask):
+        # visibility of all tracks at once, in track (not row) order
+        self.track_visibility[:] = track_mask
+        self.dataChanged.emit(self.index(0, SHOW_COLUMN),
+                              self.index(self.rowCount() - 1, SHOW_COLUMN),
+                              [Qt.CheckStateRole])
+        self.visibilityChanged.emit()
+
+    def set_tracks_visible(self, rows, visible):
+        # bulk update, announced with a single signal
+        self.track_visibility[self.track_positions(rows)] = visible
+        self.dataChanged.emit(self.index(0, SHOW_COLUMN),
+                              self.index(self.rowCount() - 1, SHOW_COLUMN),
+                              [Qt.CheckStateRole])
+        self.visibilityChanged.emit()
+
+
+class FrameSpinBoxDelegate(QStyledItemDelegate):
+
+    def createEditor(self, parent, option, index):
+        model = index.model()
+        position = model.track_position(index.row())
+        start, end = model.track_ranges[position]
+        editor = QSpinBox(parent)
+        if index.column() == FRAME_START_COLUMN:
+            editor.setRange(0, int(end))
+        else:
+            editor.setRange(int(start), int(model.max_frames[position]))
+        # every step is committed so the plot follows the spin box; the
+        # redraws are coalesced by the render scheduler
+        editor.valueChanged.connect(lambda: self.commitData.emit(editor))
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setValue(index.model().data(index, Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        editor.interpretText()
+        model.setData(index, editor.value(), Qt.EditRole)